@@ -1,14 +1,60 @@
-from typing import Any, Mapping, Sequence
+import asyncio
+import base64
+import binascii
+import hashlib
+import json
+import random
+import time
+from functools import partial
+from typing import Any, AsyncIterator, Awaitable, Callable, Literal, Mapping, Sequence, TypeVar
 
-from fastapi import FastAPI
-from pydantic import BaseModel
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field
 from weaverbird.pipeline import PipelineWithVariables
+from weaverbird.pipeline.steps import DomainStep, PivotStep, UniqueGroupsStep
 
 from . import __version__
+from .compression import CompressionMiddleware
 from .connectors import ALL_EXECUTORS
+from .connectors.base import ColumnDescription, QueryTimeoutError, ResultSet, SQLExecutor
+from .connectors.scheduler import (
+    QUERY_SCHEDULER,
+    QueryPriority,
+    QueryQueueFullError,
+    QueryQueueTimeoutError,
+)
 from .dialects import SQLDialect
+from .formats import (
+    ARROW_STREAM_MEDIA_TYPE,
+    DEFAULT_PARQUET_ROW_GROUP_SIZE,
+    EXPORT_MEDIA_TYPES,
+    ExportFormat,
+    FastJSONResponse,
+    ParquetCompression,
+    to_arrow_stream,
+    to_csv_chunks,
+    to_ndjson_chunks,
+    to_parquet_chunks,
+)
 from .models import SQLQueryDefinition
-from .translate import translate_pipeline
+from .partitioning import (
+    COUNT_COLUMN,
+    MAX_COLUMN,
+    MAX_PARTITIONS,
+    MIN_COLUMN,
+    PARTITION_CONCURRENCY,
+    check_partitionable,
+    get_partition_bounds,
+    get_partition_conditions,
+    get_partitioned_pipelines,
+    get_range_pipeline,
+    merge_streams,
+    restrict_domain,
+)
+from .result_cache import RESULT_CACHE, CachedResult, can_refresh_incrementally
+from .translate import translate_pipeline, translate_pipeline_with_parameters
+from .translators.base import get_keyset_columns
 
 
 def to_camel(snake_str: str) -> str:
@@ -23,6 +69,7 @@ class CamelModel(BaseModel):
 
 
 app = FastAPI()
+app.add_middleware(CompressionMiddleware)
 
 
 @app.get("/")
@@ -30,44 +77,637 @@ def get_status() -> dict[str, str]:
     return {"status": "OK", "version": __version__}
 
 
+@app.get("/metrics")
+def get_metrics() -> dict[str, dict[str, Any]]:
+    """Queries running and waiting on each database"""
+    return QUERY_SCHEDULER.get_metrics()
+
+
+@app.exception_handler(QueryQueueFullError)
+async def handle_query_queue_full(request: Request, exc: QueryQueueFullError) -> JSONResponse:
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+@app.exception_handler(QueryQueueTimeoutError)
+async def handle_query_queue_timeout(request: Request, exc: QueryQueueTimeoutError) -> JSONResponse:
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
 class TranslationQuery(CamelModel):
     sql_dialect: SQLDialect
     pipeline: PipelineWithVariables
     tables_columns: Mapping[str, Sequence[str]]
     db_schema: str | None = None
+    pivot_values: Mapping[str, Sequence[Any]] | None = None
+    replace_whole_values: bool = False
+    columns_types: Mapping[str, str] | None = None
+    approximate_aggregations: bool = False
 
 
 @app.post("/translate")
 async def get_translation(translation_query: TranslationQuery) -> str:
-    return translate_pipeline(
-        sql_dialect=translation_query.sql_dialect,
-        pipeline=translation_query.pipeline,
-        tables_columns=translation_query.tables_columns,
-        db_schema=translation_query.db_schema,
-    )
+    try:
+        return translate_pipeline(
+            sql_dialect=translation_query.sql_dialect,
+            pipeline=translation_query.pipeline,
+            tables_columns=translation_query.tables_columns,
+            db_schema=translation_query.db_schema,
+            pivot_values=translation_query.pivot_values,
+            replace_whole_values=translation_query.replace_whole_values,
+            columns_types=translation_query.columns_types,
+            approximate_aggregations=translation_query.approximate_aggregations,
+        )
+    except ValueError as e:
+        # e.g. a pivot step without the values of its pivoted column
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+# seeds are 32-bit signed integers on some databases
+MAX_SAMPLE_SEED = 2**31 - 1
 
 
 class PreviewQuery(CamelModel):
     query_def: SQLQueryDefinition
     tables: Sequence[str] | None = None
+    replace_whole_values: bool = False
+    approximate_aggregations: bool = False
+    # percentage of the rows of the tables to read (all of them by default)
+    sample_percent: float | None = Field(None, gt=0, le=100)
+    # seed of the sample, so that the pages of a sampled preview come from the same rows on the
+    # databases that support it (random by default, returned in a `X-Sample-Seed` header and
+    # carried by the cursors)
+    sample_seed: int | None = Field(None, ge=0, le=MAX_SAMPLE_SEED)
+    limit: int | None = Field(None, gt=0)
+    offset: int | None = Field(None, ge=0)
+    # columns identifying each row of the result (e.g. a primary key), breaking the ties of the
+    # sort of the pages. Needed to get the next page with a cursor
+    unique_columns: list[str] | None = None
+    # token of the `X-Next-Cursor` header of the previous page
+    cursor: str | None = None
+    # whether the total number of rows is returned in a `X-Total-Count` header, exact or
+    # estimated from the catalog statistics when possible
+    total_count: Literal["exact", "estimate"] | None = None
+    # maximum duration of each query in seconds (the one of the connection by default)
+    timeout: float | None = Field(None, gt=0)
+    # previews are interactive unless they are used to extract data
+    priority: QueryPriority = QueryPriority.INTERACTIVE
+    # "columnar" returns `{"columns": [...], "types": [...], "data": [[values of a column], ...]}`
+    # instead of a list of rows
+    format: Literal["records", "columnar"] = "records"
+    # column of each domain that only gets higher values as rows are added (e.g. a creation
+    # date): the results of pipelines over these domains are cached and refreshed from the new
+    # rows when possible. Paginated or sampled previews are not cached. New rows with a value
+    # that isn't higher than the previous ones make the next refresh a full one, and new rows
+    # without value are only seen by the next full refresh, so it should not be nullable
+    watermark_columns: dict[str, str] | None = None
+
+
+class ExportQuery(CamelModel):
+    query_def: SQLQueryDefinition
+    tables: Sequence[str] | None = None
+    replace_whole_values: bool = False
+    # maximum duration of each query in seconds (the one of the connection by default)
+    timeout: float | None = Field(None, gt=0)
+    # exports use the spare capacity of the databases
+    priority: QueryPriority = QueryPriority.BULK
+    format: ExportFormat = "csv"
+    # only for the "parquet" format
+    row_group_size: int = Field(DEFAULT_PARQUET_ROW_GROUP_SIZE, gt=0)
+    parquet_compression: ParquetCompression = "snappy"
+    # column of the domain (numbers or dates) whose range is split in `partitions` ranges, read
+    # by as many queries, a few of them running at the same time
+    partition_column: str | None = None
+    partitions: int = Field(4, gt=0, le=MAX_PARTITIONS)
+    # whether the partitions are sent one after the other, in the order of their ranges, rather
+    # than as their rows come
+    ordered: bool = False
+
+
+T = TypeVar("T")
+
+# how often the connection of the client is checked while its queries run
+DISCONNECTION_CHECK_INTERVAL = 0.5
+
+
+async def run_until_disconnected(request: Request, coro: Awaitable[T]) -> T:
+    """
+    Cancels the coroutine (and hence its running queries) if the client disconnects,
+    since nobody would read its result
+    """
+    task = asyncio.ensure_future(coro)
+    try:
+        while not task.done():
+            await asyncio.wait({task}, timeout=DISCONNECTION_CHECK_INTERVAL)
+            if not task.done() and await request.is_disconnected():
+                task.cancel()
+                raise HTTPException(status_code=499, detail="Client closed request")
+        return task.result()
+    except QueryTimeoutError as e:
+        raise HTTPException(status_code=504, detail=f"Query timed out: {e}")
+    finally:
+        # e.g. if the request handler itself is cancelled
+        task.cancel()
 
 
-@app.post("/preview")
-async def get_preview(preview_query: PreviewQuery) -> list[dict[str, Any]]:
+def encode_cursor(values: Sequence[Any], *, sample_seed: int | None = None) -> str:
+    """The values of the last row, and the seed of the sample if the preview is sampled"""
+    cursor = {"after": list(values), "sampleSeed": sample_seed}
+    return base64.urlsafe_b64encode(json.dumps(cursor, default=str).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[list[Any], int | None]:
+    try:
+        decoded = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if (
+        not isinstance(decoded, dict)
+        or not isinstance(values := decoded.get("after"), list)
+        or not isinstance(sample_seed := decoded.get("sampleSeed"), int | None)
+        or (sample_seed is not None and not 0 <= sample_seed <= MAX_SAMPLE_SEED)
+    ):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values, sample_seed
+
+
+@app.post("/preview", response_class=FastJSONResponse)
+async def get_preview(
+    preview_query: PreviewQuery, request: Request, response: Response
+) -> Response:
+    accepts_arrow = ARROW_STREAM_MEDIA_TYPE in request.headers.get("accept", "")
+    if accepts_arrow:
+        try:
+            import pyarrow  # noqa
+        except ImportError:
+            raise HTTPException(status_code=406, detail="The Arrow format needs pyarrow")
+
+    result = await run_until_disconnected(request, _get_preview(preview_query, response))
+    # the headers set while getting the result
+    headers = dict(response.headers)
+
+    if accepts_arrow:
+        content = to_arrow_stream(result)
+        return Response(content=content, media_type=ARROW_STREAM_MEDIA_TYPE, headers=headers)
+    # the response is returned directly, so that FastAPI doesn't encode the result value by value
+    if preview_query.format == "columnar":
+        return FastJSONResponse(
+            {
+                "columns": result.column_names,
+                "types": [column.type for column in result.columns],
+                "data": result.to_columns(),
+            },
+            headers=headers,
+        )
+    return FastJSONResponse(result.to_records(), headers=headers)
+
+
+async def _get_preview(preview_query: PreviewQuery, response: Response) -> ResultSet:
     sql_dialect = preview_query.query_def.connection.dialect
     connection_config = preview_query.query_def.connection.config
 
     executor_cls = ALL_EXECUTORS[sql_dialect]
-    executor = executor_cls(connection_config)
+    executor = executor_cls(
+        connection_config, statement_timeout=preview_query.timeout, priority=preview_query.priority
+    )
+
+    tables_columns = await _get_tables_columns(executor, preview_query.tables)
+    if (watermark_column := _get_watermark_column(preview_query)) is not None:
+        return await _get_refreshed_preview(
+            executor,
+            preview_query,
+            response,
+            tables_columns=tables_columns,
+            column=watermark_column,
+        )
+
+    # the next pages start after the last row of the previous ones (keyset pagination), which
+    # is only identified by unique columns: rows with the same sort values would be skipped
+    pipeline = preview_query.query_def.pipeline
+    unique_columns = preview_query.unique_columns or []
+    keyset_columns = get_keyset_columns(pipeline.steps, unique_columns) if unique_columns else []
+    after: list[Any] | None = None
+    cursor_sample_seed: int | None = None
+    if preview_query.cursor is not None:
+        if not unique_columns:
+            raise HTTPException(status_code=400, detail="Cursors need unique columns")
+        after, cursor_sample_seed = decode_cursor(preview_query.cursor)
+        if len(after) != len(keyset_columns):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    # all the queries of a sampled preview (pivot values, page, count) and the ones of its next
+    # pages read the same sample
+    sample_seed: int | None = None
+    if preview_query.sample_percent is not None:
+        if preview_query.sample_seed is not None:
+            sample_seed = preview_query.sample_seed
+        elif cursor_sample_seed is not None:
+            sample_seed = cursor_sample_seed
+        else:
+            sample_seed = random.randint(0, MAX_SAMPLE_SEED)
+        response.headers["X-Sample-Seed"] = str(sample_seed)
+
+    # pivoted values become column names so they need to be known before translating the step
+    pivot_values = await _get_pivot_values(
+        executor,
+        pipeline,
+        tables_columns=tables_columns,
+        replace_whole_values=preview_query.replace_whole_values,
+        sample_percent=preview_query.sample_percent,
+        sample_seed=sample_seed,
+    )
+
+    translate = partial(
+        translate_pipeline_with_parameters,
+        sql_dialect=sql_dialect,
+        pipeline=pipeline,
+        tables_columns=tables_columns,
+        pivot_values=pivot_values,
+        replace_whole_values=preview_query.replace_whole_values,
+        approximate_aggregations=preview_query.approximate_aggregations,
+        sample_percent=preview_query.sample_percent,
+        sample_seed=sample_seed,
+        server_version=await executor.get_server_version(),
+    )
+    try:
+        sql_query, parameters = translate(
+            limit=preview_query.limit,
+            offset=preview_query.offset,
+            unique_columns=unique_columns,
+            after=after,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    tables_columns: dict[str, list[str]] = {}
-    for table_name in preview_query.tables or []:
-        tables_columns[table_name] = await executor.get_all_columns(table_name)
+    # the rows are only a sample of the result
+    response.headers["X-Sampled"] = str(preview_query.sample_percent is not None).lower()
 
-    sql_query = translate_pipeline(
+    if preview_query.total_count is None:
+        result = await executor.execute_columnar(sql_query, parameters)
+    else:
+        # the count runs concurrently with the page query, on its own connection
+        page_task = asyncio.ensure_future(executor.execute_columnar(sql_query, parameters))
+        count_task = asyncio.ensure_future(
+            _get_total_count(
+                executor,
+                translate,
+                pipeline,
+                estimate=preview_query.total_count == "estimate"
+                and preview_query.sample_percent is None,
+            )
+        )
+        try:
+            result, (total_count, is_estimate) = await asyncio.gather(page_task, count_task)
+        finally:
+            # when one of the queries fails, the other one would otherwise keep its slot and its
+            # connection until it is done
+            page_task.cancel()
+            count_task.cancel()
+            await asyncio.gather(page_task, count_task, return_exceptions=True)
+        response.headers["X-Total-Count"] = str(total_count)
+        response.headers["X-Total-Count-Estimated"] = str(is_estimate).lower()
+
+    if keyset_columns and preview_query.limit is not None and len(result) == preview_query.limit:
+        if missing_columns := set(keyset_columns) - set(result.column_names):
+            # e.g. after a custom SQL step, whose columns are only known now
+            raise HTTPException(
+                status_code=400,
+                detail=f"Can't paginate on columns missing from the result: {sorted(missing_columns)}",
+            )
+        last_row = result.get_row(-1)
+        response.headers["X-Next-Cursor"] = encode_cursor(
+            [last_row[column] for column in keyset_columns], sample_seed=sample_seed
+        )
+    return result
+
+
+def _get_watermark_column(preview_query: PreviewQuery) -> str | None:
+    """Returns the watermark column of the domain of the preview, if its result can be cached"""
+    steps = preview_query.query_def.pipeline.steps
+    if (
+        not preview_query.watermark_columns
+        or not steps
+        or not isinstance(steps[0], DomainStep)
+        or preview_query.limit is not None
+        or preview_query.offset is not None
+        or preview_query.cursor is not None
+        or preview_query.sample_percent is not None
+    ):
+        return None
+    return preview_query.watermark_columns.get(steps[0].domain)
+
+
+async def _get_refreshed_preview(
+    executor: SQLExecutor,
+    preview_query: PreviewQuery,
+    response: Response,
+    *,
+    tables_columns: dict[str, list[str]],
+    column: str,
+) -> ResultSet:
+    """
+    Returns the cached result of the preview if its domain has no new rows, or the cached result
+    followed by the result of the pipeline on the new rows if its steps are row-wise, or else
+    a new result. The `X-Refresh` header tells which one ("none", "incremental" or "full").
+    New rows are found by their watermark, and by the number of rows with one when the new rows
+    don't raise it: the ones without value are missed until a full refresh
+    """
+    pipeline = preview_query.query_def.pipeline
+    translate = partial(
+        translate_pipeline_with_parameters,
+        sql_dialect=executor.DIALECT,
+        tables_columns=tables_columns,
+        replace_whole_values=preview_query.replace_whole_values,
+        approximate_aggregations=preview_query.approximate_aggregations,
+        server_version=await executor.get_server_version(),
+    )
+    range_query, range_parameters = translate(pipeline=get_range_pipeline(pipeline, column))
+    [column_range] = await executor.execute(range_query, range_parameters)
+    watermark = column_range[MAX_COLUMN]
+    watermark_count = column_range[COUNT_COLUMN]
+
+    cache_key = hashlib.sha256(
+        preview_query.json(
+            include={"query_def", "tables", "replace_whole_values", "approximate_aggregations"}
+        ).encode()
+        + column.encode()
+    ).hexdigest()
+    cached_result = RESULT_CACHE.get(cache_key)
+
+    async def has_new_rows_up_to(cached_result: CachedResult) -> bool:
+        """Whether rows were added with a watermark that isn't higher than the cached one"""
+        range_query, range_parameters = translate(
+            pipeline=restrict_domain(
+                get_range_pipeline(pipeline, column),
+                {"column": column, "operator": "le", "value": cached_result.watermark},
+            )
+        )
+        [column_range] = await executor.execute(range_query, range_parameters)
+        return bool(column_range[COUNT_COLUMN] != cached_result.watermark_count)
+
+    if (
+        cached_result is not None
+        and cached_result.watermark == watermark
+        and cached_result.watermark_count == watermark_count
+    ):
+        refresh = "none"
+        result = cached_result.result
+        computed_at = cached_result.computed_at
+    elif (
+        cached_result is not None
+        and cached_result.watermark is not None
+        and watermark is not None
+        and watermark > cached_result.watermark
+        and can_refresh_incrementally(pipeline)
+        and not await has_new_rows_up_to(cached_result)
+    ):
+        refresh = "incremental"
+        new_rows_condition = {
+            "and": [
+                {"column": column, "operator": "gt", "value": cached_result.watermark},
+                {"column": column, "operator": "le", "value": watermark},
+            ]
+        }
+        sql_query, parameters = translate(pipeline=restrict_domain(pipeline, new_rows_condition))
+        new_result = await executor.execute_columnar(sql_query, parameters)
+        result = cached_result.result.concat(new_result)
+        computed_at = cached_result.computed_at
+    else:
+        refresh = "full"
+        pivot_values = await _get_pivot_values(
+            executor,
+            pipeline,
+            tables_columns=tables_columns,
+            replace_whole_values=preview_query.replace_whole_values,
+        )
+        if watermark is not None:
+            # the rows added meanwhile are left to the next refresh
+            pipeline = restrict_domain(
+                pipeline,
+                {
+                    "or": [
+                        {"column": column, "operator": "le", "value": watermark},
+                        {"column": column, "operator": "isnull"},
+                    ]
+                },
+            )
+        sql_query, parameters = translate(pipeline=pipeline, pivot_values=pivot_values)
+        result = await executor.execute_columnar(sql_query, parameters)
+        computed_at = time.monotonic()
+
+    RESULT_CACHE.set(
+        cache_key,
+        CachedResult(
+            result=result,
+            watermark=watermark,
+            watermark_count=watermark_count,
+            computed_at=computed_at,
+        ),
+    )
+    response.headers["X-Refresh"] = refresh
+    response.headers["X-Sampled"] = "false"
+    if preview_query.total_count is not None:
+        response.headers["X-Total-Count"] = str(len(result))
+        response.headers["X-Total-Count-Estimated"] = "false"
+    return result
+
+
+async def _get_tables_columns(
+    executor: SQLExecutor, tables: Sequence[str] | None
+) -> dict[str, list[str]]:
+    return {table_name: await executor.get_all_columns(table_name) for table_name in tables or []}
+
+
+async def _get_pivot_values(
+    executor: SQLExecutor,
+    pipeline: PipelineWithVariables,
+    *,
+    tables_columns: dict[str, list[str]],
+    replace_whole_values: bool,
+    sample_percent: float | None = None,
+    sample_seed: int | None = None,
+) -> dict[str, list[Any]]:
+    """Returns the values of the pivoted columns, which become column names"""
+    pivot_values: dict[str, list[Any]] = {}
+    for i, step in enumerate(pipeline.steps):
+        if isinstance(step, PivotStep):
+            values_query, values_parameters = translate_pipeline_with_parameters(
+                sql_dialect=executor.DIALECT,
+                pipeline=PipelineWithVariables(
+                    steps=[*pipeline.steps[:i], UniqueGroupsStep(on=[step.column_to_pivot])]
+                ),
+                tables_columns=tables_columns,
+                pivot_values=pivot_values,
+                replace_whole_values=replace_whole_values,
+                sample_percent=sample_percent,
+                sample_seed=sample_seed,
+                server_version=await executor.get_server_version(),
+            )
+            pivot_values[step.column_to_pivot] = [
+                r[step.column_to_pivot]
+                for r in await executor.execute(values_query, values_parameters)
+            ]
+    return pivot_values
+
+
+async def _get_total_count(
+    executor: SQLExecutor,
+    translate: Callable[..., tuple[str, list[Any]]],
+    pipeline: PipelineWithVariables,
+    *,
+    estimate: bool,
+) -> tuple[int, bool]:
+    """Returns the number of rows of the result and whether it is an estimate"""
+    # the catalog statistics only know the number of rows of whole tables
+    if estimate and len(pipeline.steps) == 1 and isinstance(pipeline.steps[0], DomainStep):
+        estimated_count = await executor.get_estimated_row_count(pipeline.steps[0].domain)
+        if estimated_count is not None:
+            return estimated_count, True
+
+    count_query, count_parameters = translate(count_only=True)
+    records = await executor.execute(count_query, count_parameters)
+    return records[0]["count"], False
+
+
+@app.post("/export")
+async def export(export_query: ExportQuery) -> StreamingResponse:
+    """
+    Streams the whole result of a pipeline as CSV, newline-delimited JSON or Parquet, with a
+    constant memory. Unlike previews, the rows are sent while they are read from the database
+    """
+    if export_query.format == "parquet":
+        try:
+            import pyarrow  # noqa
+        except ImportError:
+            raise HTTPException(status_code=406, detail="The Parquet format needs pyarrow")
+
+    sql_dialect = export_query.query_def.connection.dialect
+    connection_config = export_query.query_def.connection.config
+
+    executor_cls = ALL_EXECUTORS[sql_dialect]
+    executor = executor_cls(
+        connection_config, statement_timeout=export_query.timeout, priority=export_query.priority
+    )
+
+    tables_columns = await _get_tables_columns(executor, export_query.tables)
+    pipeline = export_query.query_def.pipeline
+    pivot_values = await _get_pivot_values(
+        executor,
+        pipeline,
+        tables_columns=tables_columns,
+        replace_whole_values=export_query.replace_whole_values,
+    )
+    translate = partial(
+        translate_pipeline_with_parameters,
         sql_dialect=sql_dialect,
-        pipeline=preview_query.query_def.pipeline,
         tables_columns=tables_columns,
+        pivot_values=pivot_values,
+        replace_whole_values=export_query.replace_whole_values,
+        server_version=await executor.get_server_version(),
+    )
+
+    chunks: AsyncIterator[bytes]
+    if export_query.partition_column is None:
+        sql_query, parameters = translate(pipeline=pipeline)
+        if export_query.format == "csv":
+            # the database can send the result as CSV by itself
+            chunks = executor.stream_csv(sql_query, parameters)
+        else:
+            chunks = _serialize_batches(executor.stream(sql_query, parameters), export_query)
+    else:
+        batches = await _stream_partitions(
+            executor,
+            translate,
+            pipeline,
+            column=export_query.partition_column,
+            partitions=export_query.partitions,
+            ordered=export_query.ordered,
+        )
+        chunks = _serialize_batches(batches, export_query)
+    return StreamingResponse(
+        await _start_streaming(chunks),
+        media_type=EXPORT_MEDIA_TYPES[export_query.format],
+        headers={"Content-Disposition": f'attachment; filename="export.{export_query.format}"'},
     )
 
-    return await executor.execute(sql_query)
+
+async def _start_streaming(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """
+    Waits for the first chunk before the response is started, so that the errors of the query
+    (no slot available, timeout...) get their own status code instead of truncating the body
+    """
+    try:
+        first_chunk = await anext(chunks)
+    except StopAsyncIteration:
+        return chunks
+    except QueryTimeoutError as e:
+        raise HTTPException(status_code=504, detail=f"Query timed out: {e}")
+    return _prepend(first_chunk, chunks)
+
+
+async def _prepend(item: T, items: AsyncIterator[T]) -> AsyncIterator[T]:
+    yield item
+    async for item in items:
+        yield item
+
+
+def _serialize_batches(
+    batches: AsyncIterator[tuple[list[ColumnDescription], Sequence[Sequence[Any]]]],
+    export_query: ExportQuery,
+) -> AsyncIterator[bytes]:
+    if export_query.format == "parquet":
+        return to_parquet_chunks(
+            batches,
+            row_group_size=export_query.row_group_size,
+            compression=export_query.parquet_compression,
+        )
+    if export_query.format == "ndjson":
+        return to_ndjson_chunks(batches)
+    return to_csv_chunks(batches)
+
+
+async def _stream_partitions(
+    executor: SQLExecutor,
+    translate: Callable[..., tuple[str, list[Any]]],
+    pipeline: PipelineWithVariables,
+    *,
+    column: str,
+    partitions: int,
+    ordered: bool,
+) -> AsyncIterator[tuple[list[ColumnDescription], Sequence[Sequence[Any]]]]:
+    """
+    Splits the range of a column of the domain of the pipeline and returns the merged batches of
+    rows of the queries of each range (and of the rows without value), run concurrently
+    """
+    try:
+        check_partitionable(pipeline)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    range_query, range_parameters = translate(pipeline=get_range_pipeline(pipeline, column))
+    [column_range] = await executor.execute(range_query, range_parameters)
+    if column_range[MIN_COLUMN] is None:
+        # no rows or no values
+        partitioned_pipelines = [pipeline]
+    else:
+        try:
+            bounds = get_partition_bounds(
+                column_range[MIN_COLUMN], column_range[MAX_COLUMN], partitions
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        conditions = get_partition_conditions(column, bounds)
+        partitioned_pipelines = get_partitioned_pipelines(pipeline, conditions)
+
+    streams = []
+    for partitioned_pipeline in partitioned_pipelines:
+        sql_query, parameters = translate(pipeline=partitioned_pipeline)
+        streams.append(executor.stream(sql_query, parameters))
+    return merge_streams(streams, ordered=ordered, concurrency=PARTITION_CONCURRENCY)
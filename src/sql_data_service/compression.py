@@ -0,0 +1,213 @@
+import zlib
+from typing import Protocol
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# responses smaller than this are sent as they are
+MINIMUM_SIZE = 1024
+# above this size (and for streamed responses, whose size is unknown), faster levels are used
+LARGE_PAYLOAD_SIZE = 1024 * 1024
+# media types of the responses that are already compressed
+COMPRESSED_MEDIA_TYPES = {"application/vnd.apache.parquet"}
+# compression level of each encoding for (small, large) payloads
+COMPRESSION_LEVELS = {"zstd": (9, 3), "br": (6, 4), "gzip": (6, 1)}
+
+
+class Compressor(Protocol):
+    def compress(self, data: bytes) -> bytes:
+        """Compresses a chunk, which may be buffered"""
+
+    def flush(self) -> bytes:
+        """Returns all the data compressed so far, so that it can be decompressed right away"""
+
+    def finish(self) -> bytes:
+        """Ends the compressed stream"""
+
+
+class GzipCompressor:
+    def __init__(self, level: int) -> None:
+        self._compressobj = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressobj.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressobj.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressobj.flush(zlib.Z_FINISH)
+
+
+class BrotliCompressor:
+    def __init__(self, level: int) -> None:
+        import brotli
+
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data: bytes) -> bytes:
+        compressed: bytes = self._compressor.process(data)
+        return compressed
+
+    def flush(self) -> bytes:
+        flushed: bytes = self._compressor.flush()
+        return flushed
+
+    def finish(self) -> bytes:
+        finished: bytes = self._compressor.finish()
+        return finished
+
+
+class ZstdCompressor:
+    def __init__(self, level: int) -> None:
+        import zstandard
+
+        self._flush_mode = zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        self._compressobj = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        compressed: bytes = self._compressobj.compress(data)
+        return compressed
+
+    def flush(self) -> bytes:
+        flushed: bytes = self._compressobj.flush(self._flush_mode)
+        return flushed
+
+    def finish(self) -> bytes:
+        finished: bytes = self._compressobj.flush()
+        return finished
+
+
+COMPRESSORS: dict[str, type[GzipCompressor | BrotliCompressor | ZstdCompressor]] = {
+    "zstd": ZstdCompressor,
+    "br": BrotliCompressor,
+    "gzip": GzipCompressor,
+}
+
+
+def get_available_encodings() -> list[str]:
+    """
+    Encodings that can be used, by order of preference.
+    `brotli` and `zstandard` are optional dependencies
+    """
+    encodings = []
+    for encoding, module_name in [("zstd", "zstandard"), ("br", "brotli")]:
+        try:
+            __import__(module_name)
+        except ImportError:
+            continue
+        encodings.append(encoding)
+    return [*encodings, "gzip"]
+
+
+AVAILABLE_ENCODINGS = get_available_encodings()
+
+
+def negotiate_encoding(accept_encoding: str, available_encodings: list[str]) -> str | None:
+    """Returns the available encoding with the highest quality in an `Accept-Encoding` header"""
+    qualities: dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        encoding, *params = (part.strip() for part in item.split(";"))
+        quality = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    quality = float(param.removeprefix("q="))
+                except ValueError:
+                    quality = 0
+        if encoding:
+            qualities[encoding.lower()] = quality
+
+    default_quality = qualities.get("*", 0)
+    candidates = [
+        encoding for encoding in available_encodings if qualities.get(encoding, default_quality) > 0
+    ]
+    if not candidates:
+        return None
+    # on a tie, the order of preference of the available encodings wins
+    return max(candidates, key=lambda encoding: qualities.get(encoding, default_quality))
+
+
+def get_compressor(encoding: str, payload_size: int | None) -> Compressor:
+    small_level, large_level = COMPRESSION_LEVELS[encoding]
+    is_large = payload_size is None or payload_size >= LARGE_PAYLOAD_SIZE
+    return COMPRESSORS[encoding](large_level if is_large else small_level)
+
+
+class CompressionMiddleware:
+    """
+    Compresses the responses with the best encoding accepted by the client (zstd, brotli or gzip).
+    Streamed responses are compressed chunk by chunk, and each compressed chunk is sent right away
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = MINIMUM_SIZE) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http":
+            accept_encoding = Headers(scope=scope).get("accept-encoding", "")
+            encoding = negotiate_encoding(accept_encoding, AVAILABLE_ENCODINGS)
+            if encoding is not None:
+                responder = CompressionResponder(self.app, encoding, self.minimum_size)
+                await responder(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+
+class CompressionResponder:
+    def __init__(self, app: ASGIApp, encoding: str, minimum_size: int) -> None:
+        self.app = app
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.send: Send
+        self.start_message: Message | None = None
+        # not set when the response is sent as it is
+        self.compressor: Compressor | None = None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    async def send_compressed(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            # the headers depend on the first chunk of the body
+            self.start_message = message
+            return
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        body: bytes = message.get("body", b"")
+        more_body: bool = message.get("more_body", False)
+        if self.start_message is not None:
+            start_message, self.start_message = self.start_message, None
+            headers = MutableHeaders(raw=start_message["headers"])
+            is_small = not more_body and len(body) < self.minimum_size
+            media_type = headers.get("content-type", "").partition(";")[0]
+            is_compressed = "content-encoding" in headers or media_type in COMPRESSED_MEDIA_TYPES
+            if not is_small and not is_compressed:
+                payload_size = None if more_body else len(body)
+                self.compressor = get_compressor(self.encoding, payload_size)
+                headers["content-encoding"] = self.encoding
+                headers.add_vary_header("Accept-Encoding")
+                if more_body and "content-length" in headers:
+                    del headers["content-length"]
+
+            if self.compressor is not None and not more_body:
+                # the whole body is there, so its compressed size is known
+                compressed = self.compressor.compress(body) + self.compressor.finish()
+                headers["content-length"] = str(len(compressed))
+                await self.send(start_message)
+                await self.send({"type": "http.response.body", "body": compressed})
+                return
+            await self.send(start_message)
+
+        if self.compressor is None:
+            await self.send(message)
+            return
+        # each chunk is flushed so that the client can decompress it as soon as it arrives
+        compressed = self.compressor.compress(body) + (
+            self.compressor.flush() if more_body else self.compressor.finish()
+        )
+        await self.send({"type": "http.response.body", "body": compressed, "more_body": more_body})
@@ -0,0 +1,153 @@
+from decimal import Decimal
+from typing import TYPE_CHECKING, Any, Hashable
+
+from weaverbird.pipeline.conditions import (
+    ComparisonCondition,
+    ConditionComboAnd,
+    ConditionComboOr,
+    InclusionCondition,
+    NullCondition,
+)
+
+if TYPE_CHECKING:
+    from weaverbird.pipeline.conditions import Condition
+
+
+def normalize_condition(condition: "Condition") -> "Condition | bool":
+    """
+    Simplifies a filter condition before its translation:
+    - nested `and` / `or` are flattened and single-child ones are unwrapped
+    - duplicated predicates are removed
+    - `eq` / `in` on the same column are merged into one `in` (union in an `or`,
+      intersection in an `and`) and `ne` / `nin` into one `nin` in an `and`
+    - contradictions and tautologies are folded into `False` / `True`
+    """
+    if isinstance(condition, ConditionComboAnd):
+        return _normalize_combo(condition.and_, is_and=True)
+    if isinstance(condition, ConditionComboOr):
+        return _normalize_combo(condition.or_, is_and=False)
+    if isinstance(condition, InclusionCondition):
+        match condition.value:
+            case []:
+                # nothing is in an empty list
+                return condition.operator == "nin"
+            case [value]:
+                return ComparisonCondition(
+                    column=condition.column,
+                    operator="eq" if condition.operator == "in" else "ne",
+                    value=value,
+                )
+    return condition
+
+
+def _normalize_combo(children: list["Condition"], *, is_and: bool) -> "Condition | bool":
+    # `False` absorbs a conjunction and `True` a disjunction
+    absorbing = not is_and
+    combo_cls = ConditionComboAnd if is_and else ConditionComboOr
+
+    flat_children: list["Condition"] = []
+    for child in children:
+        normalized_child = normalize_condition(child)
+        if isinstance(normalized_child, bool):
+            if normalized_child is absorbing:
+                return absorbing
+            continue
+        if isinstance(normalized_child, combo_cls):
+            flat_children.extend(normalized_child.and_ if is_and else normalized_child.or_)
+        else:
+            flat_children.append(normalized_child)
+
+    merged_children = _merge_memberships(flat_children, is_and=is_and)
+    if isinstance(merged_children, bool):
+        return merged_children
+
+    unique_children: dict[str, "Condition"] = {}
+    for child in merged_children:
+        unique_children.setdefault(child.json(), child)
+
+    null_operators: dict[str, set[str]] = {}
+    for child in unique_children.values():
+        if isinstance(child, NullCondition):
+            null_operators.setdefault(child.column, set()).add(child.operator)
+    if any(len(operators) == 2 for operators in null_operators.values()):
+        # `isnull` and `notnull` on the same column
+        return absorbing
+
+    match list(unique_children.values()):
+        case []:
+            return not absorbing
+        case [single_child]:
+            return single_child
+        case all_children:
+            return combo_cls(**{"and_" if is_and else "or_": all_children})
+
+
+def _membership(condition: "Condition") -> tuple[str, bool, list[Any]] | None:
+    """Returns (column, is_positive, values) for `eq`, `ne`, `in` and `nin` conditions"""
+    if isinstance(condition, ComparisonCondition) and condition.operator in ("eq", "ne"):
+        values = [condition.value]
+    elif isinstance(condition, InclusionCondition):
+        values = list(condition.value)
+    else:
+        return None
+
+    if not all(isinstance(v, Hashable) for v in values):
+        return None
+    return condition.column, condition.operator in ("eq", "in"), values
+
+
+def _get_value_key(value: Any) -> tuple[str, Any]:
+    """Numbers are compared by value (`1` is `1.0`), other values with their type (`True` isn't)"""
+    if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+        return "number", value
+    return type(value).__name__, value
+
+
+def _merge_memberships(conditions: list["Condition"], *, is_and: bool) -> list["Condition"] | bool:
+    # conditions are only merged with the ones whose values have the same kinds, since the
+    # database may convert values of other types (e.g. `'1'` to `1`)
+    merged: dict[tuple[str, bool, frozenset[str]], dict[tuple[str, Any], Any]] = {}
+    # index of the first condition of each (column, is_positive, value kinds) group
+    positions: dict[int, tuple[str, bool, frozenset[str]]] = {}
+    others: dict[int, "Condition"] = {}
+
+    for i, condition in enumerate(conditions):
+        membership = _membership(condition)
+        # in an `or`, `ne` / `nin` are kept as they are
+        if membership is None or (not is_and and not membership[1]):
+            others[i] = condition
+            continue
+
+        column, is_positive, values = membership
+        typed_values = {_get_value_key(v): v for v in values}
+        key = (column, is_positive, frozenset(kind for kind, _ in typed_values))
+        if key not in merged:
+            merged[key] = typed_values
+            positions[i] = key
+        elif is_and and is_positive:
+            merged[key] = {k: v for k, v in merged[key].items() if k in typed_values}
+        else:
+            merged[key].update(typed_values)
+
+    if any(is_positive and not values for (_, is_positive, _), values in merged.items()):
+        # the column can't be equal to values that don't exist
+        return False
+
+    result: list["Condition"] = []
+    for i in range(len(conditions)):
+        if i in others:
+            result.append(others[i])
+        elif i in positions:
+            column, is_positive, _ = positions[i]
+            result.append(
+                _build_membership(column, is_positive, list(merged[positions[i]].values()))
+            )
+    return result
+
+
+def _build_membership(column: str, is_positive: bool, values: list[Any]) -> "Condition":
+    if len(values) == 1:
+        return ComparisonCondition(
+            column=column, operator="eq" if is_positive else "ne", value=values[0]
+        )
+    return InclusionCondition(column=column, operator="in" if is_positive else "nin", value=values)
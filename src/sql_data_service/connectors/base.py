@@ -1,24 +1,251 @@
+import asyncio
+import datetime
+import math
 from abc import ABC, abstractmethod
-from typing import Any
+from contextlib import AbstractAsyncContextManager, aclosing
+from dataclasses import dataclass
+from typing import Any, AsyncGenerator, AsyncIterator, Sequence, TypeVar
+
+import numpy as np
 
 from sql_data_service.dialects import SQLDialect
 
 from . import ALL_EXECUTORS
+from .scheduler import QUERY_SCHEDULER, QueryPriority
+
+T = TypeVar("T")
+
+# number of rows fetched at once by the streamed queries
+STREAM_BATCH_SIZE = 10_000
+
+
+class QueryTimeoutError(Exception):
+    """The query has been cancelled by the server because it took too long"""
+
+
+def to_milliseconds(timeout: float) -> int:
+    """Timeout in milliseconds for the databases, for which 0 would disable it"""
+    return max(1, math.ceil(timeout * 1000))
+
+
+@dataclass(kw_only=True)
+class ColumnDescription:
+    name: str
+    # type of the column in the database, if known
+    type: str | None = None
+
+
+# NumPy types of the columns whose values all have the same fixed-size Python type
+COMPACT_DTYPES: dict[type, Any] = {
+    bool: np.bool_,
+    int: np.int64,
+    float: np.float64,
+    datetime.date: "datetime64[D]",
+    datetime.datetime: "datetime64[us]",
+}
+
+ColumnValues = list[Any] | np.ndarray
+
+
+def compact_column(values: list[Any]) -> ColumnValues:
+    """
+    Stores the values of a column in a NumPy array when possible (numbers, booleans, dates and
+    naive datetimes without nulls), which takes a few bytes per value instead of a Python object.
+    Other columns (strings, decimals, nullable columns, ...) are kept as lists
+    """
+    value_types = {type(value) for value in values}
+    if len(value_types) != 1:
+        return values
+    value_type = value_types.pop()
+    if value_type not in COMPACT_DTYPES:
+        return values
+    if value_type is datetime.datetime and any(value.tzinfo for value in values):
+        return values
+    try:
+        return np.array(values, dtype=COMPACT_DTYPES[value_type])
+    except OverflowError:
+        # integers out of the int64 range
+        return values
+
+
+@dataclass(kw_only=True)
+class ResultSet:
+    """Result of a query, stored column by column"""
+
+    columns: list[ColumnDescription]
+    # values of each column, in a NumPy array or a list (see `compact_column`)
+    data: list[ColumnValues]
+
+    @classmethod
+    def from_rows(
+        cls, columns: list[ColumnDescription], rows: Sequence[Sequence[Any]]
+    ) -> "ResultSet":
+        data = [compact_column(list(values)) for values in zip(*rows)] if rows else []
+        return cls(columns=columns, data=data or [[] for _ in columns])
+
+    @property
+    def column_names(self) -> list[str]:
+        return [column.name for column in self.columns]
+
+    def __len__(self) -> int:
+        return len(self.data[0]) if self.data else 0
+
+    def get_column(self, index: int) -> list[Any]:
+        """Values of a column as Python objects"""
+        values = self.data[index]
+        if isinstance(values, np.ndarray):
+            python_values: list[Any] = values.tolist()
+            return python_values
+        return values
+
+    def to_columns(self) -> list[list[Any]]:
+        return [self.get_column(index) for index in range(len(self.columns))]
+
+    def get_row(self, index: int) -> dict[str, Any]:
+        return {
+            column.name: values[index].item() if isinstance(values, np.ndarray) else values[index]
+            for column, values in zip(self.columns, self.data)
+        }
+
+    def to_records(self) -> list[dict[str, Any]]:
+        column_names = self.column_names
+        return [dict(zip(column_names, row)) for row in zip(*self.to_columns())]
+
+    def concat(self, other: "ResultSet") -> "ResultSet":
+        """Rows of this result followed by the ones of another result with the same columns"""
+        data: list[ColumnValues] = []
+        for index, (values, other_values) in enumerate(zip(self.data, other.data)):
+            if (
+                isinstance(values, np.ndarray)
+                and isinstance(other_values, np.ndarray)
+                and values.dtype == other_values.dtype
+            ):
+                data.append(np.concatenate([values, other_values]))
+            else:
+                data.append(compact_column([*self.get_column(index), *other.get_column(index)]))
+        return ResultSet(columns=self.columns, data=data)
 
 
 class SQLExecutor(ABC):
     DIALECT: SQLDialect
 
-    def __init__(self, conn_config: Any) -> None:
+    def __init__(
+        self,
+        conn_config: Any,
+        *,
+        statement_timeout: float | None = None,
+        priority: QueryPriority = QueryPriority.INTERACTIVE,
+    ) -> None:
         self.conn_config = conn_config
+        self.priority = priority
+        # the timeout of the request takes precedence over the one of the connection
+        self.statement_timeout: float | None = (
+            statement_timeout if statement_timeout is not None else conn_config.statement_timeout
+        )
 
     def __init_subclass__(cls) -> None:
         ALL_EXECUTORS[cls.DIALECT] = cls
 
+    async def execute(self, sql_query: str, parameters: Sequence[Any] = ()) -> list[dict[str, Any]]:
+        """
+        Executes a SQL query with the values of its parameters (if any), once the database
+        can take it. Cancelling the task cancels the query on the server
+        """
+        columns, rows = await self._fetch_when_possible(sql_query, parameters)
+        column_names = [column.name for column in columns]
+        return [dict(zip(column_names, row)) for row in rows]
+
+    async def execute_columnar(self, sql_query: str, parameters: Sequence[Any] = ()) -> ResultSet:
+        """Like `execute`, without building a `dict` for each row"""
+        columns, rows = await self._fetch_when_possible(sql_query, parameters)
+        return ResultSet.from_rows(columns, rows)
+
+    async def stream(
+        self, sql_query: str, parameters: Sequence[Any] = ()
+    ) -> AsyncIterator[tuple[list[ColumnDescription], Sequence[Sequence[Any]]]]:
+        """
+        Like `execute`, but yields the columns and the rows batch by batch, so that the whole
+        result is never in memory. The database is used until the last batch has been read
+        """
+        # the query is stopped right away when the stream is closed
+        async with self._get_slot(), aclosing(self._stream(sql_query, parameters)) as batches:
+            async for columns, rows in batches:
+                yield columns, rows
+
+    async def stream_csv(
+        self, sql_query: str, parameters: Sequence[Any] = ()
+    ) -> AsyncIterator[bytes]:
+        """Like `stream`, but yields the result as CSV (with a header), chunk by chunk"""
+        async with self._get_slot(), aclosing(self._stream_csv(sql_query, parameters)) as chunks:
+            async for chunk in chunks:
+                yield chunk
+
+    async def _fetch_when_possible(
+        self, sql_query: str, parameters: Sequence[Any]
+    ) -> tuple[list[ColumnDescription], Sequence[Sequence[Any]]]:
+        async with self._get_slot():
+            return await self._fetch(sql_query, parameters)
+
+    def _get_slot(self) -> AbstractAsyncContextManager[None]:
+        """Waits for the database to be able to take a query"""
+        return QUERY_SCHEDULER.slot(self._get_backend_key(), self.priority)
+
+    def _get_backend_key(self) -> tuple[Any, ...]:
+        return (
+            self.DIALECT,
+            self.conn_config.host,
+            self.conn_config.port,
+            self.conn_config.database,
+        )
+
+    @abstractmethod
+    async def _fetch(
+        self, sql_query: str, parameters: Sequence[Any] = ()
+    ) -> tuple[list[ColumnDescription], Sequence[Sequence[Any]]]:
+        """Executes a SQL query right away and returns its columns and its rows (as tuples)"""
+
+    @abstractmethod
+    def _stream(
+        self, sql_query: str, parameters: Sequence[Any] = ()
+    ) -> AsyncGenerator[tuple[list[ColumnDescription], Sequence[Sequence[Any]]], None]:
+        """
+        Executes a SQL query right away and yields its columns and its rows by batches of
+        `STREAM_BATCH_SIZE`. The first batch is yielded even if it is empty
+        """
+
+    async def _stream_csv(
+        self, sql_query: str, parameters: Sequence[Any]
+    ) -> AsyncGenerator[bytes, None]:
+        # imported here since the formats depend on the result sets of this module
+        from sql_data_service.formats import to_csv_chunks
+
+        async with aclosing(self._stream(sql_query, parameters)) as batches:
+            async for chunk in to_csv_chunks(batches):
+                yield chunk
+
+    async def get_server_version(self) -> str | None:
+        """Returns the version of the database server, if the translation depends on it"""
+        return None
+
     @abstractmethod
-    async def execute(self, sql_query: str) -> list[dict[str, Any]]:
-        """Executes a SQL query"""
+    async def get_estimated_row_count(self, table_name: str) -> int | None:
+        """Returns the number of rows of a table according to the catalog statistics, if any"""
 
     @abstractmethod
     async def get_all_columns(self, table_name: str) -> list[str]:
         """Returns all columns of a table"""
+
+
+async def get_or_raise(queue: "asyncio.Queue[T]", *tasks: "asyncio.Task[None]") -> T:
+    """Waits for the next item of the queue, unless one of the tasks filling it fails"""
+    get_task = asyncio.create_task(queue.get())
+    try:
+        while not get_task.done():
+            await asyncio.wait({get_task, *tasks}, return_when=asyncio.FIRST_COMPLETED)
+            for task in tasks:
+                if task.done() and not task.cancelled() and (error := task.exception()):
+                    raise error
+            tasks = tuple(task for task in tasks if not task.done())
+        return get_task.result()
+    finally:
+        get_task.cancel()
@@ -1,29 +1,142 @@
-from typing import Any
+import asyncio
+from typing import Any, AsyncGenerator, Sequence
 
 import aiomysql
 
 from sql_data_service.dialects import SQLDialect
 from sql_data_service.models.mysql import MySQLConnectionConfig
 
-from .base import SQLExecutor
+from .base import (
+    STREAM_BATCH_SIZE,
+    ColumnDescription,
+    QueryTimeoutError,
+    SQLExecutor,
+    to_milliseconds,
+)
+from .scheduler import QueryPriority
+
+# "Query execution was interrupted, maximum statement execution time exceeded"
+ER_QUERY_TIMEOUT = 3024
+
+# https://dev.mysql.com/doc/dev/mysql-server/latest/field__types_8h.html
+FIELD_TYPE_NAMES = {
+    0: "decimal",
+    1: "tiny",
+    2: "short",
+    3: "long",
+    4: "float",
+    5: "double",
+    6: "null",
+    7: "timestamp",
+    8: "longlong",
+    9: "int24",
+    10: "date",
+    11: "time",
+    12: "datetime",
+    13: "year",
+    15: "varchar",
+    16: "bit",
+    245: "json",
+    246: "newdecimal",
+    247: "enum",
+    248: "set",
+    252: "blob",
+    253: "var_string",
+    254: "string",
+}
+
+# version of each server (by backend key), only fetched once
+SERVER_VERSIONS: dict[tuple[Any, ...], str] = {}
 
 
 class MySQLExecutor(SQLExecutor):
     DIALECT = SQLDialect.MYSQL
 
-    def __init__(self, conn_config: MySQLConnectionConfig) -> None:
-        self.conn_config = conn_config
+    def __init__(
+        self,
+        conn_config: MySQLConnectionConfig,
+        *,
+        statement_timeout: float | None = None,
+        priority: QueryPriority = QueryPriority.INTERACTIVE,
+    ) -> None:
+        super().__init__(conn_config, statement_timeout=statement_timeout, priority=priority)
 
-    async def execute(self, sql_query: str) -> list[dict[str, Any]]:
-        conn = await get_connection(self.conn_config)
+    async def _fetch(
+        self, sql_query: str, parameters: Sequence[Any] = ()
+    ) -> tuple[list[ColumnDescription], Sequence[Sequence[Any]]]:
+        conn = await get_connection(self.conn_config, statement_timeout=self.statement_timeout)
 
-        async with conn.cursor(aiomysql.DictCursor) as cur:
-            assert isinstance(cur, aiomysql.Cursor)
-            await cur.execute(sql_query)
-            dict_records: list[dict[str, Any]] = await cur.fetchall()
+        try:
+            async with conn.cursor() as cur:
+                assert isinstance(cur, aiomysql.Cursor)
+                await cur.execute(sql_query, parameters or None)
+                rows: Sequence[Sequence[Any]] = await cur.fetchall()
+                columns = [
+                    ColumnDescription(name=name, type=FIELD_TYPE_NAMES.get(type_code))
+                    for name, type_code, *_ in cur.description or []
+                ]
+        except asyncio.CancelledError:
+            # the connection is busy with the query, which has to be killed from another one
+            await kill_query(self.conn_config, conn.thread_id())
+            raise
+        except aiomysql.OperationalError as e:
+            if e.args[0] == ER_QUERY_TIMEOUT:
+                raise QueryTimeoutError(str(e)) from e
+            raise
+        finally:
+            conn.close()
+        return columns, rows
 
-        conn.close()
-        return dict_records
+    async def _stream(
+        self, sql_query: str, parameters: Sequence[Any] = ()
+    ) -> AsyncGenerator[tuple[list[ColumnDescription], Sequence[Sequence[Any]]], None]:
+        conn = await get_connection(self.conn_config, statement_timeout=self.statement_timeout)
+
+        try:
+            # unbuffered: the rows are read from the connection as they are fetched
+            cur = await conn.cursor(aiomysql.SSCursor)
+            await cur.execute(sql_query, parameters or None)
+            columns = [
+                ColumnDescription(name=name, type=FIELD_TYPE_NAMES.get(type_code))
+                for name, type_code, *_ in cur.description or []
+            ]
+            rows: Sequence[Sequence[Any]] = await cur.fetchmany(STREAM_BATCH_SIZE)
+            yield columns, rows
+            while len(rows) == STREAM_BATCH_SIZE:
+                rows = await cur.fetchmany(STREAM_BATCH_SIZE)
+                yield columns, rows
+            await cur.close()
+        except (asyncio.CancelledError, GeneratorExit):
+            # the rows that have not been read would otherwise be read before closing the cursor
+            await kill_query(self.conn_config, conn.thread_id())
+            raise
+        except aiomysql.OperationalError as e:
+            if e.args[0] == ER_QUERY_TIMEOUT:
+                raise QueryTimeoutError(str(e)) from e
+            raise
+        finally:
+            conn.close()
+
+    async def get_server_version(self) -> str | None:
+        backend_key = self._get_backend_key()
+        if backend_key not in SERVER_VERSIONS:
+            [record] = await self.execute("SELECT VERSION() AS version")
+            SERVER_VERSIONS[backend_key] = record["version"]
+        return SERVER_VERSIONS[backend_key]
+
+    async def get_estimated_row_count(self, table_name: str) -> int | None:
+        records = await self.execute(
+            """
+            SELECT table_rows
+            FROM information_schema.tables
+            WHERE table_schema = DATABASE() AND table_name = %s
+        """,
+            [table_name],
+        )
+        if not records or records[0]["TABLE_ROWS"] is None:
+            return None
+        estimate: int = records[0]["TABLE_ROWS"]
+        return estimate
 
     async def get_all_columns(self, table_name: str) -> list[str]:
         records = await self.execute(
@@ -40,11 +153,27 @@ class MySQLExecutor(SQLExecutor):
 SQLExecutor.register(MySQLExecutor)
 
 
-async def get_connection(mysql_config: MySQLConnectionConfig) -> aiomysql.Connection:
+async def get_connection(
+    mysql_config: MySQLConnectionConfig, *, statement_timeout: float | None = None
+) -> aiomysql.Connection:
+    init_command = None
+    if statement_timeout is not None:
+        # only applies to `SELECT` statements
+        init_command = f"SET SESSION MAX_EXECUTION_TIME = {to_milliseconds(statement_timeout)}"
     return await aiomysql.connect(
         host=mysql_config.host,
         port=mysql_config.port,
         user=mysql_config.user,
         password=mysql_config.password,
         db=mysql_config.database,
+        init_command=init_command,
     )
+
+
+async def kill_query(mysql_config: MySQLConnectionConfig, thread_id: int) -> None:
+    conn = await get_connection(mysql_config)
+    try:
+        async with conn.cursor() as cur:
+            await cur.execute(f"KILL QUERY {int(thread_id)}")
+    finally:
+        conn.close()
@@ -1,24 +1,124 @@
-from typing import Any
+import asyncio
+from typing import Any, AsyncGenerator, Sequence
 
 import asyncpg
 
 from sql_data_service.dialects import SQLDialect
 from sql_data_service.models.postgresql import PostgreSQLConnectionConfig
 
-from .base import SQLExecutor
+from .base import (
+    STREAM_BATCH_SIZE,
+    ColumnDescription,
+    QueryTimeoutError,
+    SQLExecutor,
+    get_or_raise,
+    to_milliseconds,
+)
+from .scheduler import QueryPriority
+
+# number of chunks of a COPY output waiting to be sent to the client, to bound the memory
+COPY_BUFFER_SIZE = 16
 
 
 class PostgreSQLExecutor(SQLExecutor):
     DIALECT = SQLDialect.POSTGRESQL
 
-    def __init__(self, conn_config: PostgreSQLConnectionConfig) -> None:
-        self.conn_config = conn_config
+    def __init__(
+        self,
+        conn_config: PostgreSQLConnectionConfig,
+        *,
+        statement_timeout: float | None = None,
+        priority: QueryPriority = QueryPriority.INTERACTIVE,
+    ) -> None:
+        super().__init__(conn_config, statement_timeout=statement_timeout, priority=priority)
+
+    async def _fetch(
+        self, sql_query: str, parameters: Sequence[Any] = ()
+    ) -> tuple[list[ColumnDescription], Sequence[Sequence[Any]]]:
+        conn = await get_connection(self.conn_config, statement_timeout=self.statement_timeout)
+        try:
+            statement = await conn.prepare(sql_query)
+            # asyncpg sends a cancellation request for the running query when the task is cancelled
+            records = await statement.fetch(*parameters)
+        except asyncpg.QueryCanceledError as e:
+            raise QueryTimeoutError(str(e)) from e
+        finally:
+            await conn.close()
+        columns = [
+            ColumnDescription(name=attribute.name, type=attribute.type.name)
+            for attribute in statement.get_attributes()
+        ]
+        # records are tuples that can also be accessed by column name
+        return columns, records
+
+    async def _stream(
+        self, sql_query: str, parameters: Sequence[Any] = ()
+    ) -> AsyncGenerator[tuple[list[ColumnDescription], Sequence[Sequence[Any]]], None]:
+        conn = await get_connection(self.conn_config, statement_timeout=self.statement_timeout)
+        try:
+            # cursors only live in a transaction
+            async with conn.transaction():
+                statement = await conn.prepare(sql_query)
+                columns = [
+                    ColumnDescription(name=attribute.name, type=attribute.type.name)
+                    for attribute in statement.get_attributes()
+                ]
+                cursor = await statement.cursor(*parameters)
+                records = await cursor.fetch(STREAM_BATCH_SIZE)
+                yield columns, records
+                while len(records) == STREAM_BATCH_SIZE:
+                    records = await cursor.fetch(STREAM_BATCH_SIZE)
+                    yield columns, records
+        except asyncpg.QueryCanceledError as e:
+            raise QueryTimeoutError(str(e)) from e
+        finally:
+            await conn.close()
 
-    async def execute(self, sql_query: str) -> list[dict[str, Any]]:
-        conn = await get_connection(self.conn_config)
-        records = await conn.fetch(sql_query)
-        await conn.close()
-        return [dict(r) for r in records]
+    async def _stream_csv(
+        self, sql_query: str, parameters: Sequence[Any]
+    ) -> AsyncGenerator[bytes, None]:
+        """`COPY ... TO STDOUT` sends the whole result as CSV, much faster than a cursor"""
+        conn = await get_connection(self.conn_config, statement_timeout=self.statement_timeout)
+        # the server waits while the buffer is full
+        chunks: asyncio.Queue[bytes | None] = asyncio.Queue(maxsize=COPY_BUFFER_SIZE)
+
+        async def copy() -> None:
+            try:
+                await conn.copy_from_query(
+                    sql_query, *parameters, output=chunks.put, format="csv", header=True
+                )
+            except asyncpg.QueryCanceledError as e:
+                raise QueryTimeoutError(str(e)) from e
+            # only sent when the COPY succeeds: after an error or a cancellation, nobody may be
+            # reading the (full) buffer anymore
+            await chunks.put(None)
+
+        copy_task = asyncio.create_task(copy())
+        try:
+            # raises the error of the COPY, if any
+            while (chunk := await get_or_raise(chunks, copy_task)) is not None:
+                yield chunk
+        finally:
+            copy_task.cancel()
+            await asyncio.gather(copy_task, return_exceptions=True)
+            await conn.close()
+
+    async def get_estimated_row_count(self, table_name: str) -> int | None:
+        # the table is the one of the queries (quoted, in the search path), not an index or a
+        # table of another schema with the same name
+        records = await self.execute(
+            """
+            SELECT reltuples::BIGINT AS estimate
+            FROM pg_class
+            WHERE oid = to_regclass(quote_ident($1)) AND relkind IN ('r', 'p')
+        """,
+            [table_name],
+        )
+        # tables that have never been analyzed have -1 tuples (0 before PostgreSQL 14)
+        if not records or records[0]["estimate"] <= 0:
+            return None
+        estimate: int = records[0]["estimate"]
+        return estimate
 
     async def get_all_columns(self, table_name: str) -> list[str]:
         records = await self.execute(
@@ -35,11 +135,33 @@ class PostgreSQLExecutor(SQLExecutor):
 SQLExecutor.register(PostgreSQLExecutor)
 
 
-async def get_connection(postgresql_config: PostgreSQLConnectionConfig) -> asyncpg.Connection:
-    return await asyncpg.connect(
+async def get_connection(
+    postgresql_config: PostgreSQLConnectionConfig, *, statement_timeout: float | None = None
+) -> asyncpg.Connection:
+    server_settings = {}
+    if statement_timeout is not None:
+        server_settings["statement_timeout"] = str(to_milliseconds(statement_timeout))
+    conn = await asyncpg.connect(
         host=postgresql_config.host,
         port=postgresql_config.port,
         user=postgresql_config.user,
         password=postgresql_config.password,
         database=postgresql_config.database,
+        server_settings=server_settings,
     )
+    await set_type_codecs(conn, postgresql_config)
+    return conn
+
+
+async def set_type_codecs(
+    conn: asyncpg.Connection, postgresql_config: PostgreSQLConnectionConfig
+) -> None:
+    """
+    Registers the codecs of the connection. `json` and `jsonb` values are already passed through
+    as text by asyncpg, without being parsed
+    """
+    if postgresql_config.numeric_as_float:
+        # the text representation ('1.5', 'NaN', 'Infinity') is parsed directly by `float`
+        await conn.set_type_codec(
+            "numeric", schema="pg_catalog", encoder=str, decoder=float, format="text"
+        )
@@ -0,0 +1,253 @@
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Any, AsyncIterator, Hashable, Mapping
+
+
+class QueryQueueFullError(Exception):
+    """Too many queries are already waiting for the database"""
+
+    def __init__(self, retry_after: int) -> None:
+        super().__init__(f"Too many queries are waiting, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class QueryQueueTimeoutError(Exception):
+    """The query waited too long for the database"""
+
+    def __init__(self, retry_after: int) -> None:
+        super().__init__(f"The query waited too long, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class QueryPriority(str, Enum):
+    # previews of the pipeline editor, which need a bounded latency
+    INTERACTIVE = "interactive"
+    # large extractions, which can use the spare capacity
+    BULK = "bulk"
+
+
+# share of the running queries of a database that is kept for each priority
+DEFAULT_RESERVED_SHARES = {QueryPriority.INTERACTIVE: 0.5, QueryPriority.BULK: 0.1}
+# when a query finishes, the waiting queries of each priority get the slot in this proportion
+DEFAULT_WEIGHTS = {QueryPriority.INTERACTIVE: 4, QueryPriority.BULK: 1}
+
+
+@dataclass(kw_only=True)
+class QueryLimits:
+    # number of queries running at the same time on the database
+    max_concurrency: int
+    # number of queries of each priority waiting for one of them to finish
+    max_queued: int
+    # maximum duration of the wait in seconds
+    queue_timeout: float
+    reserved_shares: Mapping[QueryPriority, float] = field(
+        default_factory=lambda: DEFAULT_RESERVED_SHARES
+    )
+    weights: Mapping[QueryPriority, int] = field(default_factory=lambda: DEFAULT_WEIGHTS)
+
+    def get_reserved_slots(self, priority: QueryPriority) -> int:
+        return math.floor(self.max_concurrency * self.reserved_shares.get(priority, 0))
+
+
+# limits of the databases that have none of their own (see `QueryScheduler.set_limits`).
+# They are settings of the service: the clients must not be able to take more of a database
+DEFAULT_QUERY_LIMITS = QueryLimits(
+    max_concurrency=int(os.environ.get("MAX_CONCURRENT_QUERIES", 10)),
+    max_queued=int(os.environ.get("MAX_QUEUED_QUERIES", 50)),
+    queue_timeout=float(os.environ.get("QUEUE_TIMEOUT", 30)),
+)
+
+
+@dataclass(kw_only=True)
+class BackendQueue:
+    """Queries running or waiting to run on a database"""
+
+    limits: QueryLimits
+    admitted: int = 0
+    rejected: int = 0
+    timed_out: int = 0
+    # moving average of the duration of the queries, to know when to come back
+    average_duration: float = 1.0
+    _running: dict[QueryPriority, int] = field(
+        default_factory=lambda: {priority: 0 for priority in QueryPriority}
+    )
+    _waiters: dict[QueryPriority, deque["asyncio.Future[None]"]] = field(
+        default_factory=lambda: {priority: deque() for priority in QueryPriority}
+    )
+    # number of slots given to waiting queries of each priority, to apply the weights
+    _served: dict[QueryPriority, float] = field(
+        default_factory=lambda: {priority: 0 for priority in QueryPriority}
+    )
+
+    @property
+    def running(self) -> int:
+        return sum(self._running.values())
+
+    @property
+    def queued(self) -> int:
+        return sum(self.get_queued(priority) for priority in QueryPriority)
+
+    def get_running(self, priority: QueryPriority) -> int:
+        return self._running[priority]
+
+    def get_queued(self, priority: QueryPriority) -> int:
+        return sum(not waiter.done() for waiter in self._waiters[priority])
+
+    def get_retry_after(self) -> int:
+        """Number of seconds before the queued queries should be done"""
+        pending = self.queued + self.running
+        return max(1, math.ceil(self.average_duration * pending / self.limits.max_concurrency))
+
+    def can_run(self, priority: QueryPriority) -> bool:
+        # the slots reserved for the other priorities and not used by them are off-limits
+        unused_reserved_slots = sum(
+            max(0, self.limits.get_reserved_slots(other) - self._running[other])
+            for other in QueryPriority
+            if other is not priority
+        )
+        return self.running < self.limits.max_concurrency - unused_reserved_slots
+
+    async def acquire(self, priority: QueryPriority) -> None:
+        if not self.get_queued(priority) and self.can_run(priority):
+            self._running[priority] += 1
+            self.admitted += 1
+            return
+
+        if self.get_queued(priority) >= self.limits.max_queued:
+            self.rejected += 1
+            raise QueryQueueFullError(self.get_retry_after())
+
+        if not self.get_queued(priority):
+            self._reset_served(priority)
+        # a finishing query hands its slot over
+        waiter: "asyncio.Future[None]" = asyncio.get_running_loop().create_future()
+        self._waiters[priority].append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.limits.queue_timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise QueryQueueTimeoutError(self.get_retry_after())
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # the slot has been handed over right before the cancellation
+                self.release(priority)
+            raise
+        finally:
+            if waiter in self._waiters[priority]:
+                self._waiters[priority].remove(waiter)
+        self.admitted += 1
+
+    def release(self, priority: QueryPriority) -> None:
+        self._running[priority] -= 1
+        while (next_priority := self._get_next_priority()) is not None:
+            waiter = self._waiters[next_priority].popleft()
+            if not waiter.done():
+                self._running[next_priority] += 1
+                self._served[next_priority] += 1
+                waiter.set_result(None)
+
+    def _get_next_priority(self) -> QueryPriority | None:
+        """The priority with waiting queries that can run and got the fewest slots for its weight"""
+        candidates = [
+            priority
+            for priority in QueryPriority
+            if self._waiters[priority] and self.can_run(priority)
+        ]
+        if not candidates:
+            return None
+        return min(
+            candidates,
+            key=lambda priority: self._served[priority] / self.limits.weights.get(priority, 1),
+        )
+
+    def _reset_served(self, priority: QueryPriority) -> None:
+        """
+        Makes a priority that starts queueing compete with the others as they stand now: the slots
+        it got before its queue emptied must not let the others take all the next ones
+        """
+        weight = self.limits.weights.get(priority, 1)
+        self._served[priority] = max(
+            (
+                self._served[other] / self.limits.weights.get(other, 1) * weight
+                for other in QueryPriority
+                if other is not priority and self.get_queued(other)
+            ),
+            default=0,
+        )
+
+    def record_duration(self, duration: float) -> None:
+        self.average_duration = 0.9 * self.average_duration + 0.1 * duration
+
+
+class QueryScheduler:
+    """
+    Admission control in front of the databases: each of them (identified by its connection
+    config) has a limited number of running queries and a bounded queue of waiting ones
+    """
+
+    def __init__(self, default_limits: QueryLimits = DEFAULT_QUERY_LIMITS) -> None:
+        self.default_limits = default_limits
+        self._limits: dict[Hashable, QueryLimits] = {}
+        self._backends: dict[Hashable, BackendQueue] = {}
+
+    def set_limits(self, key: Hashable, limits: QueryLimits) -> None:
+        """
+        Sets the limits of a database, e.g. to let a warehouse run more queries. Executors identify
+        their database by `(dialect, host, port, database)`
+        """
+        self._limits[key] = limits
+        if key in self._backends:
+            self._backends[key].limits = limits
+
+    def get_backend(self, key: Hashable) -> BackendQueue:
+        try:
+            return self._backends[key]
+        except KeyError:
+            limits = self._limits.get(key, self.default_limits)
+            backend = self._backends[key] = BackendQueue(limits=limits)
+            return backend
+
+    @asynccontextmanager
+    async def slot(
+        self, key: Hashable, priority: QueryPriority = QueryPriority.INTERACTIVE
+    ) -> AsyncIterator[None]:
+        backend = self.get_backend(key)
+        await backend.acquire(priority)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            backend.record_duration(time.monotonic() - start)
+            backend.release(priority)
+
+    def get_metrics(self) -> dict[str, dict[str, Any]]:
+        return {
+            str(key): {
+                "running": backend.running,
+                "queued": backend.queued,
+                "admitted": backend.admitted,
+                "rejected": backend.rejected,
+                "timed_out": backend.timed_out,
+                "average_duration": backend.average_duration,
+                "max_concurrency": backend.limits.max_concurrency,
+                "max_queued": backend.limits.max_queued,
+                **{
+                    f"{priority.value}_{metric}": value
+                    for priority in QueryPriority
+                    for metric, value in [
+                        ("running", backend.get_running(priority)),
+                        ("queued", backend.get_queued(priority)),
+                    ]
+                },
+            }
+            for key, backend in self._backends.items()
+        }
+
+
+QUERY_SCHEDULER = QueryScheduler()
@@ -0,0 +1,298 @@
+import asyncio
+import csv
+import datetime
+import io
+import json
+from decimal import Decimal
+from typing import Any, AsyncIterator, Literal, Sequence
+from uuid import UUID
+
+import numpy as np
+from fastapi.responses import JSONResponse
+
+from sql_data_service.connectors.base import ColumnDescription, ResultSet
+
+ExportFormat = Literal["csv", "ndjson", "parquet"]
+PARQUET_MEDIA_TYPE = "application/vnd.apache.parquet"
+EXPORT_MEDIA_TYPES: dict[ExportFormat, str] = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": PARQUET_MEDIA_TYPE,
+}
+
+ParquetCompression = Literal["none", "snappy", "gzip", "brotli", "zstd", "lz4"]
+# number of rows of each row group of a Parquet file, which are kept in memory until written
+DEFAULT_PARQUET_ROW_GROUP_SIZE = 100_000
+
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+# number of rows of each record batch of an Arrow stream
+ARROW_BATCH_SIZE = 65_536
+
+
+def to_arrow_stream(result: ResultSet) -> bytes:
+    """
+    Serializes a result in the Arrow IPC streaming format, column by column.
+    Types come from the types of the columns in the database, like for Parquet, and strings are
+    dictionary-encoded. Needs `pyarrow`, which is an optional dependency
+    """
+    import pyarrow as pa
+
+    arrays = []
+    for column, values in zip(result.columns, result.data):
+        array = _to_arrow_array(values, get_arrow_type(column.type))
+        if pa.types.is_string(array.type):
+            array = array.dictionary_encode()
+        arrays.append(array)
+    table = pa.Table.from_arrays(arrays, names=result.column_names)
+
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table, max_chunksize=ARROW_BATCH_SIZE)
+    stream: bytes = sink.getvalue().to_pybytes()
+    return stream
+
+
+def _to_json_compatible(value: Any) -> Any:
+    """Converts the values returned by the databases that JSON can't represent, like FastAPI"""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, datetime.timedelta):
+        return value.total_seconds()
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, bytes):
+        return value.decode()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dump_json(content: Any) -> bytes:
+    """
+    Serializes the content in one pass, with orjson (an optional dependency) if it is installed.
+    Values are converted only when needed, unlike `fastapi.encoders.jsonable_encoder` which
+    walks and copies the whole content before its serialization
+    """
+    try:
+        import orjson
+    except ImportError:  # pragma: no cover
+        return json.dumps(
+            content, default=_to_json_compatible, ensure_ascii=False, separators=(",", ":")
+        ).encode()
+    dumped: bytes = orjson.dumps(
+        content, default=_to_json_compatible, option=orjson.OPT_NON_STR_KEYS
+    )
+    return dumped
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response for large results, which are neither validated nor encoded by FastAPI"""
+
+    def render(self, content: Any) -> bytes:
+        return dump_json(content)
+
+
+async def to_csv_chunks(
+    batches: AsyncIterator[tuple[list[ColumnDescription], Sequence[Sequence[Any]]]]
+) -> AsyncIterator[bytes]:
+    """Serializes the batches of rows of a query as CSV, with a header"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    is_first_batch = True
+    async for columns, rows in batches:
+        if is_first_batch:
+            writer.writerow([column.name for column in columns])
+            is_first_batch = False
+        writer.writerows(rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+async def to_ndjson_chunks(
+    batches: AsyncIterator[tuple[list[ColumnDescription], Sequence[Sequence[Any]]]]
+) -> AsyncIterator[bytes]:
+    """Serializes the batches of rows of a query as newline-delimited JSON, one row per line"""
+    async for columns, rows in batches:
+        column_names = [column.name for column in columns]
+        if rows:
+            yield b"".join(dump_json(dict(zip(column_names, row))) + b"\n" for row in rows)
+
+
+def get_arrow_type(column_type: str | None) -> Any:
+    """
+    Returns the Arrow type of a column from its type in the database (PostgreSQL or MySQL).
+    Values of unknown types are written as strings: a type inferred from the first rows could
+    fail on the next ones, after the start of the response
+    """
+    import pyarrow as pa
+
+    match column_type:
+        case "bool":
+            return pa.bool_()
+        case "int2":
+            return pa.int16()
+        case "int4":
+            return pa.int32()
+        # MySQL integers can be unsigned, which doesn't change their type code
+        case "int8" | "tiny" | "short" | "int24" | "long" | "year":
+            return pa.int64()
+        # up to 2^64 - 1 when unsigned
+        case "longlong":
+            return pa.decimal128(20, 0)
+        case "float4" | "float":
+            return pa.float32()
+        # decimals are converted to floats since their precision is not known
+        case "float8" | "double" | "numeric" | "decimal" | "newdecimal":
+            return pa.float64()
+        case "date":
+            return pa.date32()
+        case "timestamp" | "datetime":
+            return pa.timestamp("us")
+        case "timestamptz":
+            return pa.timestamp("us", tz="UTC")
+        case "bytea" | "blob" | "bit":
+            return pa.binary()
+    return pa.string()
+
+
+def get_arrow_schema(columns: list[ColumnDescription]) -> Any:
+    """Returns the Arrow schema of a result from the types of its columns"""
+    import pyarrow as pa
+
+    return pa.schema([pa.field(column.name, get_arrow_type(column.type)) for column in columns])
+
+
+def _to_arrow_array(values: Sequence[Any], arrow_type: Any) -> Any:
+    import pyarrow as pa
+
+    if isinstance(values, np.ndarray) and not pa.types.is_string(arrow_type):
+        # compacted columns (see `compact_column`) are converted without Python objects
+        return pa.array(values, type=arrow_type)
+    if pa.types.is_floating(arrow_type):
+        values = [float(value) if isinstance(value, Decimal) else value for value in values]
+    elif pa.types.is_string(arrow_type):
+        values = [_to_arrow_string(value) for value in values]
+    return pa.array(values, type=arrow_type)
+
+
+def _to_arrow_string(value: Any) -> str | None:
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, bytes):
+        return value.decode()
+    return str(value)
+
+
+class _BytesSink:
+    """Output file whose content can be taken out as it is written"""
+
+    def __init__(self) -> None:
+        self._chunks: list[bytes] = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def writable(self) -> bool:
+        return True
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def take(self) -> bytes:
+        content = b"".join(self._chunks)
+        self._chunks.clear()
+        return content
+
+
+class ParquetStreamWriter:
+    """
+    Writes batches of rows in a Parquet file (at a local path, or in memory to be taken out with
+    `take`). Only the rows of the current row group are kept in memory.
+    Needs `pyarrow`, which is an optional dependency
+    """
+
+    def __init__(
+        self,
+        path: str | None = None,
+        *,
+        row_group_size: int = DEFAULT_PARQUET_ROW_GROUP_SIZE,
+        compression: ParquetCompression = "snappy",
+    ) -> None:
+        self._sink: str | _BytesSink = path if path is not None else _BytesSink()
+        self.row_group_size = row_group_size
+        self.compression = compression
+        self._writer: Any = None
+        # rows of the current row group
+        self._pending: Any = None
+
+    def write(self, columns: list[ColumnDescription], rows: Sequence[Sequence[Any]]) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if self._writer is None:
+            schema = get_arrow_schema(columns)
+            self._writer = pq.ParquetWriter(self._sink, schema, compression=self.compression)
+            self._pending = schema.empty_table()
+        if not rows:
+            return
+
+        schema = self._pending.schema
+        arrays = [_to_arrow_array(values, field.type) for values, field in zip(zip(*rows), schema)]
+        batch = pa.RecordBatch.from_arrays(arrays, schema=schema)
+        self._pending = pa.concat_tables([self._pending, pa.Table.from_batches([batch])])
+        while self._pending.num_rows >= self.row_group_size:
+            self._writer.write_table(self._pending.slice(0, self.row_group_size))
+            self._pending = self._pending.slice(self.row_group_size)
+
+    def close(self) -> None:
+        if self._writer is None:
+            raise ValueError("No rows have been written, not even the columns")
+        if self._pending.num_rows:
+            self._writer.write_table(self._pending)
+        self._writer.close()
+
+    def take(self) -> bytes:
+        """Returns the content written since the previous call, when writing in memory"""
+        return self._sink.take() if isinstance(self._sink, _BytesSink) else b""
+
+
+async def to_parquet_chunks(
+    batches: AsyncIterator[tuple[list[ColumnDescription], Sequence[Sequence[Any]]]],
+    *,
+    row_group_size: int = DEFAULT_PARQUET_ROW_GROUP_SIZE,
+    compression: ParquetCompression = "snappy",
+) -> AsyncIterator[bytes]:
+    """Serializes the batches of rows of a query as a Parquet file, row group by row group"""
+    writer = ParquetStreamWriter(row_group_size=row_group_size, compression=compression)
+    async for columns, rows in batches:
+        # the conversion and the compression of the rows don't block the event loop
+        await asyncio.to_thread(writer.write, columns, rows)
+        if chunk := writer.take():
+            yield chunk
+    await asyncio.to_thread(writer.close)
+    yield writer.take()
+
+
+async def write_parquet_file(
+    batches: AsyncIterator[tuple[list[ColumnDescription], Sequence[Sequence[Any]]]],
+    path: str,
+    *,
+    row_group_size: int = DEFAULT_PARQUET_ROW_GROUP_SIZE,
+    compression: ParquetCompression = "snappy",
+) -> None:
+    """Like `to_parquet_chunks`, but writes the Parquet file at a local path"""
+    writer = ParquetStreamWriter(path, row_group_size=row_group_size, compression=compression)
+    async for columns, rows in batches:
+        await asyncio.to_thread(writer.write, columns, rows)
+    await asyncio.to_thread(writer.close)
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class MySQLConnectionConfig(BaseModel):
@@ -9,3 +9,5 @@ class MySQLConnectionConfig(BaseModel):
     database: str | None = None
     charset: str | None = None
     connect_timeout: int | None = None
+    # maximum duration of a query in seconds, enforced by the server
+    statement_timeout: float | None = Field(None, gt=0)
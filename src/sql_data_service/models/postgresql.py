@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class PostgreSQLConnectionConfig(BaseModel):
@@ -9,3 +9,8 @@ class PostgreSQLConnectionConfig(BaseModel):
     database: str | None = None
     charset: str | None = None
     connect_timeout: int | None = None
+    # maximum duration of a query in seconds, enforced by the server
+    statement_timeout: float | None = Field(None, gt=0)
+    # decodes `numeric` values to floats instead of exact (but slow to decode and serialize)
+    # decimals, for tables whose numbers don't need more than 15 significant digits
+    numeric_as_float: bool = False
@@ -5,6 +5,8 @@ class RegexOp(Enum):
     REGEXP = auto()
     SIMILAR_TO = auto()
     CONTAINS = auto()
+    # POSIX regex `~`, or `LIKE` when the pattern is a literal
+    POSIX = auto()
 
 
 class FromDateOp(Enum):
@@ -16,3 +18,16 @@ class ToDateOp(Enum):
     TO_DATE = auto()
     STR_TO_DATE = auto()
     PARSE_DATE = auto()
+
+
+class SampleOp(Enum):
+    # `TABLESAMPLE SYSTEM (10)`, with a seed: `TABLESAMPLE SYSTEM (10) REPEATABLE (42)`
+    TABLESAMPLE_SYSTEM = auto()
+    # `TABLESAMPLE SYSTEM (10 PERCENT)`, without seed
+    TABLESAMPLE_SYSTEM_PERCENT = auto()
+    # `SAMPLE (10)`, with a seed: `SAMPLE (10) SEED (42)`
+    SAMPLE = auto()
+    # no sampling clause: rows are filtered with `RAND()` (or `RAND(42)`) after a full scan
+    RAND = auto()
+    # no sampling clause: rows are filtered with `RANDOM()` after a full scan, without seed
+    RANDOM = auto()
@@ -0,0 +1,183 @@
+import asyncio
+import datetime
+from decimal import Decimal
+from typing import TYPE_CHECKING, Any, AsyncIterator, Sequence, TypeVar
+
+from weaverbird.pipeline import PipelineWithVariables
+from weaverbird.pipeline.steps import AggregateStep, DomainStep, FilterStep
+
+from .connectors.base import get_or_raise
+
+if TYPE_CHECKING:
+    from weaverbird.pipeline.conditions import Condition
+
+T = TypeVar("T")
+
+# steps that compute each row of their output from one row of their input, so that the result
+# of a pipeline made of them is the union of its results on partitions of its domain
+PARTITIONABLE_STEPS = {
+    "comparetext",
+    "concatenate",
+    "convert",
+    "delete",
+    "duplicate",
+    "fillna",
+    "filter",
+    "formula",
+    "fromdate",
+    "ifthenelse",
+    "lowercase",
+    "rename",
+    "replace",
+    "select",
+    "split",
+    "substring",
+    "todate",
+    "unpivot",
+    "uppercase",
+}
+# number of batches of each partition waiting to be sent, to bound the memory
+PARTITION_BUFFER_SIZE = 2
+# number of partitions a client can ask for
+MAX_PARTITIONS = 64
+# number of partitions of an export read at the same time, whatever their number
+PARTITION_CONCURRENCY = 4
+
+MIN_COLUMN = "__min__"
+MAX_COLUMN = "__max__"
+COUNT_COLUMN = "__count__"
+
+
+def check_partitionable(pipeline: PipelineWithVariables) -> None:
+    """Raises a `ValueError` if the pipeline can't be run partition by partition"""
+    if not pipeline.steps or not isinstance(pipeline.steps[0], DomainStep):
+        raise ValueError("The pipeline must start with a domain step to be partitioned")
+    for step in pipeline.steps[1:]:
+        if step.name not in PARTITIONABLE_STEPS:
+            raise ValueError(f"The pipeline can't be partitioned because of its {step.name} step")
+
+
+def get_range_pipeline(pipeline: PipelineWithVariables, column: str) -> PipelineWithVariables:
+    """
+    Pipeline returning the minimum, the maximum and the number of values of a column of the
+    domain of a pipeline
+    """
+    return PipelineWithVariables(
+        steps=[
+            pipeline.steps[0],
+            AggregateStep(
+                on=[],
+                aggregations=[
+                    {"new_columns": [MIN_COLUMN], "agg_function": "min", "columns": [column]},
+                    {"new_columns": [MAX_COLUMN], "agg_function": "max", "columns": [column]},
+                    {"new_columns": [COUNT_COLUMN], "agg_function": "count", "columns": [column]},
+                ],
+            ),
+        ]
+    )
+
+
+def get_partition_bounds(min_value: Any, max_value: Any, partitions: int) -> list[Any]:
+    """
+    Splits the [min_value, max_value] range of numbers or dates in (at most) `partitions` ranges
+    of the same width and returns their lower bounds
+    """
+    if not isinstance(min_value, (int, float, Decimal, datetime.date)) or isinstance(
+        min_value, bool
+    ):
+        raise ValueError(f"Can't partition values of type {type(min_value).__name__}")
+
+    width = max_value - min_value
+    bounds: list[Any] = []
+    for i in range(partitions):
+        if isinstance(min_value, int):
+            bound = min_value + width * i // partitions
+        elif isinstance(min_value, datetime.date) and not isinstance(min_value, datetime.datetime):
+            bound = min_value + datetime.timedelta(days=width.days * i // partitions)
+        else:
+            bound = min_value + width * i / partitions
+        # narrow ranges have fewer partitions than requested
+        if not bounds or bound > bounds[-1]:
+            bounds.append(bound)
+    return bounds
+
+
+def get_partition_conditions(column: str, bounds: Sequence[Any]) -> list[dict[str, Any]]:
+    """
+    Conditions selecting the rows of each range starting at one of the bounds, plus the rows
+    without value
+    """
+    conditions: list[dict[str, Any]] = [
+        {
+            "and": [
+                {"column": column, "operator": "ge", "value": lower_bound},
+                {"column": column, "operator": "lt", "value": upper_bound},
+            ]
+        }
+        for lower_bound, upper_bound in zip(bounds, bounds[1:])
+    ]
+    # the last range includes the maximum
+    conditions.append({"column": column, "operator": "ge", "value": bounds[-1]})
+    conditions.append({"column": column, "operator": "isnull"})
+    return conditions
+
+
+def restrict_domain(
+    pipeline: PipelineWithVariables, condition: "Condition | dict[str, Any]"
+) -> PipelineWithVariables:
+    """Pipeline whose domain is filtered by a condition, right after the domain step"""
+    return PipelineWithVariables(
+        steps=[pipeline.steps[0], FilterStep(condition=condition), *pipeline.steps[1:]]
+    )
+
+
+def get_partitioned_pipelines(
+    pipeline: PipelineWithVariables, conditions: Sequence["Condition | dict[str, Any]"]
+) -> list[PipelineWithVariables]:
+    """Pipelines restricted to each partition"""
+    return [restrict_domain(pipeline, condition) for condition in conditions]
+
+
+async def merge_streams(
+    streams: Sequence[AsyncIterator[T]], *, ordered: bool, concurrency: int
+) -> AsyncIterator[T]:
+    """
+    Consumes `concurrency` streams at a time (in their order) and yields their items as they
+    come or, if `ordered`, all the items of the first stream, then of the second one, and so on.
+    Each stream is paused when a few of its items are waiting to be yielded
+    """
+    done = object()
+    queues: list[asyncio.Queue[Any]] = [
+        asyncio.Queue(maxsize=PARTITION_BUFFER_SIZE) for _ in streams
+    ]
+    merged: asyncio.Queue[Any] = asyncio.Queue(maxsize=PARTITION_BUFFER_SIZE)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def consume(queue: asyncio.Queue[Any], stream: AsyncIterator[T]) -> None:
+        # the streams waiting for the semaphore are the last ones, so the ordered merge never
+        # waits for a stream that can't start
+        async with semaphore:
+            async for item in stream:
+                await queue.put(item)
+        await queue.put(done)
+
+    tasks = [
+        asyncio.create_task(consume(queue if ordered else merged, stream))
+        for queue, stream in zip(queues, streams)
+    ]
+    try:
+        if ordered:
+            for queue in queues:
+                while (item := await get_or_raise(queue, *tasks)) is not done:
+                    yield item
+        else:
+            remaining = len(streams)
+            while remaining:
+                if (item := await get_or_raise(merged, *tasks)) is done:
+                    remaining -= 1
+                else:
+                    yield item
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
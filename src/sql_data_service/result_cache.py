@@ -0,0 +1,93 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any
+
+from weaverbird.pipeline import PipelineWithVariables
+
+from .connectors.base import ResultSet
+from .partitioning import check_partitionable
+
+# number of results kept in memory, the least recently used ones are dropped first
+RESULT_CACHE_SIZE = 128
+# total number of rows of these results, larger results are not cached
+RESULT_CACHE_MAX_ROWS = 1_000_000
+# age in seconds after which a result is computed again from scratch, in case its domain
+# wasn't append-only after all
+RESULT_MAX_AGE = 3600
+
+
+@dataclass(kw_only=True)
+class CachedResult:
+    result: ResultSet
+    # highest value of the watermark column of the domain when the result was computed,
+    # `None` if the domain had no values
+    watermark: Any
+    # number of rows of the domain with a watermark when the result was computed, to find the
+    # rows added since then with a watermark that isn't higher
+    watermark_count: int
+    # `time.monotonic()` when the result was fully computed, which incremental refreshes keep
+    computed_at: float = field(default_factory=time.monotonic)
+
+
+class ResultCache:
+    """
+    Results of pipelines over append-only tables, which stay valid as long as the watermark
+    column of their domain (e.g. a creation date) doesn't get higher values
+    """
+
+    def __init__(
+        self,
+        max_size: int = RESULT_CACHE_SIZE,
+        *,
+        max_rows: int = RESULT_CACHE_MAX_ROWS,
+        max_age: float = RESULT_MAX_AGE,
+    ) -> None:
+        self.max_size = max_size
+        self.max_rows = max_rows
+        self.max_age = max_age
+        self._results: OrderedDict[str, CachedResult] = OrderedDict()
+        self._rows = 0
+
+    def get(self, key: str) -> CachedResult | None:
+        """Returns the result cached for the key, unless it is too old"""
+        cached_result = self._results.get(key)
+        if cached_result is None:
+            return None
+        if time.monotonic() - cached_result.computed_at > self.max_age:
+            self._pop(key)
+            return None
+        self._results.move_to_end(key)
+        return cached_result
+
+    def set(self, key: str, cached_result: CachedResult) -> None:
+        if key in self._results:
+            self._pop(key)
+        if len(cached_result.result) > self.max_rows:
+            return
+        self._results[key] = cached_result
+        self._rows += len(cached_result.result)
+        while len(self._results) > self.max_size or self._rows > self.max_rows:
+            self._pop(next(iter(self._results)))
+
+    def clear(self) -> None:
+        self._results.clear()
+        self._rows = 0
+
+    def _pop(self, key: str) -> None:
+        self._rows -= len(self._results.pop(key).result)
+
+
+def can_refresh_incrementally(pipeline: PipelineWithVariables) -> bool:
+    """
+    Whether the result of the pipeline on the new rows of its domain can be appended to its
+    previous result, which is the case when all its steps are row-wise (like for partitions)
+    """
+    try:
+        check_partitionable(pipeline)
+    except ValueError:
+        return False
+    return True
+
+
+RESULT_CACHE = ResultCache()
@@ -1,4 +1,4 @@
-from typing import Mapping, Sequence
+from typing import Any, Mapping, Sequence
 
 from weaverbird.pipeline import PipelineWithVariables
 
@@ -12,10 +12,71 @@ def translate_pipeline(
     pipeline: PipelineWithVariables,
     tables_columns: Mapping[str, Sequence[str]],
     db_schema: str | None = None,
+    pivot_values: Mapping[str, Sequence[Any]] | None = None,
+    replace_whole_values: bool = False,
+    columns_types: Mapping[str, str] | None = None,
+    approximate_aggregations: bool = False,
+    sample_percent: float | None = None,
+    sample_seed: int | None = None,
+    server_version: str | None = None,
 ) -> str:
+    query, _ = translate_pipeline_with_parameters(
+        sql_dialect=sql_dialect,
+        pipeline=pipeline,
+        tables_columns=tables_columns,
+        db_schema=db_schema,
+        pivot_values=pivot_values,
+        replace_whole_values=replace_whole_values,
+        bind_parameters=False,
+        columns_types=columns_types,
+        approximate_aggregations=approximate_aggregations,
+        sample_percent=sample_percent,
+        sample_seed=sample_seed,
+        server_version=server_version,
+    )
+    return query
+
+
+def translate_pipeline_with_parameters(
+    *,
+    sql_dialect: SQLDialect,
+    pipeline: PipelineWithVariables,
+    tables_columns: Mapping[str, Sequence[str]],
+    db_schema: str | None = None,
+    pivot_values: Mapping[str, Sequence[Any]] | None = None,
+    replace_whole_values: bool = False,
+    bind_parameters: bool = True,
+    columns_types: Mapping[str, str] | None = None,
+    approximate_aggregations: bool = False,
+    sample_percent: float | None = None,
+    sample_seed: int | None = None,
+    server_version: str | None = None,
+    limit: int | None = None,
+    offset: int | None = None,
+    unique_columns: Sequence[str] = (),
+    after: Sequence[Any] | None = None,
+    count_only: bool = False,
+) -> tuple[str, list[Any]]:
+    """Returns the query and the values of its parameters, to be sent along with it"""
     translator_cls = ALL_TRANSLATORS[sql_dialect]
     translator = translator_cls(
         tables_columns=tables_columns,
         db_schema=db_schema,
+        pivot_values=pivot_values,
+        replace_whole_values=replace_whole_values,
+        bind_parameters=bind_parameters,
+        columns_types=columns_types,
+        approximate_aggregations=approximate_aggregations,
+        sample_percent=sample_percent,
+        sample_seed=sample_seed,
+        server_version=server_version,
+    )
+    query = translator.get_query_str(
+        steps=pipeline.steps,
+        limit=limit,
+        offset=offset,
+        unique_columns=unique_columns,
+        after=after,
+        count_only=count_only,
     )
-    return translator.get_query_str(steps=pipeline.steps)
+    return query, translator.parameters
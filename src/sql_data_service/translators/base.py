@@ -1,20 +1,48 @@
+import json
 from abc import ABC
 from dataclasses import dataclass
+from enum import Enum
+from functools import lru_cache
 
 # from typing_extensions import Self
 from typing import TYPE_CHECKING, Any, Callable, Mapping, Sequence, TypeVar, cast
 
-from pypika import AliasedQuery, Case, Criterion, Field, Order, Query, Schema, Table, functions
-from pypika.enums import Comparator
-from pypika.terms import AnalyticFunction, BasicCriterion, LiteralValue
-
+from pypika import (
+    AliasedQuery,
+    Case,
+    Criterion,
+    Field,
+    Order,
+    Query,
+    Schema,
+    Table,
+    analytics as an,
+    functions,
+)
+from pypika.enums import Comparator, Equality
+from pypika.terms import (
+    AnalyticFunction,
+    BasicCriterion,
+    Interval,
+    LiteralValue,
+    Parameter,
+    Term,
+    ValueWrapper,
+)
+from pypika.utils import builder, format_alias_sql
+from weaverbird.pipeline.steps.sort import ColumnSort
+
+from sql_data_service.conditions import normalize_condition
 from sql_data_service.dialects import SQLDialect
-from sql_data_service.operators import FromDateOp, RegexOp, ToDateOp
+from sql_data_service.operators import FromDateOp, RegexOp, SampleOp, ToDateOp
 
 from . import ALL_TRANSLATORS
 
 Self = TypeVar("Self", bound="SQLTranslator")
 
+# number of rows of each previous period in evolutions
+EVOLUTION_COUNT_COLUMN = "__count__"
+
 
 if TYPE_CHECKING:
     from pypika.queries import QueryBuilder
@@ -27,17 +55,22 @@ if TYPE_CHECKING:
         CompareTextStep,
         ConcatenateStep,
         ConvertStep,
+        CumSumStep,
         CustomSqlStep,
         DeleteStep,
         DomainStep,
         DuplicateStep,
+        EvolutionStep,
         FillnaStep,
         FilterStep,
         FormulaStep,
         FromdateStep,
         IfthenelseStep,
         LowercaseStep,
+        MovingAverageStep,
         PercentageStep,
+        PivotStep,
+        RankStep,
         RenameStep,
         ReplaceStep,
         SelectStep,
@@ -49,6 +82,7 @@ if TYPE_CHECKING:
         TopStep,
         TrimStep,
         UniqueGroupsStep,
+        UnpivotStep,
         UppercaseStep,
     )
     from weaverbird.pipeline.steps.aggregate import AggregateFn
@@ -76,24 +110,74 @@ class SQLTranslator(ABC):
     # supported extra functions
     SUPPORT_ROW_NUMBER: bool
     SUPPORT_SPLIT_PART: bool
+    SUPPORT_WINDOW_FUNCTIONS: bool
+    SUPPORT_APPROX_COUNT_DISTINCT: bool
+    # whether `ORDER BY ... NULLS LAST` is supported
+    SUPPORT_NULLS_LAST: bool
     # which operators should be used
     FROM_DATE_OP: FromDateOp
     REGEXP_OP: RegexOp
+    SAMPLE_OP: SampleOp
     TO_DATE_OP: ToDateOp
+    # above this number of values, `in` / `nin` conditions are not translated into a literal list
+    LARGE_IN_LIST_SIZE: int = 1000
 
     def __init__(
         self: Self,
         *,
         tables_columns: Mapping[str, Sequence[str]] | None = None,
         db_schema: str | None = None,
+        pivot_values: Mapping[str, Sequence[Any]] | None = None,
+        replace_whole_values: bool = False,
+        bind_parameters: bool = False,
+        columns_types: Mapping[str, str] | None = None,
+        approximate_aggregations: bool = False,
+        sample_percent: float | None = None,
+        sample_seed: int | None = None,
+        server_version: str | None = None,
     ) -> None:
         self._tables_columns: Mapping[str, Sequence[str]] = tables_columns or {}
         self._db_schema: Schema | None = Schema(db_schema) if db_schema is not None else None
+        # distinct values of the pivoted columns, which become the new column names
+        self._pivot_values: Mapping[str, Sequence[Any]] = pivot_values or {}
+        # whether `replace` steps replace whole values (like pandas) instead of substrings
+        self._replace_whole_values = replace_whole_values
+        # whether large values can be sent as query parameters, collected in `parameters`
+        self._bind_parameters = bind_parameters
+        self.parameters: list[Any] = []
+        # database types of the columns (by name) when they are known
+        self._columns_types: Mapping[str, str] = {
+            column: column_type.upper() for column, column_type in (columns_types or {}).items()
+        }
+        # whether aggregations can be approximated by the database (faster and cheaper)
+        self._approximate_aggregations = approximate_aggregations
+        # percentage of the rows of the domains to read, for quick previews
+        self._sample_percent = sample_percent
+        # seed of the sample, so that the queries given the same one read the same rows, on the
+        # databases that support it
+        self._sample_seed = sample_seed
+        # version of the database server (e.g. "8.0.28"), for the syntaxes depending on it
+        self._server_version = server_version
 
     def __init_subclass__(cls) -> None:
         ALL_TRANSLATORS[cls.DIALECT] = cls
 
-    def get_query(self: Self, *, steps: Sequence["PipelineStep"]) -> "QueryBuilder":
+    def get_query(
+        self: Self,
+        *,
+        steps: Sequence["PipelineStep"],
+        limit: int | None = None,
+        offset: int | None = None,
+        unique_columns: Sequence[str] = (),
+        after: Sequence[Any] | None = None,
+        count_only: bool = False,
+    ) -> "QueryBuilder":
+        """
+        `limit` and `offset` are applied to the final query, whose rows are sorted like in the last
+        sort step, then by `unique_columns` (which identify each row). With `after` (values of
+        these columns, see `get_keyset_columns`), only the rows after them are returned.
+        With `count_only`, the query returns the total number of rows in a `count` column
+        """
         step_queries: list["QueryBuilder"] = []
         step_tables: list[StepTable] = []
 
@@ -119,12 +203,78 @@ class SQLTranslator(ABC):
         for i, step_query in enumerate(step_queries):
             query = query.with_(step_query, step_tables[i].name)
 
-        return query.from_(step_tables[-1].name).select("*")
-
-    def get_query_str(self: Self, *, steps: Sequence["PipelineStep"]) -> str:
-        query_str: str = self.get_query(steps=steps).get_sql()
+        if count_only:
+            return query.from_(step_tables[-1].name).select(functions.Count("*").as_("count"))
+
+        query = query.from_(step_tables[-1].name).select("*")
+
+        if limit is not None or after is not None:
+            # the rows of a page must come in a stable order
+            keyset_sort = _get_keyset_sort(steps, unique_columns)
+            result_columns = step_tables[-1].columns
+            if "*" not in result_columns:
+                for column_sort in keyset_sort:
+                    if column_sort.column not in result_columns:
+                        raise ValueError(
+                            f"Can't sort the pages on {column_sort.column!r}, which is not a "
+                            "column of the result"
+                        )
+            for column_sort in keyset_sort:
+                query = self._orderby_nulls_last(query, column_sort)
+            if after is not None:
+                query = query.where(self._get_keyset_criterion(keyset_sort, after))
+
+        if limit is not None:
+            query = query.limit(limit)
+        if offset is not None:
+            query = query.offset(offset)
+        return query
+
+    def get_query_str(self: Self, *, steps: Sequence["PipelineStep"], **kwargs: Any) -> str:
+        query_str: str = self.get_query(steps=steps, **kwargs).get_sql()
         return query_str
 
+    def _orderby_nulls_last(
+        self: Self, query: "QueryBuilder", column_sort: ColumnSort
+    ) -> "QueryBuilder":
+        order = Order.desc if column_sort.order == "desc" else Order.asc
+        if self.SUPPORT_NULLS_LAST:
+            return query.orderby(column_sort.column, order=NullsLastOrder[order.name])
+        # `false` comes before `true`
+        return query.orderby(Field(column_sort.column).isnull()).orderby(
+            column_sort.column, order=order
+        )
+
+    def _get_keyset_criterion(
+        self: Self, keyset_sort: Sequence[ColumnSort], after: Sequence[Any]
+    ) -> Criterion:
+        """
+        `(a, b) > (x, y)` for any order of the columns: `a > x OR (a = x AND b > y)`,
+        NULL values coming last
+        """
+        if not keyset_sort or len(after) != len(keyset_sort):
+            raise ValueError(
+                f"Expected values for the columns of the last sort step, got {list(after)!r}"
+            )
+
+        criteria: list[Criterion] = []
+        equalities: list[Criterion] = []
+        for column_sort, value in zip(keyset_sort, after):
+            column_field = Field(column_sort.column)
+            if value is None:
+                # no value comes after NULL
+                equalities.append(column_field.isnull())
+                continue
+            comparison = (
+                column_field < value if column_sort.order == "desc" else column_field > value
+            )
+            criteria.append(Criterion.all([*equalities, comparison | column_field.isnull()]))
+            equalities.append(column_field == value)
+        if not criteria:
+            # the last row has NULL everywhere, so no row comes after it
+            return BasicCriterion(Equality.eq, ValueWrapper(1), ValueWrapper(0))
+        return Criterion.any(criteria)
+
     # All other methods implement step from https://weaverbird.toucantoco.com/docs/steps/,
     # the name of the method being the name of the step and the kwargs the rest of the params
     def _get_aggregate_function(
@@ -135,6 +285,10 @@ class SQLTranslator(ABC):
                 return functions.Avg
             case "count":
                 return functions.Count
+            case "count distinct" if (
+                self._approximate_aggregations and self.SUPPORT_APPROX_COUNT_DISTINCT
+            ):
+                return ApproxCountDistinct
             case "count distinct":
                 return CountDistinct
             case "max":
@@ -259,6 +413,35 @@ class SQLTranslator(ABC):
         )
         return query, StepTable(columns=table.columns)
 
+    def cumsum(
+        self: Self, *, step: "CumSumStep", table: StepTable
+    ) -> tuple["QueryBuilder", StepTable]:
+        if not self.SUPPORT_WINDOW_FUNCTIONS:
+            raise NotImplementedError(f"[{self.DIALECT}] cumsum is not implemented")
+
+        the_table = Table(table.name)
+        reference_field: Field = the_table[step.reference_column]
+        groupby_fields: list[Field] = [the_table[col] for col in step.groupby or []]
+
+        new_cols: list[str] = []
+        cumsum_selected: list[Term] = []
+        for column_name, new_column_name in step.to_cumsum:
+            new_cols.append(new_column_name or f"{column_name}_CUMSUM")
+            cumsum_selected.append(
+                an.Sum(the_table[column_name])
+                .over(*groupby_fields)
+                .orderby(reference_field)
+                .rows(an.Preceding(), an.CURRENT_ROW)
+                .as_(new_cols[-1])
+            )
+
+        query: "QueryBuilder" = (
+            self.QUERY_CLS.from_(table.name)
+            .select(*table.columns, *cumsum_selected)
+            .orderby(step.reference_column, order=Order.asc)
+        )
+        return query, StepTable(columns=[*table.columns, *new_cols])
+
     def customsql(
         self: Self, *, step: "CustomSqlStep", table: StepTable
     ) -> tuple["QueryBuilder", StepTable]:
@@ -294,11 +477,45 @@ class SQLTranslator(ABC):
         except KeyError:
             selected_cols = ["*"]
 
-        query: "QueryBuilder" = self.QUERY_CLS.from_(
-            Table(step.domain, schema=self._db_schema)
-        ).select(*selected_cols)
+        if self._sample_percent is None:
+            query: "QueryBuilder" = self.QUERY_CLS.from_(
+                Table(step.domain, schema=self._db_schema)
+            ).select(*selected_cols)
+        else:
+            query = self._get_sampled_domain_query(step.domain).select(*selected_cols)
         return query, StepTable(columns=selected_cols)
 
+    def _get_sampled_domain_query(self: Self, domain: str) -> "QueryBuilder":
+        assert self._sample_percent is not None
+        sample_percent = self._sample_percent
+        seed = self._sample_seed
+        match self.SAMPLE_OP:
+            case SampleOp.TABLESAMPLE_SYSTEM:
+                sample_sql = f"TABLESAMPLE SYSTEM ({sample_percent})"
+                if seed is not None:
+                    sample_sql += f" REPEATABLE ({int(seed)})"
+            case SampleOp.TABLESAMPLE_SYSTEM_PERCENT:
+                sample_sql = f"TABLESAMPLE SYSTEM ({sample_percent} PERCENT)"
+            case SampleOp.SAMPLE:
+                sample_sql = f"SAMPLE ({sample_percent})"
+                if seed is not None:
+                    sample_sql += f" SEED ({int(seed)})"
+            case SampleOp.RAND | SampleOp.RANDOM:
+                # only `RAND()` takes a seed, the random values of the rows following from it
+                random_fn = functions.Function(
+                    self.SAMPLE_OP.name,
+                    *(() if seed is None or self.SAMPLE_OP is SampleOp.RANDOM else (int(seed),)),
+                )
+                return self.QUERY_CLS.from_(Table(domain, schema=self._db_schema)).where(
+                    random_fn < sample_percent / 100
+                )
+            case _:  # pragma: no cover
+                raise NotImplementedError(f"[{self.DIALECT}] doesn't have sample operator")
+
+        return self.QUERY_CLS.from_(
+            SampledTable(domain, schema=self._db_schema, sample_sql=sample_sql)
+        )
+
     def duplicate(
         self: Self, *, step: "DuplicateStep", table: StepTable
     ) -> tuple["QueryBuilder", StepTable]:
@@ -307,6 +524,75 @@ class SQLTranslator(ABC):
         )
         return query, StepTable(columns=[*table.columns, step.new_column_name])
 
+    def _get_evolution_interval(self: Self, step: "EvolutionStep") -> Term:
+        match step.evolution_type:
+            case "vsLastYear":
+                return Interval(years=1)
+            case "vsLastMonth":
+                return Interval(months=1)
+            case "vsLastWeek":
+                return Interval(weeks=1)
+            case "vsLastDay":
+                return Interval(days=1)
+            case _:  # pragma: no cover
+                raise NotImplementedError(
+                    f"[{self.DIALECT}] Evolution {step.evolution_type!r} is not yet implemented"
+                )
+
+    def evolution(
+        self: Self, *, step: "EvolutionStep", table: StepTable
+    ) -> tuple["QueryBuilder", StepTable]:
+        # Each row is matched with the row of the previous period (same index columns) with a
+        # self join rather than with `LAG()`, which would silently use the wrong row when some
+        # periods are missing. The previous rows are grouped by period and index so that rows
+        # are never duplicated: several rows for the same period give no evolution
+        the_table = Table(table.name)
+        group_fields = [the_table[step.date_col], *(the_table[col] for col in step.index_columns)]
+        prev_table: "QueryBuilder" = (
+            self.QUERY_CLS.from_(the_table)
+            .select(
+                *group_fields,
+                functions.Min(the_table[step.value_col]).as_(step.value_col),
+                functions.Count("*").as_(EVOLUTION_COUNT_COLUMN),
+            )
+            .groupby(*group_fields)
+            .as_(f"{table.name}_prev")
+        )
+        new_column = step.new_column or f"{step.value_col}_EVOL_{step.evolution_format.upper()}"
+
+        value_field: Field = the_table[step.value_col]
+        prev_value_field: Field = prev_table[step.value_col]
+        match step.evolution_format:
+            case "abs":
+                evolution_term = value_field - prev_value_field
+            case "pct":
+                # no evolution from 0, instead of a division by zero error
+                evolution_term = (
+                    functions.Cast(value_field, self.DATA_TYPE_MAPPING.float)
+                    / functions.NullIf(prev_value_field, 0)
+                    - 1
+                )
+
+        join_criterion = Criterion.all(
+            [
+                prev_table[step.date_col]
+                == the_table[step.date_col] - self._get_evolution_interval(step),
+                *(prev_table[col] == the_table[col] for col in step.index_columns),
+            ]
+        )
+        query: "QueryBuilder" = (
+            self.QUERY_CLS.from_(the_table)
+            .left_join(prev_table)
+            .on(join_criterion)
+            .select(
+                *(the_table[col] for col in table.columns),
+                Case()
+                .when(prev_table[EVOLUTION_COUNT_COLUMN] == 1, evolution_term)
+                .as_(new_column),
+            )
+        )
+        return query, StepTable(columns=[*table.columns, new_column])
+
     def fillna(
         self: Self, *, step: "FillnaStep", table: StepTable
     ) -> tuple["QueryBuilder", StepTable]:
@@ -320,6 +606,16 @@ class SQLTranslator(ABC):
         )
         return query, StepTable(columns=table.columns)
 
+    def _get_large_inclusion_criterion(
+        self: Self, column_field: Field, values: list[Any], *, negate: bool
+    ) -> Criterion:
+        """Dialects can use something cheaper to parse than a literal list of many values"""
+        return column_field.notin(values) if negate else column_field.isin(values)
+
+    def _add_parameter(self: Self, value: Any) -> Parameter:
+        self.parameters.append(value)
+        return Parameter(f"${len(self.parameters)}")
+
     def _get_single_condition_criterion(
         self: Self, condition: "SimpleCondition", table: StepTable
     ) -> Criterion:
@@ -331,6 +627,10 @@ class SQLTranslator(ABC):
 
                 op = getattr(operator, condition.operator)
                 return op(column_field, condition.value)
+            case "in" | "nin" if len(condition.value) > self.LARGE_IN_LIST_SIZE:
+                return self._get_large_inclusion_criterion(
+                    column_field, condition.value, negate=condition.operator == "nin"
+                )
             case "in":
                 return column_field.isin(condition.value)
             case "nin":
@@ -351,6 +651,8 @@ class SQLTranslator(ABC):
                             column_field,
                             column_field.wrap_constant(_compliant_regex(condition.value)),
                         )
+                    case RegexOp.POSIX:
+                        return _get_posix_regex_criterion(column_field, condition.value)
                     case _:
                         raise NotImplementedError(f"[{self.DIALECT}] doesn't have regexp operator")
             case "notmatches":
@@ -369,6 +671,10 @@ class SQLTranslator(ABC):
                             column_field,
                             column_field.wrap_constant(_compliant_regex(condition.value)),
                         )
+                    case RegexOp.POSIX:
+                        return _get_posix_regex_criterion(
+                            column_field, condition.value, negate=True
+                        )
                     case _:
                         raise NotImplementedError(f"[{self.DIALECT}] doesn't have regexp operator")
             case "isnull":
@@ -404,14 +710,26 @@ class SQLTranslator(ABC):
                 assert isinstance(condition, SimpleCondition)
                 return self._get_single_condition_criterion(condition, table)
 
+    def _get_normalized_filter_criterion(
+        self: Self, condition: "Condition", table: StepTable
+    ) -> Criterion:
+        return self._get_simplified_filter_criterion(normalize_condition(condition), table)
+
+    def _get_simplified_filter_criterion(
+        self: Self, normalized_condition: "Condition | bool", table: StepTable
+    ) -> Criterion:
+        if isinstance(normalized_condition, bool):
+            # `1=1` or `1=0`
+            return ValueWrapper(1) == int(normalized_condition)
+        return self._get_filter_criterion(normalized_condition, table)
+
     def filter(
         self: Self, *, step: "FilterStep", table: StepTable
     ) -> tuple["QueryBuilder", StepTable]:
-        query: "QueryBuilder" = (
-            self.QUERY_CLS.from_(table.name)
-            .select(*table.columns)
-            .where(self._get_filter_criterion(step.condition, table))
-        )
+        query: "QueryBuilder" = self.QUERY_CLS.from_(table.name).select(*table.columns)
+        normalized_condition = normalize_condition(step.condition)
+        if normalized_condition is not True:
+            query = query.where(self._get_simplified_filter_criterion(normalized_condition, table))
         return query, StepTable(columns=table.columns)
 
     def formula(
@@ -456,38 +774,19 @@ class SQLTranslator(ABC):
         then_: Any,
         else_: "Condition" | Any,
         table: StepTable,
-        case: Case,
     ) -> Case:
-        import json
-
         from weaverbird.pipeline.steps.ifthenelse import IfThenElse
 
-        try:
-            # if the value is a string
-            then_value = json.loads(then_)
-            case = case.when(self._get_filter_criterion(if_, table), then_value)
-        except (json.JSONDecodeError, TypeError):
-            # the value is a formula
-            then_value = then_
-            case = case.when(self._get_filter_criterion(if_, table), LiteralValue(then_value))
-
-        if isinstance(else_, IfThenElse):
-            return self._build_ifthenelse_case(
-                if_=else_.condition,
-                then_=else_.then,
-                else_=else_.else_value,
-                table=table,
-                case=case,
+        # Nested `else` conditions are walked iteratively and all end up as `WHEN`s
+        # of a single flat `CASE`
+        case = Case()
+        while True:
+            case = case.when(
+                self._get_normalized_filter_criterion(if_, table), _get_ifthenelse_value(then_)
             )
-        else:
-            try:
-                # the value is a string
-                else_value = json.loads(else_)
-                return case.else_(else_value)
-            except (json.JSONDecodeError, TypeError):
-                # the value is a formula
-                else_value = else_
-                return case.else_(LiteralValue(else_value))
+            if not isinstance(else_, IfThenElse):
+                return case.else_(_get_ifthenelse_value(else_))
+            if_, then_, else_ = else_.condition, else_.then, else_.else_value
 
     def ifthenelse(
         self: Self, *, step: "IfthenelseStep", table: StepTable
@@ -495,7 +794,7 @@ class SQLTranslator(ABC):
         query: "QueryBuilder" = self.QUERY_CLS.from_(table.name).select(
             *table.columns,
             self._build_ifthenelse_case(
-                if_=step.condition, then_=step.then, else_=step.else_value, table=table, case=Case()
+                if_=step.condition, then_=step.then, else_=step.else_value, table=table
             ).as_(step.new_column),
         )
 
@@ -511,11 +810,96 @@ class SQLTranslator(ABC):
         )
         return query, StepTable(columns=table.columns)
 
+    def movingaverage(
+        self: Self, *, step: "MovingAverageStep", table: StepTable
+    ) -> tuple["QueryBuilder", StepTable]:
+        if not self.SUPPORT_WINDOW_FUNCTIONS:
+            raise NotImplementedError(f"[{self.DIALECT}] movingaverage is not implemented")
+
+        the_table = Table(table.name)
+        new_column_name = step.new_column_name or f"{step.value_column}_MOVING_AVG"
+        value_field: Field = the_table[step.value_column]
+
+        def over_window(fn: AnalyticFunction) -> AnalyticFunction:
+            return (
+                fn.over(*(the_table[group] for group in step.groups))
+                .orderby(the_table[step.column_to_sort])
+                .rows(an.Preceding(step.moving_window - 1), an.CURRENT_ROW)
+            )
+
+        # Like pandas' `rolling(window).mean()`, there is no average over windows with fewer
+        # values (e.g. for the first rows of each group), instead of an average of what's there
+        moving_average = Case().when(
+            over_window(an.Count(value_field)) == step.moving_window,
+            over_window(an.Avg(value_field)),
+        )
+        query: "QueryBuilder" = (
+            self.QUERY_CLS.from_(table.name)
+            .select(*table.columns, moving_average.as_(new_column_name))
+            .orderby(*step.groups, step.column_to_sort, order=Order.asc)
+        )
+        return query, StepTable(columns=[*table.columns, new_column_name])
+
     def percentage(
         self: Self, *, step: "PercentageStep", table: StepTable
     ) -> tuple["QueryBuilder", StepTable]:
         raise NotImplementedError(f"[{self.DIALECT}] percentage is not implemented")
 
+    def _get_pivot_values(self: Self, step: "PivotStep") -> list[Any]:
+        try:
+            pivot_values = self._pivot_values[step.column_to_pivot]
+        except KeyError:
+            raise ValueError(f"Values of pivoted column {step.column_to_pivot!r} are not known")
+        return [v for v in pivot_values if v is not None]
+
+    def pivot(
+        self: Self, *, step: "PivotStep", table: StepTable
+    ) -> tuple["QueryBuilder", StepTable]:
+        # Conditional aggregation: a single scan of the table, with one
+        # `AGG(CASE WHEN col = value THEN value_col END)` per pivoted value
+        the_table = Table(table.name)
+        pivot_values = self._get_pivot_values(step)
+        agg_fn = self._get_aggregate_function(step.agg_function)
+        pivot_field: Field = the_table[step.column_to_pivot]
+        value_field: Field = the_table[step.value_column]
+
+        query: "QueryBuilder" = (
+            self.QUERY_CLS.from_(table.name)
+            .select(
+                *step.index,
+                *(
+                    agg_fn(Case().when(pivot_field == value, value_field)).as_(str(value))
+                    for value in pivot_values
+                ),
+            )
+            .groupby(*step.index)
+            .orderby(*step.index, order=Order.asc)
+        )
+        return query, StepTable(columns=[*step.index, *(str(v) for v in pivot_values)])
+
+    def rank(self: Self, *, step: "RankStep", table: StepTable) -> tuple["QueryBuilder", StepTable]:
+        if not self.SUPPORT_WINDOW_FUNCTIONS:
+            raise NotImplementedError(f"[{self.DIALECT}] rank is not implemented")
+
+        the_table = Table(table.name)
+        new_column_name = step.new_column_name or f"{step.value_col}_RANK"
+        rank_fn = an.DenseRank if step.method == "dense" else an.Rank
+        query: "QueryBuilder" = (
+            self.QUERY_CLS.from_(table.name)
+            .select(
+                *table.columns,
+                rank_fn()
+                .over(*(the_table[group] for group in step.groupby or []))
+                .orderby(
+                    the_table[step.value_col],
+                    order=Order.desc if step.order == "desc" else Order.asc,
+                )
+                .as_(new_column_name),
+            )
+            .orderby(new_column_name, order=Order.asc)
+        )
+        return query, StepTable(columns=[*table.columns, new_column_name])
+
     def rename(
         self: Self, *, step: "RenameStep", table: StepTable
     ) -> tuple["QueryBuilder", StepTable]:
@@ -537,10 +921,19 @@ class SQLTranslator(ABC):
     ) -> tuple["QueryBuilder", StepTable]:
         col_field: Field = Table(table.name)[step.search_column]
 
-        # Do a nested `replace` to replace many values on the same column
-        replaced_col = col_field
-        for old_name, new_name in step.to_replace:
-            replaced_col = functions.Replace(replaced_col, old_name, new_name)
+        replaced_col: Term
+        if self._replace_whole_values:
+            # A single flat `CASE col WHEN old THEN new ... ELSE col END`, whatever the number
+            # of values to replace
+            replaced_col = SimpleCase(col_field)
+            for old_value, new_value in step.to_replace:
+                replaced_col = replaced_col.when(old_value, new_value)
+            replaced_col = replaced_col.else_(col_field)
+        else:
+            # Do a nested `replace` to replace many substrings on the same column
+            replaced_col = col_field
+            for old_name, new_name in step.to_replace:
+                replaced_col = functions.Replace(replaced_col, old_name, new_name)
 
         query: "QueryBuilder" = self.QUERY_CLS.from_(table.name).select(
             *(c for c in table.columns if c != step.search_column),
@@ -595,8 +988,6 @@ class SQLTranslator(ABC):
         return query, StepTable(columns=[*table.columns, step.new_column_name])
 
     def text(self: Self, *, step: "TextStep", table: StepTable) -> tuple["QueryBuilder", StepTable]:
-        from pypika.terms import ValueWrapper
-
         query: "QueryBuilder" = self.QUERY_CLS.from_(table.name).select(
             *table.columns, ValueWrapper(step.text).as_(step.new_column)
         )
@@ -676,6 +1067,47 @@ class SQLTranslator(ABC):
             table=table,
         )
 
+    def unpivot(
+        self: Self, *, step: "UnpivotStep", table: StepTable
+    ) -> tuple["QueryBuilder", StepTable]:
+        # Each row is cross joined with the (tiny) list of unpivoted column names and the value
+        # is picked with a `CASE`, so the table is scanned once instead of once per column
+        the_table = Table(table.name)
+        names_query = self.QUERY_CLS.select(
+            ValueWrapper(step.unpivot[0]).as_(step.unpivot_column_name)
+        )
+        for column_name in step.unpivot[1:]:
+            names_query *= self.QUERY_CLS.select(
+                ValueWrapper(column_name).as_(step.unpivot_column_name)
+            )
+        names_query = names_query.as_("__unpivot__")
+
+        name_field: Field = names_query[step.unpivot_column_name]
+        value_case = Case()
+        for column_name in step.unpivot:
+            value_case = value_case.when(name_field == column_name, the_table[column_name])
+
+        query: "QueryBuilder" = (
+            self.QUERY_CLS.from_(the_table)
+            .join(names_query)
+            .cross()
+            .select(
+                *(the_table[col] for col in step.keep),
+                name_field,
+                value_case.as_(step.value_column_name),
+            )
+        )
+        if step.dropna:
+            query = (
+                self.QUERY_CLS.from_(query)
+                .select(*step.keep, step.unpivot_column_name, step.value_column_name)
+                .where(Field(step.value_column_name).isnotnull())
+            )
+
+        return query, StepTable(
+            columns=[*step.keep, step.unpivot_column_name, step.value_column_name]
+        )
+
     def uppercase(
         self: Self, *, step: "UppercaseStep", table: StepTable
     ) -> tuple["QueryBuilder", StepTable]:
@@ -687,6 +1119,57 @@ class SQLTranslator(ABC):
         return query, StepTable(columns=table.columns)
 
 
+def get_keyset_columns(
+    steps: Sequence["PipelineStep"], unique_columns: Sequence[str] = ()
+) -> list[str]:
+    """Columns identifying the position of a row in the result, to paginate it"""
+    return [column_sort.column for column_sort in _get_keyset_sort(steps, unique_columns)]
+
+
+def _get_keyset_sort(
+    steps: Sequence["PipelineStep"], unique_columns: Sequence[str]
+) -> list[ColumnSort]:
+    """The sort of the last sort step, whose ties are broken by the unique columns"""
+    keyset_sort: list[ColumnSort] = []
+    for step in reversed(steps):
+        if step.name == "sort":
+            keyset_sort = list(step.columns)
+            break
+    sorted_columns = {column_sort.column for column_sort in keyset_sort}
+    return [
+        *keyset_sort,
+        *(
+            ColumnSort(column=column, order="asc")
+            for column in unique_columns
+            if column not in sorted_columns
+        ),
+    ]
+
+
+class NullsLastOrder(Enum):
+    """Like pypika's `Order`, with the NULL values last"""
+
+    asc = "ASC NULLS LAST"
+    desc = "DESC NULLS LAST"
+
+
+class RenderedQuery(AliasedQuery):  # type: ignore[misc]
+    """A query whose SQL is built by `render` from the kwargs of the parent query (quote chars...),
+    for syntaxes pypika doesn't know about"""
+
+    def __init__(self, name: str, render: Callable[..., str]) -> None:
+        super().__init__(name)
+        self.render = render
+
+    def get_sql(self, **kwargs: Any) -> str:
+        return self.render(**kwargs)
+
+
+class ApproxCountDistinct(functions.AggregateFunction):  # type: ignore[misc]
+    def __init__(self, term: str | Field, alias: str | None = None) -> None:
+        super().__init__("APPROX_COUNT_DISTINCT", term, alias=alias)
+
+
 class CountDistinct(functions.Count):  # type: ignore[misc]
     def __init__(self, param: str | Field, alias: str | None = None) -> None:
         super().__init__(param, alias)
@@ -698,6 +1181,42 @@ class DateFormat(functions.Function):  # type: ignore[misc]
         super().__init__("DATE_FORMAT", term, date_format, alias=alias)
 
 
+class SampledTable(Table):  # type: ignore[misc]
+    """Table followed by a sampling clause like `TABLESAMPLE SYSTEM (10)`"""
+
+    def __init__(self, name: str, *, schema: Schema | None = None, sample_sql: str) -> None:
+        super().__init__(name, schema=schema)
+        self._sample_sql = sample_sql
+
+    def get_sql(self, **kwargs: Any) -> str:
+        return f"{super().get_sql(**kwargs)} {self._sample_sql}"
+
+
+class SimpleCase(Case):  # type: ignore[misc]
+    """`CASE term WHEN value THEN result ... ELSE default END`"""
+
+    def __init__(self, term: Term, alias: str | None = None) -> None:
+        super().__init__(alias=alias)
+        self.term = term
+
+    @builder  # type: ignore[misc]
+    def when(self, value: Any, term: Any) -> "SimpleCase":
+        self._cases.append((self.wrap_constant(value), self.wrap_constant(term)))
+        return self
+
+    def get_sql(self, with_alias: bool = False, **kwargs: Any) -> str:
+        cases = " ".join(
+            f"WHEN {value.get_sql(**kwargs)} THEN {term.get_sql(**kwargs)}"
+            for value, term in self._cases
+        )
+        else_ = f" ELSE {self._else.get_sql(**kwargs)}" if self._else else ""
+        case_sql = f"CASE {self.term.get_sql(**kwargs)} {cases}{else_} END"
+
+        if with_alias:
+            return cast(str, format_alias_sql(case_sql, self.alias, **kwargs))
+        return case_sql
+
+
 class RowNumber(AnalyticFunction):  # type: ignore[misc]
     def __init__(self, **kwargs: Any) -> None:
         super().__init__("ROW_NUMBER", **kwargs)
@@ -713,11 +1232,32 @@ class ParseDate(functions.Function):  # type: ignore[misc]
         super().__init__("PARSE_DATE", term, date_format, alias=alias)
 
 
+class Inclusion(Comparator):  # type: ignore[misc]
+    in_ = " IN "
+    not_in = " NOT IN "
+
+
 class RegexpMatching(Comparator):  # type: ignore[misc]
     similar_to = " SIMILAR TO "
     not_similar_to = " NOT SIMILAR TO "
     contains = " CONTAINS "
     not_contains = " NOT CONTAINS "
+    posix = " ~ "
+    not_posix = " !~ "
+
+
+@lru_cache(maxsize=1024)
+def _load_json_value(value: str) -> Any:
+    return json.loads(value)
+
+
+def _get_ifthenelse_value(value: Any) -> Any:
+    try:
+        # the value is a string
+        return _load_json_value(value)
+    except (json.JSONDecodeError, TypeError):
+        # the value is a formula (or is not hashable)
+        return LiteralValue(value)
 
 
 def _compliant_regex(pattern: str) -> str:
@@ -728,3 +1268,72 @@ def _compliant_regex(pattern: str) -> str:
     (see https://www.postgresql.org/docs/current/functions-matching.html#FUNCTIONS-SIMILARTO-REGEXP)
     """
     return f"%{pattern}%"
+
+
+@dataclass(kw_only=True)
+class RegexLiteral:
+    text: str
+    starts: bool = False
+    ends: bool = False
+    ignore_case: bool = False
+
+
+_REGEX_SPECIAL_CHARS = frozenset(".^$*+?()[]{}|\\")
+_LIKE_SPECIAL_CHARS = frozenset("%_\\")
+
+
+def _get_regex_literal(pattern: str) -> RegexLiteral | None:
+    """
+    Returns the text a regex looks for when it has no special meaning other than anchors,
+    escaped characters and a leading `(?i)` (e.g. `^foo\\.bar`), or `None` for real regexes
+    """
+    ignore_case = pattern.startswith("(?i)")
+    if ignore_case:
+        pattern = pattern.removeprefix("(?i)")
+    starts = pattern.startswith("^")
+    if starts:
+        pattern = pattern[1:]
+    ends = pattern.endswith("$") and not pattern.endswith("\\$")
+    if ends:
+        pattern = pattern[:-1]
+
+    chars: list[str] = []
+    escaped = False
+    for char in pattern:
+        if escaped:
+            # `\d`, `\w`, ... are character classes
+            if char.isalnum():
+                return None
+            chars.append(char)
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif char in _REGEX_SPECIAL_CHARS:
+            return None
+        else:
+            chars.append(char)
+    if escaped:
+        return None
+
+    return RegexLiteral(text="".join(chars), starts=starts, ends=ends, ignore_case=ignore_case)
+
+
+def _get_posix_regex_criterion(
+    column_field: Field, pattern: str, *, negate: bool = False
+) -> Criterion:
+    """
+    Literal patterns are translated with `=` or `LIKE` (index-friendly when anchored at the start)
+    instead of a regex, which can only be evaluated row by row
+    """
+    literal = _get_regex_literal(pattern)
+    if literal is None or _LIKE_SPECIAL_CHARS.intersection(literal.text):
+        comparator = RegexpMatching.not_posix if negate else RegexpMatching.posix
+        return BasicCriterion(comparator, column_field, column_field.wrap_constant(pattern))
+
+    if literal.starts and literal.ends and not literal.ignore_case:
+        return column_field != literal.text if negate else column_field == literal.text
+
+    like_pattern = f"{'' if literal.starts else '%'}{literal.text}{'' if literal.ends else '%'}"
+    if literal.ignore_case:
+        return column_field.not_ilike(like_pattern) if negate else column_field.ilike(like_pattern)
+    return column_field.not_like(like_pattern) if negate else column_field.like(like_pattern)
@@ -3,16 +3,19 @@ from typing import TYPE_CHECKING, Any, TypeVar
 
 from pypika import Criterion, Field, Query, Table, functions
 from pypika.queries import QueryBuilder
+from pypika.terms import BasicCriterion, LiteralValue, Term, ValueWrapper
+from pypika.utils import format_quotes
 
 from sql_data_service.dialects import SQLDialect
-from sql_data_service.operators import FromDateOp, RegexOp, ToDateOp
+from sql_data_service.operators import FromDateOp, RegexOp, SampleOp, ToDateOp
 
-from .base import DataTypeMapping, SQLTranslator, StepTable
+from .base import DataTypeMapping, Inclusion, RenderedQuery, SQLTranslator, StepTable
 
 Self = TypeVar("Self", bound="GoogleBigQueryTranslator")
 
 if TYPE_CHECKING:
     from weaverbird.pipeline.conditions import SimpleCondition
+    from weaverbird.pipeline.steps import EvolutionStep, PivotStep, UnpivotStep
 
 
 class ExtraDialects(Enum):
@@ -48,27 +51,124 @@ class GoogleBigQueryTranslator(SQLTranslator):
     )
     SUPPORT_ROW_NUMBER = True
     SUPPORT_SPLIT_PART = False
+    SUPPORT_WINDOW_FUNCTIONS = True
+    SUPPORT_APPROX_COUNT_DISTINCT = True
+    SUPPORT_NULLS_LAST = True
     FROM_DATE_OP = FromDateOp.TO_CHAR
     REGEXP_OP = RegexOp.CONTAINS
+    SAMPLE_OP = SampleOp.TABLESAMPLE_SYSTEM_PERCENT
     TO_DATE_OP = ToDateOp.PARSE_DATE
 
+    def _get_large_inclusion_criterion(
+        self: Self, column_field: Field, values: list[Any], *, negate: bool
+    ) -> Criterion:
+        # `IN UNNEST([...])` is planned as a semi join on the array instead of a chain of `OR`s
+        array_sql = ",".join(ValueWrapper(v).get_sql(secondary_quote_char="'") for v in values)
+        return BasicCriterion(
+            Inclusion.not_in if negate else Inclusion.in_,
+            column_field,
+            LiteralValue(f"UNNEST([{array_sql}])"),
+        )
+
     def _get_single_condition_criterion(
         self: Self, condition: "SimpleCondition", table: StepTable
     ) -> Criterion:
         column_field: Field = Table(table.name)[condition.column]
 
         match condition.operator:
-            case "from":
-                return functions.Cast(column_field, "datetime") >= ParseDatetime(
-                    "%FT%T", condition.value
-                )
-            case "until":
-                return functions.Cast(column_field, "datetime") <= ParseDatetime(
-                    "%FT%T", condition.value
+            case "from" | "until":
+                return self._get_date_bound_criterion(
+                    column_field, condition.value, is_lower_bound=condition.operator == "from"
                 )
 
         return super()._get_single_condition_criterion(condition, table)
 
+    def _get_date_bound_criterion(
+        self: Self, column_field: Field, value: Any, *, is_lower_bound: bool
+    ) -> Criterion:
+        # The bound is converted to the type of the column rather than the column to a datetime,
+        # so that BigQuery can still prune partitions and clusters
+        column_term: Term = column_field
+        bound: Term = ParseDatetime("%FT%T", value)
+        match self._columns_types.get(column_field.name):
+            case "DATETIME":
+                pass
+            case "TIMESTAMP":
+                bound = functions.Function("TIMESTAMP", bound)
+            case "DATE" if is_lower_bound:
+                # `date >= datetime` is `date > DATE(datetime - 1µs)`, even without midnight
+                day_before = functions.Function(
+                    "DATETIME_SUB", bound, LiteralValue("INTERVAL 1 MICROSECOND")
+                )
+                return column_term > functions.Function("DATE", day_before)
+            case "DATE":
+                bound = functions.Function("DATE", bound)
+            case _:
+                # the column could be a timestamp, which can't be compared to a datetime
+                column_term = functions.Cast(column_field, "datetime")
+
+        return column_term >= bound if is_lower_bound else column_term <= bound
+
+    def _get_evolution_interval(self: Self, step: "EvolutionStep") -> Term:
+        # BigQuery only accepts unquoted intervals like `INTERVAL 1 YEAR`
+        match step.evolution_type:
+            case "vsLastYear":
+                return LiteralValue("INTERVAL 1 YEAR")
+            case "vsLastMonth":
+                return LiteralValue("INTERVAL 1 MONTH")
+            case "vsLastWeek":
+                return LiteralValue("INTERVAL 1 WEEK")
+            case "vsLastDay":
+                return LiteralValue("INTERVAL 1 DAY")
+
+        return super()._get_evolution_interval(step)
+
+    def pivot(self: Self, *, step: "PivotStep", table: StepTable) -> tuple[QueryBuilder, StepTable]:
+        pivot_values = self._get_pivot_values(step)
+        source_query: QueryBuilder = self.QUERY_CLS.from_(table.name).select(
+            *step.index, step.column_to_pivot, step.value_column
+        )
+        agg_fn = self._get_aggregate_function(step.agg_function)
+
+        def render_pivot(**kwargs: Any) -> str:
+            quote_char = kwargs.get("quote_char")
+            values_sql = ",".join(
+                f"{ValueWrapper(v).get_sql(**kwargs)} AS {format_quotes(str(v), quote_char)}"
+                for v in pivot_values
+            )
+            return (
+                f"SELECT * FROM ({source_query.get_sql()}) "
+                f"PIVOT({agg_fn(Field(step.value_column)).get_sql(**kwargs)} "
+                f"FOR {Field(step.column_to_pivot).get_sql(**kwargs)} IN ({values_sql}))"
+            )
+
+        return RenderedQuery("__pivot__", render_pivot), StepTable(
+            columns=[*step.index, *(str(v) for v in pivot_values)]
+        )
+
+    def unpivot(
+        self: Self, *, step: "UnpivotStep", table: StepTable
+    ) -> tuple[QueryBuilder, StepTable]:
+        new_columns = [*step.keep, step.unpivot_column_name, step.value_column_name]
+        source_query: QueryBuilder = self.QUERY_CLS.from_(table.name).select(
+            *step.keep, *step.unpivot
+        )
+
+        def render_unpivot(**kwargs: Any) -> str:
+            nulls_sql = "" if step.dropna else " INCLUDE NULLS"
+            columns_sql = ",".join(
+                f"{Field(col).get_sql(**kwargs)} AS {ValueWrapper(col).get_sql(**kwargs)}"
+                for col in step.unpivot
+            )
+            return (
+                f"SELECT {','.join(Field(col).get_sql(**kwargs) for col in new_columns)} "
+                f"FROM ({source_query.get_sql()}) UNPIVOT{nulls_sql}"
+                f"({Field(step.value_column_name).get_sql(**kwargs)} "
+                f"FOR {Field(step.unpivot_column_name).get_sql(**kwargs)} IN ({columns_sql}))"
+            )
+
+        return RenderedQuery("__unpivot__", render_unpivot), StepTable(columns=new_columns)
+
 
 SQLTranslator.register(GoogleBigQueryTranslator)
 
@@ -1,18 +1,29 @@
-from typing import TYPE_CHECKING, TypeVar
+import json
+import math
+import re
+from typing import TYPE_CHECKING, Any, Sequence, TypeVar
 
-from pypika import Field, Table, functions
+from pypika import Criterion, Field, Table, functions
 from pypika.dialects import MySQLQuery
+from pypika.terms import BasicCriterion, LiteralValue, Parameter, ValueWrapper
 
 from sql_data_service.dialects import SQLDialect
-from sql_data_service.operators import FromDateOp, RegexOp, ToDateOp
+from sql_data_service.operators import FromDateOp, RegexOp, SampleOp, ToDateOp
 
-from .base import DataTypeMapping, SQLTranslator, StepTable
+from .base import DataTypeMapping, Inclusion, SQLTranslator, StepTable
 
 Self = TypeVar("Self", bound="MySQLTranslator")
 
+# first version of MySQL with `JSON_TABLE`, whose MariaDB version is not used
+JSON_TABLE_MIN_VERSION = (8, 0, 4)
+# placeholder of the parameters while the query is built, replaced by the `%s` of aiomysql
+# once the other `%` of the query are escaped
+PARAMETER_MARKER = "\x00"
+
 
 if TYPE_CHECKING:
     from pypika.queries import QueryBuilder
+    from weaverbird.pipeline import PipelineStep
     from weaverbird.pipeline.steps import SplitStep
 
 
@@ -28,10 +39,47 @@ class MySQLTranslator(SQLTranslator):
     )
     SUPPORT_ROW_NUMBER = False
     SUPPORT_SPLIT_PART = False
+    SUPPORT_WINDOW_FUNCTIONS = False
+    SUPPORT_APPROX_COUNT_DISTINCT = False
+    SUPPORT_NULLS_LAST = False
     FROM_DATE_OP = FromDateOp.DATE_FORMAT
     REGEXP_OP = RegexOp.REGEXP
+    SAMPLE_OP = SampleOp.RAND
     TO_DATE_OP = ToDateOp.STR_TO_DATE
 
+    def get_query_str(self: Self, *, steps: Sequence["PipelineStep"], **kwargs: Any) -> str:
+        query_str = super().get_query_str(steps=steps, **kwargs)
+        if not self.parameters:
+            return query_str
+        # aiomysql formats the queries that have parameters with `%`
+        return query_str.replace("%", "%%").replace(PARAMETER_MARKER, "%s")
+
+    def _add_parameter(self: Self, value: Any) -> Parameter:
+        self.parameters.append(value)
+        return Parameter(PARAMETER_MARKER)
+
+    def _get_large_inclusion_criterion(
+        self: Self, column_field: Field, values: list[Any], *, negate: bool
+    ) -> Criterion:
+        # Lists of numbers are sent as a single JSON document turned into a derived table, that
+        # MySQL materializes (with an index) for the semi join. Strings keep a literal list,
+        # the only way for them to be compared with the collation of the column, whatever it is
+        json_table_type = _get_json_table_type(values)
+        if json_table_type is None or not _has_json_table(self._server_version):
+            return super()._get_large_inclusion_criterion(column_field, values, negate=negate)
+
+        json_values = json.dumps(values)
+        json_document = (
+            self._add_parameter(json_values) if self._bind_parameters else ValueWrapper(json_values)
+        ).get_sql(quote_char="'")
+        values_query = LiteralValue(
+            f"(SELECT `v` FROM JSON_TABLE({json_document},'$[*]' "
+            f"COLUMNS(`v` {json_table_type} PATH '$')) `__values__`)"
+        )
+        return BasicCriterion(
+            Inclusion.not_in if negate else Inclusion.in_, column_field, values_query
+        )
+
     def split(
         self: Self, *, step: "SplitStep", table: StepTable
     ) -> tuple["QueryBuilder", StepTable]:
@@ -59,3 +107,23 @@ class SubstringIndex(functions.Function):  # type: ignore[misc]
         self, term: str | Field, delimiter: str, count: int, alias: str | None = None
     ) -> None:
         super().__init__("SUBSTRING_INDEX", term, delimiter, count, alias=alias)
+
+
+def _get_json_table_type(values: list[Any]) -> str | None:
+    not_null_values = [v for v in values if v is not None]
+    if any(
+        isinstance(v, bool) or not isinstance(v, (int, float)) or not math.isfinite(v)
+        for v in not_null_values
+    ):
+        return None
+    if all(isinstance(v, int) for v in not_null_values):
+        return "BIGINT"
+    return "DOUBLE"
+
+
+def _has_json_table(server_version: str | None) -> bool:
+    """Whether the server (e.g. "8.0.28", or "10.6.7-MariaDB") is a MySQL with `JSON_TABLE`"""
+    if server_version is None or "mariadb" in server_version.lower():
+        return False
+    version = tuple(int(part) for part in re.findall(r"\d+", server_version.split("-")[0])[:3])
+    return version >= JSON_TABLE_MIN_VERSION
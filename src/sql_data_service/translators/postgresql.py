@@ -1,9 +1,22 @@
+from typing import TYPE_CHECKING, Any, TypeVar
+
+from pypika import Criterion, Field, Table, functions
 from pypika.dialects import PostgreSQLQuery
+from pypika.enums import Equality
+from pypika.terms import BasicCriterion, Term, ValueWrapper
+from pypika.utils import format_quotes
 
 from sql_data_service.dialects import SQLDialect
-from sql_data_service.operators import FromDateOp, RegexOp, ToDateOp
+from sql_data_service.operators import FromDateOp, RegexOp, SampleOp, ToDateOp
+
+from .base import DataTypeMapping, RenderedQuery, SQLTranslator, StepTable
+
+Self = TypeVar("Self", bound="PostgreSQLTranslator")
+
 
-from .base import DataTypeMapping, SQLTranslator
+if TYPE_CHECKING:
+    from pypika.queries import QueryBuilder
+    from weaverbird.pipeline.steps import UnpivotStep
 
 
 class PostgreSQLTranslator(SQLTranslator):
@@ -18,9 +31,83 @@ class PostgreSQLTranslator(SQLTranslator):
     )
     SUPPORT_ROW_NUMBER = True
     SUPPORT_SPLIT_PART = True
+    SUPPORT_WINDOW_FUNCTIONS = True
+    SUPPORT_APPROX_COUNT_DISTINCT = False
+    SUPPORT_NULLS_LAST = True
     FROM_DATE_OP = FromDateOp.TO_CHAR
-    REGEXP_OP = RegexOp.SIMILAR_TO
+    REGEXP_OP = RegexOp.POSIX
+    SAMPLE_OP = SampleOp.TABLESAMPLE_SYSTEM
     TO_DATE_OP = ToDateOp.TO_DATE
 
+    def _get_large_inclusion_criterion(
+        self: Self, column_field: Field, values: list[Any], *, negate: bool
+    ) -> Criterion:
+        # `"col" = ANY('{...}')` is a single array value instead of a list of constants to parse
+        # and plan. Like literal values, its elements are converted to the type of the column.
+        # A bound array would be encoded with the type of the column instead, which fails for
+        # the values coming from JSON (e.g. strings compared to dates), so it is only sent as
+        # text, to be cast, when the type of the column is known
+        array: Term
+        column_type = self._columns_types.get(column_field.name)
+        if self._bind_parameters and column_type is not None:
+            text_values = [None if v is None else str(v) for v in values]
+            array = functions.Cast(
+                functions.Cast(self._add_parameter(text_values), "TEXT[]"), f"{column_type}[]"
+            )
+        else:
+            array = ValueWrapper(_to_array_literal(values))
+        if negate:
+            return BasicCriterion(Equality.ne, column_field, functions.Function("ALL", array))
+        return BasicCriterion(Equality.eq, column_field, functions.Function("ANY", array))
+
+    def unpivot(
+        self: Self, *, step: "UnpivotStep", table: StepTable
+    ) -> tuple["QueryBuilder", StepTable]:
+        # CROSS JOIN LATERAL (VALUES ('col1', "col1"), ('col2', "col2")) "__unpivot__"("name","value")
+        the_table = Table(table.name)
+
+        def render_lateral_values(**kwargs: Any) -> str:
+            quote_char = kwargs.get("quote_char")
+            rows_sql = ",".join(
+                f"({ValueWrapper(col).get_sql(**kwargs)},{the_table[col].get_sql(**kwargs)})"
+                for col in step.unpivot
+            )
+            columns_sql = ",".join(
+                format_quotes(col, quote_char)
+                for col in (step.unpivot_column_name, step.value_column_name)
+            )
+            return f"LATERAL (VALUES {rows_sql}) {format_quotes('__unpivot__', quote_char)}({columns_sql})"
+
+        lateral_values = RenderedQuery("__unpivot__", render_lateral_values)
+        value_field = Field(step.value_column_name, table=lateral_values)
+        query: "QueryBuilder" = (
+            self.QUERY_CLS.from_(the_table)
+            .join(lateral_values)
+            .cross()
+            .select(
+                *(the_table[col] for col in step.keep),
+                Field(step.unpivot_column_name, table=lateral_values),
+                value_field,
+            )
+        )
+        if step.dropna:
+            query = query.where(value_field.isnotnull())
+
+        return query, StepTable(
+            columns=[*step.keep, step.unpivot_column_name, step.value_column_name]
+        )
+
 
 SQLTranslator.register(PostgreSQLTranslator)
+
+
+def _to_array_literal(values: list[Any]) -> str:
+    """Builds a PostgreSQL array literal like `{"foo","bar",NULL}`"""
+
+    def to_element(value: Any) -> str:
+        if value is None:
+            return "NULL"
+        escaped = str(value).replace("\\", "\\\\").replace('"', '\\"')
+        return f'"{escaped}"'
+
+    return "{" + ",".join(to_element(v) for v in values) + "}"
@@ -1,9 +1,17 @@
+from typing import TYPE_CHECKING, Any, TypeVar
+
+from pypika import Criterion, Field, functions
 from pypika.dialects import RedshiftQuery
 
 from sql_data_service.dialects import SQLDialect
-from sql_data_service.operators import FromDateOp, RegexOp, ToDateOp
+from sql_data_service.operators import FromDateOp, RegexOp, SampleOp, ToDateOp
+
+from .base import ApproxCountDistinct, CountDistinct, DataTypeMapping, SQLTranslator
 
-from .base import DataTypeMapping, SQLTranslator
+Self = TypeVar("Self", bound="RedshiftTranslator")
+
+if TYPE_CHECKING:
+    from weaverbird.pipeline.steps.aggregate import AggregateFn
 
 
 class RedshiftTranslator(SQLTranslator):
@@ -18,9 +26,32 @@ class RedshiftTranslator(SQLTranslator):
     )
     SUPPORT_ROW_NUMBER = True
     SUPPORT_SPLIT_PART = True
+    SUPPORT_WINDOW_FUNCTIONS = True
+    SUPPORT_APPROX_COUNT_DISTINCT = True
+    SUPPORT_NULLS_LAST = True
     FROM_DATE_OP = FromDateOp.TO_CHAR
-    REGEXP_OP = RegexOp.SIMILAR_TO
+    REGEXP_OP = RegexOp.POSIX
+    SAMPLE_OP = SampleOp.RANDOM
     TO_DATE_OP = ToDateOp.TO_DATE
 
+    def _get_aggregate_function(
+        self: Self, agg_function: "AggregateFn"
+    ) -> functions.AggregateFunction:
+        agg_fn = super()._get_aggregate_function(agg_function)
+        # Redshift has no `APPROX_COUNT_DISTINCT` but `APPROXIMATE COUNT(DISTINCT ...)`
+        return ApproximateCountDistinct if agg_fn is ApproxCountDistinct else agg_fn
+
+    def _get_large_inclusion_criterion(
+        self: Self, column_field: Field, values: list[Any], *, negate: bool
+    ) -> Criterion:
+        # unlike PostgreSQL, Redshift has no arrays for `= ANY(...)`, but it already evaluates
+        # the `IN` lists of more than 10 values as a single scalar array
+        return column_field.notin(values) if negate else column_field.isin(values)
+
 
 SQLTranslator.register(RedshiftTranslator)
+
+
+class ApproximateCountDistinct(CountDistinct):
+    def get_function_sql(self, **kwargs: Any) -> str:
+        return f"APPROXIMATE {super().get_function_sql(**kwargs)}"
@@ -1,9 +1,22 @@
+import json
+from typing import TYPE_CHECKING, Any, TypeVar
+
+from pypika import Criterion, Field
 from pypika.dialects import SnowflakeQuery
+from pypika.terms import BasicCriterion, LiteralValue, ValueWrapper
+from pypika.utils import format_quotes
 
 from sql_data_service.dialects import SQLDialect
-from sql_data_service.operators import FromDateOp, RegexOp, ToDateOp
+from sql_data_service.operators import FromDateOp, RegexOp, SampleOp, ToDateOp
+
+from .base import DataTypeMapping, Inclusion, RenderedQuery, SQLTranslator, StepTable
+
+Self = TypeVar("Self", bound="SnowflakeTranslator")
+
 
-from .base import DataTypeMapping, SQLTranslator
+if TYPE_CHECKING:
+    from pypika.queries import QueryBuilder
+    from weaverbird.pipeline.steps import PivotStep, UnpivotStep
 
 
 class SnowflakeTranslator(SQLTranslator):
@@ -18,9 +31,75 @@ class SnowflakeTranslator(SQLTranslator):
     )
     SUPPORT_ROW_NUMBER = True
     SUPPORT_SPLIT_PART = True
+    SUPPORT_WINDOW_FUNCTIONS = True
+    SUPPORT_APPROX_COUNT_DISTINCT = True
+    SUPPORT_NULLS_LAST = True
     FROM_DATE_OP = FromDateOp.TO_CHAR
     REGEXP_OP = RegexOp.REGEXP
+    SAMPLE_OP = SampleOp.SAMPLE
     TO_DATE_OP = ToDateOp.TO_DATE
 
+    def _get_large_inclusion_criterion(
+        self: Self, column_field: Field, values: list[Any], *, negate: bool
+    ) -> Criterion:
+        # the values are sent as a single JSON string and flattened into a semi join
+        json_values = ValueWrapper(_escape_backslashes(json.dumps(values, default=str))).get_sql()
+        values_query = LiteralValue(
+            f"(SELECT value FROM TABLE(FLATTEN(INPUT => PARSE_JSON({json_values}))))"
+        )
+        return BasicCriterion(
+            Inclusion.not_in if negate else Inclusion.in_, column_field, values_query
+        )
+
+    def pivot(
+        self: Self, *, step: "PivotStep", table: StepTable
+    ) -> tuple["QueryBuilder", StepTable]:
+        pivot_values = self._get_pivot_values(step)
+        new_columns = [*step.index, *(str(v) for v in pivot_values)]
+        source_query: "QueryBuilder" = self.QUERY_CLS.from_(table.name).select(
+            *step.index, step.column_to_pivot, step.value_column
+        )
+        agg_fn = self._get_aggregate_function(step.agg_function)
+
+        def render_pivot(**kwargs: Any) -> str:
+            # pivoted columns would be named after the quoted values (e.g. `'foo'`)
+            # so all columns are renamed with the alias of the pivot
+            alias_quote_char = kwargs.get("alias_quote_char") or kwargs.get("quote_char")
+            values_sql = ",".join(ValueWrapper(v).get_sql(**kwargs) for v in pivot_values)
+            columns_sql = ",".join(format_quotes(col, alias_quote_char) for col in new_columns)
+            return (
+                f"SELECT * FROM ({source_query.get_sql()}) "
+                f"PIVOT({agg_fn(Field(step.value_column)).get_sql(**kwargs)} "
+                f"FOR {Field(step.column_to_pivot).get_sql(**kwargs)} IN ({values_sql})) "
+                f"{format_quotes('__pivot__', alias_quote_char)}({columns_sql})"
+            )
+
+        return RenderedQuery("__pivot__", render_pivot), StepTable(columns=new_columns)
+
+    def unpivot(
+        self: Self, *, step: "UnpivotStep", table: StepTable
+    ) -> tuple["QueryBuilder", StepTable]:
+        new_columns = [*step.keep, step.unpivot_column_name, step.value_column_name]
+        source_query: "QueryBuilder" = self.QUERY_CLS.from_(table.name).select(
+            *step.keep, *step.unpivot
+        )
+
+        def render_unpivot(**kwargs: Any) -> str:
+            nulls_sql = "" if step.dropna else " INCLUDE NULLS"
+            columns_sql = ",".join(Field(col).get_sql(**kwargs) for col in step.unpivot)
+            return (
+                f"SELECT {','.join(Field(col).get_sql(**kwargs) for col in new_columns)} "
+                f"FROM ({source_query.get_sql()}) UNPIVOT{nulls_sql}"
+                f"({Field(step.value_column_name).get_sql(**kwargs)} "
+                f"FOR {Field(step.unpivot_column_name).get_sql(**kwargs)} IN ({columns_sql}))"
+            )
+
+        return RenderedQuery("__unpivot__", render_unpivot), StepTable(columns=new_columns)
+
 
 SQLTranslator.register(SnowflakeTranslator)
+
+
+def _escape_backslashes(value: str) -> str:
+    # backslashes are escape characters in string literals
+    return value.replace("\\", "\\\\")
@@ -0,0 +1,79 @@
+"""
+Compares the serialization of a preview result by FastAPI (`jsonable_encoder` then `json.dumps`)
+with `FastJSONResponse`.
+
+Usage: python -m tests.benchmarks.bench_serialization [nb_rows]
+"""
+import asyncio
+import datetime
+import sys
+import timeit
+from decimal import Decimal
+from typing import Any, Callable
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+
+from sql_data_service.connectors.base import ColumnDescription, ResultSet
+from sql_data_service.formats import FastJSONResponse
+
+COLUMNS = [
+    ColumnDescription(name="id", type="int4"),
+    ColumnDescription(name="username", type="text"),
+    ColumnDescription(name="balance", type="numeric"),
+    ColumnDescription(name="birthdate", type="date"),
+    ColumnDescription(name="updated_at", type="timestamp"),
+]
+
+
+def get_result(nb_rows: int) -> ResultSet:
+    start = datetime.datetime(2022, 1, 1)
+    rows = [
+        (
+            i,
+            f"user_{i}",
+            Decimal(i) / 100,
+            datetime.date(1970, 1, 1) + datetime.timedelta(days=i % 10_000),
+            start + datetime.timedelta(seconds=i),
+        )
+        for i in range(nb_rows)
+    ]
+    return ResultSet.from_rows(COLUMNS, rows)
+
+
+async def fastapi_path(result: ResultSet) -> bytes:
+    # what FastAPI does when an endpoint returns the records
+    content = await serialize_response(response_content=result.to_records())
+    return JSONResponse(content).body
+
+
+async def fast_path(result: ResultSet) -> bytes:
+    return FastJSONResponse(result.to_records()).body
+
+
+async def fast_columnar_path(result: ResultSet) -> bytes:
+    return FastJSONResponse(
+        {"columns": result.column_names, "data": result.to_columns()},
+    ).body
+
+
+def measure(name: str, path: Callable[[ResultSet], Any], result: ResultSet) -> float:
+    loop = asyncio.new_event_loop()
+    try:
+        duration = min(
+            timeit.repeat(lambda: loop.run_until_complete(path(result)), number=1, repeat=5)
+        )
+    finally:
+        loop.close()
+    print(f"{name:<24}{duration * 1000:>10.1f} ms")
+    return duration
+
+
+if __name__ == "__main__":
+    nb_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    result = get_result(nb_rows)
+    print(f"{nb_rows} rows")
+    reference = measure("jsonable_encoder + json", fastapi_path, result)
+    for name, path in [("records", fast_path), ("columnar", fast_columnar_path)]:
+        duration = measure(name, path, result)
+        print(f"{'':<24}{reference / duration:>10.1f} x faster")
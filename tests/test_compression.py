@@ -0,0 +1,89 @@
+import gzip
+import zlib
+from typing import AsyncIterator
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from fastapi.testclient import TestClient
+
+from sql_data_service.compression import CompressionMiddleware, negotiate_encoding
+
+app = FastAPI()
+app.add_middleware(CompressionMiddleware)
+client = TestClient(app)
+
+LINE = "Eric,30,Paris\n"
+
+
+@app.get("/small")
+def get_small() -> PlainTextResponse:
+    return PlainTextResponse(LINE)
+
+
+@app.get("/large")
+def get_large() -> PlainTextResponse:
+    return PlainTextResponse(LINE * 1000)
+
+
+@app.get("/parquet")
+def get_parquet() -> Response:
+    return Response(LINE.encode() * 1000, media_type="application/vnd.apache.parquet")
+
+
+@app.get("/stream")
+def get_stream() -> StreamingResponse:
+    async def lines() -> AsyncIterator[str]:
+        for _ in range(3):
+            yield LINE * 100
+
+    return StreamingResponse(lines(), media_type="text/csv")
+
+
+@pytest.mark.parametrize(
+    "accept_encoding,expected",
+    [
+        ("", None),
+        ("gzip", "gzip"),
+        ("gzip;q=0.5, br", "br"),
+        ("zstd, br, gzip", "zstd"),
+        ("gzip;q=0, identity", None),
+        ("*", "zstd"),
+        ("*;q=0.1, GZIP", "gzip"),
+    ],
+)
+def test_negotiate_encoding(accept_encoding: str, expected: str | None) -> None:
+    assert negotiate_encoding(accept_encoding, ["zstd", "br", "gzip"]) == expected
+
+
+def test_small_response_is_not_compressed() -> None:
+    response = client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.text == LINE
+
+
+def test_large_response_is_compressed() -> None:
+    response = client.get("/large", headers={"Accept-Encoding": "gzip"}, stream=True)
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    body = response.raw.read(decode_content=False)
+    assert int(response.headers["content-length"]) == len(body)
+    assert gzip.decompress(body).decode() == LINE * 1000
+
+
+def test_compressed_media_type_is_not_compressed_again() -> None:
+    response = client.get("/parquet", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert len(response.content) == len(LINE) * 1000
+
+
+def test_streamed_response_is_compressed_chunk_by_chunk() -> None:
+    response = client.get("/stream", headers={"Accept-Encoding": "gzip"}, stream=True)
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    chunks = [decompressor.decompress(chunk) for chunk in response.raw.stream(decode_content=False)]
+    # each compressed chunk can be decompressed on its own
+    assert all(chunks)
+    assert b"".join(chunks).decode() == LINE * 300
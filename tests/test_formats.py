@@ -0,0 +1,96 @@
+import asyncio
+import datetime
+import io
+import json
+import math
+from decimal import Decimal
+from typing import Any, AsyncIterator, Sequence
+from uuid import UUID
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+
+from sql_data_service.connectors.base import ColumnDescription, ResultSet
+from sql_data_service.formats import FastJSONResponse, dump_json, to_arrow_stream, to_parquet_chunks
+
+ROW = {
+    "balance": Decimal("12.34"),
+    "birthdate": datetime.date(1990, 5, 9),
+    "updated_at": datetime.datetime(2022, 1, 1, 12, 30, 15, 123456),
+    "updated_at_tz": datetime.datetime(2022, 1, 1, 12, 30, tzinfo=datetime.timezone.utc),
+    "duration": datetime.timedelta(minutes=2),
+    "id": UUID("12345678-1234-5678-1234-567812345678"),
+    "name": "Éric",
+    "missing": None,
+}
+
+
+def test_dump_json_like_fastapi() -> None:
+    assert json.loads(dump_json([ROW])) == jsonable_encoder([ROW])
+
+
+def test_fast_json_response() -> None:
+    response = FastJSONResponse({"data": [[1, 2], [Decimal("1.5"), None]]}, headers={"X-A": "1"})
+    assert response.body == b'{"data":[[1,2],[1.5,null]]}'
+    assert response.media_type == "application/json"
+    assert response.headers["X-A"] == "1"
+
+
+def test_parquet_row_groups() -> None:
+    pq = pytest.importorskip("pyarrow.parquet")
+    columns = [
+        ColumnDescription(name="id", type="int4"),
+        ColumnDescription(name="amount", type="numeric"),
+        ColumnDescription(name="comment"),
+        ColumnDescription(name="big", type="longlong"),
+    ]
+
+    async def batches() -> AsyncIterator[tuple[list[ColumnDescription], Sequence[Sequence[Any]]]]:
+        for i in range(0, 25, 5):
+            # the values of the column of unknown type change of type
+            comment = None if i == 0 else i if i < 15 else i / 2
+            yield columns, [(j, Decimal(j) / 2, comment, 2**64 - 1) for j in range(i, i + 5)]
+        yield columns, []
+
+    async def get_chunks() -> list[bytes]:
+        return [chunk async for chunk in to_parquet_chunks(batches(), row_group_size=10)]
+
+    chunks = asyncio.run(get_chunks())
+    # each row group is sent as soon as it is written
+    assert len([chunk for chunk in chunks if chunk]) > 1
+
+    parquet_file = pq.ParquetFile(io.BytesIO(b"".join(chunks)))
+    metadata = parquet_file.metadata
+    assert [metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)] == [10, 10, 5]
+    assert [str(field.type) for field in parquet_file.schema_arrow] == [
+        "int32",
+        "double",
+        "string",
+        "decimal128(20, 0)",
+    ]
+    rows = parquet_file.read().to_pylist()
+    assert rows[3] == {"id": 3, "amount": 1.5, "comment": None, "big": Decimal(2**64 - 1)}
+    assert [row["comment"] for row in rows[5::5]] == ["5", "10", "7.5", "10.0"]
+
+
+def test_arrow_stream_types() -> None:
+    pa = pytest.importorskip("pyarrow")
+    result = ResultSet.from_rows(
+        [
+            ColumnDescription(name="id", type="int4"),
+            ColumnDescription(name="amount", type="numeric"),
+            ColumnDescription(name="city", type="text"),
+            ColumnDescription(name="comment"),
+        ],
+        [(1, Decimal("1.5"), "Paris", 1), (2, Decimal("NaN"), None, "a")],
+    )
+    table = pa.ipc.open_stream(to_arrow_stream(result)).read_all()
+    assert [str(field.type) for field in table.schema] == [
+        "int32",
+        "double",
+        "dictionary<values=string, indices=int32, ordered=0>",
+        "dictionary<values=string, indices=int32, ordered=0>",
+    ]
+    rows = table.to_pylist()
+    assert rows[0] == {"id": 1, "amount": 1.5, "city": "Paris", "comment": "1"}
+    assert math.isnan(rows[1]["amount"])
@@ -0,0 +1,114 @@
+import asyncio
+import datetime
+from typing import Any, AsyncIterator
+
+import pytest
+from weaverbird.pipeline import PipelineWithVariables
+
+from sql_data_service.dialects import SQLDialect
+from sql_data_service.partitioning import (
+    check_partitionable,
+    get_partition_bounds,
+    get_partition_conditions,
+    get_partitioned_pipelines,
+    merge_streams,
+)
+from sql_data_service.translate import translate_pipeline
+
+
+@pytest.mark.parametrize(
+    "min_value,max_value,partitions,expected",
+    [
+        (0, 100, 4, [0, 25, 50, 75]),
+        (1, 3, 4, [1, 2]),
+        (0.0, 1.0, 2, [0.0, 0.5]),
+        (
+            datetime.date(2022, 1, 1),
+            datetime.date(2022, 1, 31),
+            3,
+            [datetime.date(2022, 1, 1), datetime.date(2022, 1, 11), datetime.date(2022, 1, 21)],
+        ),
+        (
+            datetime.datetime(2022, 1, 1),
+            datetime.datetime(2022, 1, 2),
+            2,
+            [datetime.datetime(2022, 1, 1), datetime.datetime(2022, 1, 1, 12)],
+        ),
+    ],
+)
+def test_get_partition_bounds(
+    min_value: Any, max_value: Any, partitions: int, expected: list[Any]
+) -> None:
+    assert get_partition_bounds(min_value, max_value, partitions) == expected
+
+
+def test_get_partition_bounds_of_strings() -> None:
+    with pytest.raises(ValueError):
+        get_partition_bounds("a", "z", 2)
+
+
+def test_partitioned_pipelines() -> None:
+    pipeline = PipelineWithVariables(
+        steps=[
+            {"name": "domain", "domain": "users"},
+            {"name": "select", "columns": ["username", "age"]},
+        ]
+    )
+    check_partitionable(pipeline)
+    conditions = get_partition_conditions("age", [0, 50])
+    queries = [
+        translate_pipeline(
+            sql_dialect=SQLDialect.POSTGRESQL,
+            pipeline=partitioned_pipeline,
+            tables_columns={"users": ["username", "age", "city"]},
+        )
+        for partitioned_pipeline in get_partitioned_pipelines(pipeline, conditions)
+    ]
+    filters = [query.split("WHERE ")[1].split(")")[0] for query in queries]
+    assert filters == ['"age">=0 AND "age"<50', '"age">=50', '"age" IS NULL']
+
+
+def test_non_partitionable_pipeline() -> None:
+    pipeline = PipelineWithVariables(
+        steps=[
+            {"name": "domain", "domain": "users"},
+            {"name": "sort", "columns": [{"column": "age", "order": "asc"}]},
+        ]
+    )
+    with pytest.raises(ValueError, match="sort"):
+        check_partitionable(pipeline)
+
+
+async def stream(name: str, size: int, delay: float) -> AsyncIterator[str]:
+    for i in range(size):
+        await asyncio.sleep(delay)
+        yield f"{name}{i}"
+
+
+async def collect(stream: AsyncIterator[str]) -> list[str]:
+    return [item async for item in stream]
+
+
+def test_merge_streams_ordered() -> None:
+    streams = [stream("a", 3, 0.02), stream("b", 5, 0.001), stream("c", 2, 0)]
+    merged = asyncio.run(collect(merge_streams(streams, ordered=True, concurrency=2)))
+    assert merged == ["a0", "a1", "a2", "b0", "b1", "b2", "b3", "b4", "c0", "c1"]
+
+
+def test_merge_streams_unordered() -> None:
+    streams = [stream("a", 3, 0.02), stream("b", 5, 0.001)]
+    merged = asyncio.run(collect(merge_streams(streams, ordered=False, concurrency=2)))
+    assert sorted(merged) == ["a0", "a1", "a2", "b0", "b1", "b2", "b3", "b4"]
+    # the fastest stream comes first
+    assert merged[0] == "b0"
+
+
+def test_merge_streams_error() -> None:
+    async def failing_stream() -> AsyncIterator[str]:
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+        yield
+
+    streams = [stream("a", 100, 0.01), failing_stream()]
+    with pytest.raises(RuntimeError, match="boom"):
+        asyncio.run(collect(merge_streams(streams, ordered=True, concurrency=2)))
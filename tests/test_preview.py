@@ -1,9 +1,15 @@
+import asyncio
+import io
+import json
+from decimal import Decimal
 from typing import Any
 
 import pytest
 from fastapi.testclient import TestClient
+from weaverbird.pipeline.steps import SortStep
 
-from sql_data_service.app import PreviewQuery, app
+from sql_data_service.app import ExportQuery, PreviewQuery, app
+from sql_data_service.connectors.postgresql import PostgreSQLExecutor
 from sql_data_service.dialects import SQLDialect
 from sql_data_service.models import SQLQueryDefinition
 
@@ -1144,6 +1150,27 @@ ALL_TEST_TABLES = ["labels", "labels2", "logins", "logins2", "users"]
                 {"username": "Bulbi", "age": 7, "city": "Bourg Palette", "newAge": 2},
             ],
         ),
+        # ~~~~~~~~~~~ PIVOT ~~~~~~~~~~~~~~
+        (
+            [
+                {"name": "domain", "domain": "labels"},
+                {
+                    "name": "pivot",
+                    "index": ["Label"],
+                    "column_to_pivot": "Cartel",
+                    "value_column": "Value",
+                    "agg_function": "sum",
+                },
+            ],
+            [
+                {"Label": "Label 1", "Cartel 1": 13, "Cartel 2": None},
+                {"Label": "Label 2", "Cartel 1": 6, "Cartel 2": None},
+                {"Label": "Label 3", "Cartel 1": 20, "Cartel 2": None},
+                {"Label": "Label 4", "Cartel 1": None, "Cartel 2": 1},
+                {"Label": "Label 5", "Cartel 1": None, "Cartel 2": 12},
+                {"Label": "Label 6", "Cartel 1": None, "Cartel 2": 5},
+            ],
+        ),
     ),
 )
 def test_get_preview(
@@ -1261,3 +1288,541 @@ def test_todate(sql_dialect: SQLDialect, request: pytest.FixtureRequest) -> None
         {"username": "Pikachu", "login_text": "2020-01-01", "type": "Electric"},
         {"username": "Bulbi", "login_text": "2019-01-01", "type": "Grass/Poison"},
     ]
+
+
+@pytest.mark.usefixtures("is_postgresql_ready")
+def test_window_functions(postgresql_connection_config: Any) -> None:
+    sql_query_definition = SQLQueryDefinition(
+        connection={
+            "dialect": SQLDialect.POSTGRESQL.value,
+            "config": postgresql_connection_config,
+        },
+        pipeline={
+            "steps": [
+                {"name": "domain", "domain": "labels"},
+                {
+                    "name": "cumsum",
+                    "toCumSum": [["Value", "cumsum"]],
+                    "referenceColumn": "Label",
+                    "groupby": ["Cartel"],
+                },
+                {
+                    "name": "rank",
+                    "valueCol": "Value",
+                    "order": "desc",
+                    "method": "standard",
+                    "newColumnName": "rank",
+                },
+            ],
+        },
+    )
+    preview_query = PreviewQuery(
+        query_def=sql_query_definition,
+        tables=ALL_TEST_TABLES,
+    )
+    response = client.post("/preview", json=preview_query.dict())
+    assert response.status_code == 200
+    assert response.json() == [
+        {"Label": "Label 3", "Cartel": "Cartel 1", "Value": 20, "cumsum": 39, "rank": 1},
+        {"Label": "Label 1", "Cartel": "Cartel 1", "Value": 13, "cumsum": 13, "rank": 2},
+        {"Label": "Label 5", "Cartel": "Cartel 2", "Value": 12, "cumsum": 13, "rank": 3},
+        {"Label": "Label 2", "Cartel": "Cartel 1", "Value": 6, "cumsum": 19, "rank": 4},
+        {"Label": "Label 6", "Cartel": "Cartel 2", "Value": 5, "cumsum": 18, "rank": 5},
+        {"Label": "Label 4", "Cartel": "Cartel 2", "Value": 1, "cumsum": 1, "rank": 6},
+    ]
+
+
+@pytest.mark.usefixtures(
+    "is_mysql_ready",
+    "is_postgresql_ready",
+)
+@pytest.mark.parametrize(
+    "sql_dialect",
+    (
+        SQLDialect.MYSQL,
+        SQLDialect.POSTGRESQL,
+    ),
+)
+def test_pagination(sql_dialect: SQLDialect, request: pytest.FixtureRequest) -> None:
+    sql_connection_config = request.getfixturevalue(f"{sql_dialect}_connection_config")
+    sql_query_definition = SQLQueryDefinition(
+        connection={
+            "dialect": sql_dialect.value,
+            "config": sql_connection_config,
+        },
+        pipeline={
+            "steps": [
+                {"name": "domain", "domain": "labels"},
+                {"name": "sort", "columns": [{"column": "Label", "order": "asc"}]},
+                {"name": "select", "columns": ["Label"]},
+            ],
+        },
+    )
+    preview_query = PreviewQuery(
+        query_def=sql_query_definition,
+        tables=ALL_TEST_TABLES,
+        limit=4,
+        unique_columns=["Label"],
+    )
+    response = client.post("/preview", json=preview_query.dict())
+    assert response.status_code == 200
+    assert response.json() == [{"Label": f"Label {i}"} for i in range(1, 5)]
+
+    preview_query.cursor = response.headers["X-Next-Cursor"]
+    response = client.post("/preview", json=preview_query.dict())
+    assert response.status_code == 200
+    assert response.json() == [{"Label": "Label 5"}, {"Label": "Label 6"}]
+    assert "X-Next-Cursor" not in response.headers
+
+
+@pytest.mark.usefixtures("is_postgresql_ready")
+def test_sampled_pagination(postgresql_connection_config: Any) -> None:
+    sql_query_definition = SQLQueryDefinition(
+        connection={"dialect": SQLDialect.POSTGRESQL.value, "config": postgresql_connection_config},
+        pipeline={
+            "steps": [
+                {"name": "domain", "domain": "labels"},
+                {"name": "select", "columns": ["Label"]},
+            ],
+        },
+    )
+    preview_query = PreviewQuery(
+        query_def=sql_query_definition,
+        tables=ALL_TEST_TABLES,
+        sample_percent=50,
+        limit=1,
+        unique_columns=["Label"],
+    )
+    response = client.post("/preview", json=preview_query.dict())
+    assert response.status_code == 200
+    sample_seed = int(response.headers["X-Sample-Seed"])
+    first_page = response.json()
+
+    # the next pages come from the same sample
+    if first_page:
+        preview_query.cursor = response.headers["X-Next-Cursor"]
+        response = client.post("/preview", json=preview_query.dict())
+        assert response.status_code == 200
+        assert response.headers["X-Sample-Seed"] == str(sample_seed)
+
+    # as well as the pages asked with the same seed
+    preview_query.cursor = None
+    preview_query.sample_seed = sample_seed
+    response = client.post("/preview", json=preview_query.dict())
+    assert response.json() == first_page
+
+
+@pytest.mark.usefixtures(
+    "is_mysql_ready",
+    "is_postgresql_ready",
+)
+@pytest.mark.parametrize(
+    "sql_dialect",
+    (
+        SQLDialect.MYSQL,
+        SQLDialect.POSTGRESQL,
+    ),
+)
+def test_total_count(sql_dialect: SQLDialect, request: pytest.FixtureRequest) -> None:
+    sql_connection_config = request.getfixturevalue(f"{sql_dialect}_connection_config")
+    sql_query_definition = SQLQueryDefinition(
+        connection={
+            "dialect": sql_dialect.value,
+            "config": sql_connection_config,
+        },
+        pipeline={
+            "steps": [
+                {"name": "domain", "domain": "labels"},
+                {"name": "top", "rank_on": "Value", "sort": "desc", "limit": 4},
+            ],
+        },
+    )
+    preview_query = PreviewQuery(
+        query_def=sql_query_definition,
+        tables=ALL_TEST_TABLES,
+        limit=2,
+        total_count="exact",
+    )
+    response = client.post("/preview", json=preview_query.dict())
+    assert response.status_code == 200
+    assert len(response.json()) == 2
+    assert response.headers["X-Total-Count"] == "4"
+    assert response.headers["X-Total-Count-Estimated"] == "false"
+
+
+@pytest.mark.usefixtures("is_postgresql_ready")
+def test_timeout(postgresql_connection_config: Any) -> None:
+    sql_query_definition = SQLQueryDefinition(
+        connection={
+            "dialect": SQLDialect.POSTGRESQL.value,
+            "config": postgresql_connection_config,
+        },
+        pipeline={
+            "steps": [
+                {"name": "domain", "domain": "users"},
+                {
+                    "name": "customsql",
+                    "query": "SELECT username, pg_sleep(1) FROM ##PREVIOUS_STEP##",
+                },
+            ],
+        },
+    )
+    preview_query = PreviewQuery(
+        query_def=sql_query_definition,
+        tables=ALL_TEST_TABLES,
+        timeout=0.5,
+    )
+    response = client.post("/preview", json=preview_query.dict())
+    assert response.status_code == 504
+
+
+@pytest.mark.usefixtures("is_postgresql_ready")
+def test_arrow_format(postgresql_connection_config: Any) -> None:
+    pa = pytest.importorskip("pyarrow")
+
+    sql_query_definition = SQLQueryDefinition(
+        connection={
+            "dialect": SQLDialect.POSTGRESQL.value,
+            "config": postgresql_connection_config,
+        },
+        pipeline={
+            "steps": [
+                {"name": "domain", "domain": "users"},
+                {"name": "sort", "columns": [{"column": "age", "order": "asc"}]},
+            ],
+        },
+    )
+    preview_query = PreviewQuery(
+        query_def=sql_query_definition,
+        tables=ALL_TEST_TABLES,
+    )
+    response = client.post(
+        "/preview",
+        json=preview_query.dict(),
+        headers={"Accept": "application/vnd.apache.arrow.stream"},
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/vnd.apache.arrow.stream"
+    table = pa.ipc.open_stream(response.content).read_all()
+    assert table.schema.field("username").type == pa.dictionary(pa.int32(), pa.string())
+    assert pa.types.is_integer(table.schema.field("age").type)
+    assert table.column("age").to_pylist() == [7, 7, 30, 31]
+
+
+@pytest.mark.usefixtures(
+    "is_mysql_ready",
+    "is_postgresql_ready",
+)
+@pytest.mark.parametrize(
+    "sql_dialect,expected_types",
+    (
+        (SQLDialect.MYSQL, ["var_string", "long"]),
+        (SQLDialect.POSTGRESQL, ["text", "int4"]),
+    ),
+)
+def test_columnar_format(
+    sql_dialect: SQLDialect, expected_types: list[str], request: pytest.FixtureRequest
+) -> None:
+    sql_connection_config = request.getfixturevalue(f"{sql_dialect}_connection_config")
+    sql_query_definition = SQLQueryDefinition(
+        connection={
+            "dialect": sql_dialect.value,
+            "config": sql_connection_config,
+        },
+        pipeline={
+            "steps": [
+                {"name": "domain", "domain": "users"},
+                {"name": "select", "columns": ["username", "age"]},
+                {
+                    "name": "sort",
+                    "columns": [
+                        {"column": "age", "order": "desc"},
+                        {"column": "username", "order": "desc"},
+                    ],
+                },
+            ],
+        },
+    )
+    preview_query = PreviewQuery(
+        query_def=sql_query_definition,
+        tables=ALL_TEST_TABLES,
+        format="columnar",
+    )
+    response = client.post("/preview", json=preview_query.dict())
+    assert response.status_code == 200
+    assert response.json() == {
+        "columns": ["username", "age"],
+        "types": expected_types,
+        "data": [["Chiara", "Eric", "Pikachu", "Bulbi"], [31, 30, 7, 7]],
+    }
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("is_postgresql_ready")
+async def test_numeric_as_float(postgresql_connection_config: Any) -> None:
+    sql_query = "SELECT 1.5::NUMERIC AS value"
+    [record] = await PostgreSQLExecutor(postgresql_connection_config).execute(sql_query)
+    assert record["value"] == Decimal("1.5")
+
+    config = postgresql_connection_config.copy(update={"numeric_as_float": True})
+    [record] = await PostgreSQLExecutor(config).execute(sql_query)
+    assert type(record["value"]) is float
+    assert record["value"] == 1.5
+
+
+@pytest.mark.usefixtures(
+    "is_mysql_ready",
+    "is_postgresql_ready",
+)
+@pytest.mark.parametrize(
+    "sql_dialect",
+    (
+        SQLDialect.MYSQL,
+        SQLDialect.POSTGRESQL,
+    ),
+)
+def test_export(sql_dialect: SQLDialect, request: pytest.FixtureRequest) -> None:
+    sql_connection_config = request.getfixturevalue(f"{sql_dialect}_connection_config")
+    sql_query_definition = SQLQueryDefinition(
+        connection={
+            "dialect": sql_dialect.value,
+            "config": sql_connection_config,
+        },
+        pipeline={
+            "steps": [
+                {"name": "domain", "domain": "users"},
+                {"name": "sort", "columns": [{"column": "age", "order": "desc"}]},
+                {"name": "top", "rank_on": "age", "sort": "desc", "limit": 2},
+                {"name": "select", "columns": ["username", "age"]},
+            ],
+        },
+    )
+    export_query = ExportQuery(query_def=sql_query_definition, tables=ALL_TEST_TABLES)
+    response = client.post("/export", json=export_query.dict())
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert response.text.splitlines() == ["username,age", "Chiara,31", "Eric,30"]
+
+    export_query.format = "ndjson"
+    response = client.post("/export", json=export_query.dict())
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert [json.loads(line) for line in response.text.splitlines()] == [
+        {"username": "Chiara", "age": 31},
+        {"username": "Eric", "age": 30},
+    ]
+
+
+@pytest.mark.usefixtures("is_postgresql_ready")
+def test_export_timeout(postgresql_connection_config: Any) -> None:
+    sql_query_definition = SQLQueryDefinition(
+        connection={
+            "dialect": SQLDialect.POSTGRESQL.value,
+            "config": postgresql_connection_config,
+        },
+        pipeline={
+            "steps": [
+                {"name": "domain", "domain": "users"},
+                {
+                    "name": "customsql",
+                    "query": "SELECT username, pg_sleep(1) FROM ##PREVIOUS_STEP##",
+                },
+            ],
+        },
+    )
+    for export_format in ("csv", "ndjson"):
+        export_query = ExportQuery(
+            query_def=sql_query_definition,
+            tables=ALL_TEST_TABLES,
+            timeout=0.5,
+            format=export_format,
+        )
+        response = client.post("/export", json=export_query.dict())
+        # the error comes before the response is started
+        assert response.status_code == 504
+
+
+@pytest.mark.usefixtures("is_postgresql_ready")
+def test_export_parquet(postgresql_connection_config: Any) -> None:
+    pq = pytest.importorskip("pyarrow.parquet")
+
+    sql_query_definition = SQLQueryDefinition(
+        connection={
+            "dialect": SQLDialect.POSTGRESQL.value,
+            "config": postgresql_connection_config,
+        },
+        pipeline={
+            "steps": [
+                {"name": "domain", "domain": "users"},
+                {"name": "sort", "columns": [{"column": "username", "order": "asc"}]},
+            ],
+        },
+    )
+    export_query = ExportQuery(
+        query_def=sql_query_definition,
+        tables=ALL_TEST_TABLES,
+        format="parquet",
+        row_group_size=2,
+    )
+    response = client.post("/export", json=export_query.dict())
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/vnd.apache.parquet"
+
+    parquet_file = pq.ParquetFile(io.BytesIO(response.content))
+    assert parquet_file.metadata.num_row_groups == 2
+    assert parquet_file.schema_arrow.field("age").type == "int32"
+    assert parquet_file.read().column("username").to_pylist() == [
+        "Bulbi",
+        "Chiara",
+        "Eric",
+        "Pikachu",
+    ]
+
+
+@pytest.mark.usefixtures(
+    "is_mysql_ready",
+    "is_postgresql_ready",
+)
+@pytest.mark.parametrize(
+    "sql_dialect",
+    (
+        SQLDialect.MYSQL,
+        SQLDialect.POSTGRESQL,
+    ),
+)
+def test_partitioned_export(sql_dialect: SQLDialect, request: pytest.FixtureRequest) -> None:
+    sql_connection_config = request.getfixturevalue(f"{sql_dialect}_connection_config")
+    sql_query_definition = SQLQueryDefinition(
+        connection={
+            "dialect": sql_dialect.value,
+            "config": sql_connection_config,
+        },
+        pipeline={
+            "steps": [
+                {"name": "domain", "domain": "users"},
+                {"name": "select", "columns": ["username", "age"]},
+            ],
+        },
+    )
+    export_query = ExportQuery(
+        query_def=sql_query_definition,
+        tables=ALL_TEST_TABLES,
+        format="ndjson",
+        partition_column="age",
+        partitions=2,
+        ordered=True,
+    )
+    response = client.post("/export", json=export_query.dict())
+    assert response.status_code == 200
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    # the ages from 7 to 31 are split in [7, 19) and [19, 31]
+    assert sorted(row["age"] for row in rows[:2]) == [7, 7]
+    assert sorted(row["age"] for row in rows[2:]) == [30, 31]
+
+    # sorting the whole result can't be done partition by partition
+    export_query.query_def.pipeline.steps.append(
+        SortStep(columns=[{"column": "age", "order": "asc"}])
+    )
+    response = client.post("/export", json=export_query.dict())
+    assert response.status_code == 400
+
+
+@pytest.mark.usefixtures("is_postgresql_ready")
+def test_incremental_refresh(postgresql_connection_config: Any) -> None:
+    executor = PostgreSQLExecutor(postgresql_connection_config)
+
+    def execute(sql_query: str) -> None:
+        asyncio.run(executor.execute(sql_query))
+
+    execute("DROP TABLE IF EXISTS events")
+    execute("CREATE TABLE events (id INTEGER, created_at TIMESTAMP)")
+    execute("INSERT INTO events VALUES (1, '2022-01-01'), (2, '2022-01-02'), (3, NULL)")
+    try:
+        sql_query_definition = SQLQueryDefinition(
+            connection={
+                "dialect": SQLDialect.POSTGRESQL.value,
+                "config": postgresql_connection_config,
+            },
+            pipeline={
+                "steps": [
+                    {"name": "domain", "domain": "events"},
+                    {"name": "select", "columns": ["id"]},
+                ],
+            },
+        )
+        preview_query = PreviewQuery(
+            query_def=sql_query_definition,
+            tables=["events"],
+            watermark_columns={"events": "created_at"},
+        )
+
+        response = client.post("/preview", json=preview_query.dict())
+        assert response.headers["X-Refresh"] == "full"
+        # the rows without watermark are kept
+        assert response.json() == [{"id": 1}, {"id": 2}, {"id": 3}]
+
+        response = client.post("/preview", json=preview_query.dict())
+        assert response.headers["X-Refresh"] == "none"
+
+        execute("INSERT INTO events VALUES (4, '2022-01-03')")
+        response = client.post("/preview", json=preview_query.dict())
+        assert response.headers["X-Refresh"] == "incremental"
+        assert response.json() == [{"id": 1}, {"id": 2}, {"id": 3}, {"id": 4}]
+
+        # rows added with the same watermark are found by their number
+        execute("INSERT INTO events VALUES (5, '2022-01-03')")
+        response = client.post("/preview", json=preview_query.dict())
+        assert response.headers["X-Refresh"] == "full"
+        assert len(response.json()) == 5
+
+        # and so are the ones added with a lower watermark than the new rows
+        execute("INSERT INTO events VALUES (6, '2022-01-03'), (7, '2022-01-04')")
+        response = client.post("/preview", json=preview_query.dict())
+        assert response.headers["X-Refresh"] == "full"
+        assert sorted(row["id"] for row in response.json()) == [1, 2, 3, 4, 5, 6, 7]
+    finally:
+        execute("DROP TABLE events")
+
+
+@pytest.mark.usefixtures("is_postgresql_ready")
+def test_evolution_from_zero(postgresql_connection_config: Any) -> None:
+    executor = PostgreSQLExecutor(postgresql_connection_config)
+
+    def execute(sql_query: str) -> None:
+        asyncio.run(executor.execute(sql_query))
+
+    execute("DROP TABLE IF EXISTS sales")
+    execute("CREATE TABLE sales (month DATE, amount INTEGER)")
+    execute("INSERT INTO sales VALUES ('2022-01-01', 0), ('2022-02-01', 5), ('2022-03-01', 10)")
+    try:
+        sql_query_definition = SQLQueryDefinition(
+            connection={
+                "dialect": SQLDialect.POSTGRESQL.value,
+                "config": postgresql_connection_config,
+            },
+            pipeline={
+                "steps": [
+                    {"name": "domain", "domain": "sales"},
+                    {
+                        "name": "evolution",
+                        "dateCol": "month",
+                        "valueCol": "amount",
+                        "evolutionType": "vsLastMonth",
+                        "evolutionFormat": "pct",
+                        "newColumn": "evol",
+                    },
+                    {"name": "sort", "columns": [{"column": "month", "order": "asc"}]},
+                ],
+            },
+        )
+        preview_query = PreviewQuery(query_def=sql_query_definition, tables=["sales"])
+        response = client.post("/preview", json=preview_query.dict())
+        assert response.status_code == 200
+        assert [row["evol"] for row in response.json()] == [None, None, 1.0]
+
+        # a month with several rows doesn't duplicate the rows of the next one
+        execute("INSERT INTO sales VALUES ('2022-02-01', 7)")
+        response = client.post("/preview", json=preview_query.dict())
+        assert [row["evol"] for row in response.json()] == [None, None, None, None]
+    finally:
+        execute("DROP TABLE sales")
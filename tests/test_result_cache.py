@@ -0,0 +1,71 @@
+import time
+
+from weaverbird.pipeline import PipelineWithVariables
+
+from sql_data_service.connectors.base import ColumnDescription, ResultSet
+from sql_data_service.result_cache import CachedResult, ResultCache, can_refresh_incrementally
+
+RESULT = ResultSet.from_rows([ColumnDescription(name="id")], [(1,)])
+LARGE_RESULT = ResultSet.from_rows([ColumnDescription(name="id")], [(i,) for i in range(3)])
+
+
+def test_result_cache_drops_least_recently_used() -> None:
+    cache = ResultCache(max_size=2)
+    cache.set("a", CachedResult(result=RESULT, watermark=1, watermark_count=1))
+    cache.set("b", CachedResult(result=RESULT, watermark=2, watermark_count=2))
+    assert cache.get("a") is not None
+    cache.set("c", CachedResult(result=RESULT, watermark=3, watermark_count=3))
+    assert cache.get("b") is None
+    assert [cache.get(key).watermark for key in "ac"] == [1, 3]  # type: ignore[union-attr]
+
+
+def test_result_cache_max_rows() -> None:
+    cache = ResultCache(max_rows=4)
+    cache.set("a", CachedResult(result=LARGE_RESULT, watermark=1, watermark_count=1))
+    cache.set("b", CachedResult(result=RESULT, watermark=2, watermark_count=2))
+    # 5 rows in total
+    cache.set("c", CachedResult(result=RESULT, watermark=3, watermark_count=3))
+    assert [cache.get(key) is not None for key in "abc"] == [False, True, True]
+
+    # too large to be cached
+    cache.set(
+        "d",
+        CachedResult(
+            result=LARGE_RESULT.concat(RESULT).concat(RESULT), watermark=4, watermark_count=4
+        ),
+    )
+    assert cache.get("d") is None
+    assert cache.get("c") is not None
+
+
+def test_result_cache_max_age() -> None:
+    cache = ResultCache(max_age=10)
+    cache.set(
+        "a",
+        CachedResult(
+            result=RESULT, watermark=1, watermark_count=1, computed_at=time.monotonic() - 11
+        ),
+    )
+    cache.set("b", CachedResult(result=RESULT, watermark=2, watermark_count=2))
+    assert cache.get("a") is None
+    assert cache.get("b") is not None
+
+
+def test_can_refresh_incrementally() -> None:
+    domain = {"name": "domain", "domain": "events"}
+    row_wise_pipeline = PipelineWithVariables(
+        steps=[domain, {"name": "select", "columns": ["id", "created_at"]}]
+    )
+    assert can_refresh_incrementally(row_wise_pipeline)
+
+    aggregated_pipeline = PipelineWithVariables(
+        steps=[
+            domain,
+            {
+                "name": "aggregate",
+                "on": [],
+                "aggregations": [{"newcolumns": ["n"], "aggfunction": "count", "columns": ["id"]}],
+            },
+        ]
+    )
+    assert not can_refresh_incrementally(aggregated_pipeline)
@@ -0,0 +1,67 @@
+from datetime import date, datetime, timezone
+
+import numpy as np
+
+from sql_data_service.connectors.base import ColumnDescription, ResultSet
+
+COLUMNS = [ColumnDescription(name="username", type="text"), ColumnDescription(name="age")]
+
+
+def test_result_set_from_rows() -> None:
+    result = ResultSet.from_rows(COLUMNS, [("Eric", 30), ("Chiara", 31)])
+    assert result.column_names == ["username", "age"]
+    assert result.to_columns() == [["Eric", "Chiara"], [30, 31]]
+    assert len(result) == 2
+    assert result.to_records() == [
+        {"username": "Eric", "age": 30},
+        {"username": "Chiara", "age": 31},
+    ]
+
+
+def test_result_set_without_rows() -> None:
+    result = ResultSet.from_rows(COLUMNS, [])
+    assert result.data == [[], []]
+    assert len(result) == 0
+    assert result.to_records() == []
+
+
+def test_result_set_compact_columns() -> None:
+    columns = [
+        ColumnDescription(name=name)
+        for name in ["id", "score", "active", "birthdate", "updated_at", "name", "age", "big"]
+    ]
+    rows = [
+        (1, 1.5, True, date(1990, 5, 9), datetime(2022, 1, 1, 12), "Eric", 30, 2**70),
+        (2, 2.5, False, date(1991, 5, 9), datetime(2022, 1, 2, 12), "Chiara", None, 1),
+    ]
+    result = ResultSet.from_rows(columns, rows)
+    assert [isinstance(values, np.ndarray) for values in result.data] == [
+        *[True] * 5,
+        *[False] * 3,
+    ]
+    assert np.asarray(result.data[3]).dtype == np.dtype("datetime64[D]")
+    # values are converted back to Python objects
+    assert result.to_columns() == [list(values) for values in zip(*rows)]
+    assert result.to_records()[0] == dict(zip([c.name for c in columns], rows[0]))
+    last_row = result.get_row(-1)
+    assert last_row == dict(zip([c.name for c in columns], rows[1]))
+    assert type(last_row["id"]) is int
+    assert type(last_row["updated_at"]) is datetime
+
+
+def test_result_set_keeps_aware_datetimes() -> None:
+    values = [datetime(2022, 1, 1, tzinfo=timezone.utc)]
+    result = ResultSet.from_rows([ColumnDescription(name="updated_at")], [tuple(values)])
+    assert result.data == [values]
+
+
+def test_result_set_concat() -> None:
+    result = ResultSet.from_rows(COLUMNS, [("Eric", 30)])
+    other = ResultSet.from_rows(COLUMNS, [("Chiara", 31), ("Pikachu", None)])
+    concatenated = result.concat(other)
+    assert concatenated.to_columns() == [["Eric", "Chiara", "Pikachu"], [30, 31, None]]
+    # arrays of the same type are concatenated as they are
+    ages = result.concat(ResultSet.from_rows(COLUMNS, [("Chiara", 31)])).data[1]
+    assert isinstance(ages, np.ndarray)
+    assert ages.tolist() == [30, 31]
+    assert ResultSet.from_rows(COLUMNS, []).concat(result).to_records() == result.to_records()
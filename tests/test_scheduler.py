@@ -0,0 +1,176 @@
+import asyncio
+
+import pytest
+
+from sql_data_service.connectors.scheduler import (
+    QueryLimits,
+    QueryPriority,
+    QueryQueueFullError,
+    QueryQueueTimeoutError,
+    QueryScheduler,
+)
+
+LIMITS = QueryLimits(max_concurrency=2, max_queued=1, queue_timeout=0.2)
+
+
+@pytest.mark.asyncio
+async def test_scheduler_queues_then_rejects() -> None:
+    scheduler = QueryScheduler(LIMITS)
+    release = asyncio.Event()
+    started: list[int] = []
+
+    async def run_query(i: int) -> None:
+        async with scheduler.slot("db"):
+            started.append(i)
+            await release.wait()
+
+    running = [asyncio.create_task(run_query(i)) for i in range(3)]
+    await asyncio.sleep(0.01)
+    # 2 queries are running and the third one is waiting
+    assert started == [0, 1]
+    assert scheduler.get_metrics()["db"]["queued"] == 1
+
+    with pytest.raises(QueryQueueFullError) as exc_info:
+        await run_query(3)
+    assert exc_info.value.retry_after >= 1
+
+    release.set()
+    await asyncio.gather(*running)
+    assert started == [0, 1, 2]
+    metrics = scheduler.get_metrics()["db"]
+    assert metrics["running"] == 0
+    assert metrics["admitted"] == 3
+    assert metrics["rejected"] == 1
+
+
+@pytest.mark.asyncio
+async def test_scheduler_queue_timeout() -> None:
+    scheduler = QueryScheduler(LIMITS)
+    release = asyncio.Event()
+
+    async def run_query() -> None:
+        async with scheduler.slot("db"):
+            await release.wait()
+
+    running = [asyncio.create_task(run_query()) for _ in range(2)]
+    await asyncio.sleep(0.01)
+
+    with pytest.raises(QueryQueueTimeoutError):
+        await run_query()
+
+    release.set()
+    await asyncio.gather(*running)
+    metrics = scheduler.get_metrics()["db"]
+    assert metrics["running"] == 0
+    assert metrics["timed_out"] == 1
+
+
+@pytest.mark.asyncio
+async def test_scheduler_cancelled_waiter() -> None:
+    scheduler = QueryScheduler(LIMITS)
+    release = asyncio.Event()
+
+    async def run_query() -> None:
+        async with scheduler.slot("db"):
+            await release.wait()
+
+    running = [asyncio.create_task(run_query()) for _ in range(2)]
+    waiting = asyncio.create_task(run_query())
+    await asyncio.sleep(0.01)
+    waiting.cancel()
+    await asyncio.sleep(0.01)
+
+    release.set()
+    await asyncio.gather(*running)
+    assert scheduler.get_metrics()["db"]["running"] == 0
+    assert scheduler.get_metrics()["db"]["queued"] == 0
+
+
+@pytest.mark.asyncio
+async def test_scheduler_priorities() -> None:
+    scheduler = QueryScheduler(LIMITS)
+    # the limits of a database replace the default ones
+    scheduler.set_limits(
+        "db",
+        QueryLimits(
+            max_concurrency=4,
+            max_queued=10,
+            queue_timeout=1,
+            reserved_shares={QueryPriority.INTERACTIVE: 0.5},
+            weights={QueryPriority.INTERACTIVE: 2, QueryPriority.BULK: 1},
+        ),
+    )
+    release = {priority: asyncio.Event() for priority in QueryPriority}
+    started: list[str] = []
+
+    async def run_query(name: str, priority: QueryPriority) -> None:
+        async with scheduler.slot("db", priority):
+            started.append(name)
+            await release[priority].wait()
+
+    bulk = [asyncio.create_task(run_query(f"b{i}", QueryPriority.BULK)) for i in range(3)]
+    await asyncio.sleep(0.01)
+    # half of the slots are kept for interactive queries
+    assert started == ["b0", "b1"]
+
+    interactive = [
+        asyncio.create_task(run_query(f"i{i}", QueryPriority.INTERACTIVE)) for i in range(3)
+    ]
+    await asyncio.sleep(0.01)
+    assert started == ["b0", "b1", "i0", "i1"]
+    metrics = scheduler.get_metrics()["db"]
+    assert metrics["bulk_queued"] == 1
+    assert metrics["interactive_queued"] == 1
+
+    # the slots of the bulk queries go to the interactive query first
+    release[QueryPriority.BULK].set()
+    await asyncio.gather(*bulk)
+    assert started == ["b0", "b1", "i0", "i1", "i2", "b2"]
+
+    release[QueryPriority.INTERACTIVE].set()
+    await asyncio.gather(*interactive)
+    assert scheduler.get_metrics()["db"]["running"] == 0
+
+
+@pytest.mark.asyncio
+async def test_scheduler_weights_after_idle_priority() -> None:
+    scheduler = QueryScheduler(
+        QueryLimits(
+            max_concurrency=1,
+            max_queued=50,
+            queue_timeout=1,
+            reserved_shares={},
+            weights={QueryPriority.INTERACTIVE: 4, QueryPriority.BULK: 1},
+        )
+    )
+    started: list[str] = []
+
+    async def hold(release: asyncio.Event) -> None:
+        async with scheduler.slot("db"):
+            await release.wait()
+
+    async def run_query(name: str, priority: QueryPriority) -> None:
+        async with scheduler.slot("db", priority):
+            started.append(name)
+
+    async def run_queued(queries: list[tuple[str, QueryPriority]]) -> None:
+        release = asyncio.Event()
+        holder = asyncio.create_task(hold(release))
+        await asyncio.sleep(0.01)
+        tasks = []
+        for name, priority in queries:
+            tasks.append(asyncio.create_task(run_query(name, priority)))
+            await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(holder, *tasks)
+
+    # many slots are handed over to interactive queries while no bulk query is waiting
+    await run_queued([(f"warmup{i}", QueryPriority.INTERACTIVE) for i in range(20)])
+    started.clear()
+
+    # these past slots don't give all the next ones to the bulk queries
+    await run_queued(
+        [(f"b{i}", QueryPriority.BULK) for i in range(2)]
+        + [(f"i{i}", QueryPriority.INTERACTIVE) for i in range(4)]
+    )
+    assert started == ["i0", "b0", "i1", "i2", "i3", "b1"]
@@ -0,0 +1,72 @@
+import asyncio
+from typing import Any, AsyncGenerator, Awaitable, Callable, cast
+
+import pytest
+
+from sql_data_service.connectors import postgresql
+from sql_data_service.connectors.base import QueryTimeoutError
+from sql_data_service.connectors.postgresql import COPY_BUFFER_SIZE, PostgreSQLExecutor
+from sql_data_service.connectors.scheduler import QUERY_SCHEDULER
+from sql_data_service.models import PostgreSQLConnectionConfig
+
+
+class FakeConnection:
+    """Sends many chunks to the output of a COPY, or fails after the first one"""
+
+    def __init__(self, *, error: Exception | None = None) -> None:
+        self.error = error
+        self.closed = False
+
+    async def copy_from_query(
+        self, query: str, *args: Any, output: Callable[[bytes], Awaitable[None]], **kwargs: Any
+    ) -> None:
+        for i in range(COPY_BUFFER_SIZE * 10):
+            await output(f"{i}\n".encode())
+            if self.error is not None:
+                raise self.error
+
+    async def close(self) -> None:
+        self.closed = True
+
+
+@pytest.fixture
+def executor(postgresql_connection_config: PostgreSQLConnectionConfig) -> PostgreSQLExecutor:
+    return PostgreSQLExecutor(postgresql_connection_config)
+
+
+def patch_connection(monkeypatch: pytest.MonkeyPatch, conn: FakeConnection) -> None:
+    async def get_connection(*args: Any, **kwargs: Any) -> FakeConnection:
+        return conn
+
+    monkeypatch.setattr(postgresql, "get_connection", get_connection)
+
+
+@pytest.mark.asyncio
+async def test_stream_csv_closed_with_full_buffer(
+    monkeypatch: pytest.MonkeyPatch, executor: PostgreSQLExecutor
+) -> None:
+    conn = FakeConnection()
+    patch_connection(monkeypatch, conn)
+
+    chunks = cast(AsyncGenerator[bytes, None], executor.stream_csv("SELECT 1"))
+    assert await chunks.__anext__() == b"0\n"
+    # the COPY fills the buffer and waits for the client
+    await asyncio.sleep(0.01)
+    await asyncio.wait_for(chunks.aclose(), timeout=1)
+    assert conn.closed
+    # the slot has been released
+    backend_key = executor._get_backend_key()
+    assert QUERY_SCHEDULER.get_metrics()[str(backend_key)]["running"] == 0
+
+
+@pytest.mark.asyncio
+async def test_stream_csv_error(
+    monkeypatch: pytest.MonkeyPatch, executor: PostgreSQLExecutor
+) -> None:
+    conn = FakeConnection(error=QueryTimeoutError("canceling statement due to statement timeout"))
+    patch_connection(monkeypatch, conn)
+
+    with pytest.raises(QueryTimeoutError):
+        async for _ in executor.stream_csv("SELECT 1"):
+            pass
+    assert conn.closed
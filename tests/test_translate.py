@@ -1,7 +1,13 @@
+from typing import Any
+
+import pytest
 from fastapi.testclient import TestClient
+from weaverbird.pipeline import PipelineWithVariables
 
 from sql_data_service.app import TranslationQuery, app
 from sql_data_service.dialects import SQLDialect
+from sql_data_service.translate import translate_pipeline, translate_pipeline_with_parameters
+from sql_data_service.translators import ALL_TRANSLATORS
 
 client = TestClient(app)
 
@@ -38,3 +44,870 @@ def test_translate() -> None:
         '__step_1__ AS (SELECT "username","age","city" FROM "__step_0__" ORDER BY "age" ASC,"username" DESC) '
         'SELECT * FROM "__step_1__"'
     )
+
+
+@pytest.mark.parametrize(
+    "sql_dialect,pipeline_steps,expected_query",
+    [
+        (
+            SQLDialect.POSTGRESQL,
+            [
+                {"name": "domain", "domain": "labels"},
+                {
+                    "name": "cumsum",
+                    "toCumSum": [["Value", None]],
+                    "referenceColumn": "Label",
+                    "groupby": ["Cartel"],
+                },
+            ],
+            (
+                'WITH __step_0__ AS (SELECT "Label","Cartel","Value" FROM "labels") ,'
+                '__step_1__ AS (SELECT "Label","Cartel","Value",SUM("Value") OVER(PARTITION BY "Cartel" ORDER BY "Label" '
+                'ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW) "Value_CUMSUM" FROM "__step_0__" ORDER BY "Label" ASC) '
+                'SELECT * FROM "__step_1__"'
+            ),
+        ),
+        (
+            SQLDialect.POSTGRESQL,
+            [
+                {"name": "domain", "domain": "labels"},
+                {
+                    "name": "rank",
+                    "valueCol": "Value",
+                    "order": "desc",
+                    "method": "dense",
+                    "groupby": ["Cartel"],
+                    "newColumnName": "rank",
+                },
+            ],
+            (
+                'WITH __step_0__ AS (SELECT "Label","Cartel","Value" FROM "labels") ,'
+                '__step_1__ AS (SELECT "Label","Cartel","Value",DENSE_RANK() OVER(PARTITION BY "Cartel" ORDER BY "Value" DESC) "rank" '
+                'FROM "__step_0__" ORDER BY "rank" ASC) '
+                'SELECT * FROM "__step_1__"'
+            ),
+        ),
+        (
+            SQLDialect.SNOWFLAKE,
+            [
+                {"name": "domain", "domain": "labels"},
+                {
+                    "name": "movingaverage",
+                    "valueColumn": "Value",
+                    "columnToSort": "Label",
+                    "movingWindow": 3,
+                    "groups": ["Cartel"],
+                },
+            ],
+            (
+                "WITH __step_0__ AS (SELECT Label,Cartel,Value FROM labels) ,"
+                "__step_1__ AS (SELECT Label,Cartel,Value,CASE WHEN COUNT(Value) OVER(PARTITION BY Cartel ORDER BY Label "
+                "ROWS BETWEEN 2 PRECEDING AND CURRENT ROW)=3 THEN AVG(Value) OVER(PARTITION BY Cartel ORDER BY Label "
+                'ROWS BETWEEN 2 PRECEDING AND CURRENT ROW) END "Value_MOVING_AVG" FROM __step_0__ ORDER BY Cartel ASC,Label ASC) '
+                "SELECT * FROM __step_1__"
+            ),
+        ),
+        (
+            SQLDialect.POSTGRESQL,
+            [
+                {"name": "domain", "domain": "logins"},
+                {
+                    "name": "evolution",
+                    "dateCol": "login",
+                    "valueCol": "type",
+                    "evolutionType": "vsLastYear",
+                    "evolutionFormat": "abs",
+                    "indexColumns": ["username"],
+                    "newColumn": "evol",
+                },
+            ],
+            (
+                'WITH __step_0__ AS (SELECT "username","login","type" FROM "logins") ,'
+                '__step_1__ AS (SELECT "__step_0__"."username","__step_0__"."login","__step_0__"."type",'
+                'CASE WHEN "__step_0___prev"."__count__"=1 '
+                'THEN "__step_0__"."type"-"__step_0___prev"."type" END "evol" FROM "__step_0__" '
+                'LEFT JOIN (SELECT "login","username",MIN("type") "type",COUNT(*) "__count__" '
+                'FROM "__step_0__" GROUP BY "login","username") "__step_0___prev" '
+                'ON "__step_0___prev"."login"="__step_0__"."login"-INTERVAL \'1 YEAR\' '
+                'AND "__step_0___prev"."username"="__step_0__"."username") '
+                'SELECT * FROM "__step_1__"'
+            ),
+        ),
+        (
+            SQLDialect.GOOGLEBIGQUERY,
+            [
+                {"name": "domain", "domain": "logins"},
+                {
+                    "name": "evolution",
+                    "dateCol": "login",
+                    "valueCol": "type",
+                    "evolutionType": "vsLastMonth",
+                    "evolutionFormat": "pct",
+                },
+            ],
+            (
+                "WITH __step_0__ AS (SELECT `username`,`login`,`type` FROM `logins`) ,"
+                "__step_1__ AS (SELECT `__step_0__`.`username`,`__step_0__`.`login`,`__step_0__`.`type`,"
+                "CASE WHEN `__step_0___prev`.`__count__`=1 "
+                "THEN CAST(`__step_0__`.`type` AS DOUBLE PRECISION)/NULLIF(`__step_0___prev`.`type`,0)-1 "
+                "END `type_EVOL_PCT` FROM `__step_0__` "
+                "LEFT JOIN (SELECT `login`,MIN(`type`) `type`,COUNT(*) `__count__` "
+                "FROM `__step_0__` GROUP BY `login`) `__step_0___prev` "
+                "ON `__step_0___prev`.`login`=`__step_0__`.`login`-INTERVAL 1 MONTH) "
+                "SELECT * FROM `__step_1__`"
+            ),
+        ),
+    ],
+)
+def test_translate_window_functions(
+    sql_dialect: SQLDialect, pipeline_steps: list[dict[str, Any]], expected_query: str
+) -> None:
+    query = translate_pipeline(
+        sql_dialect=sql_dialect,
+        pipeline=PipelineWithVariables(steps=pipeline_steps),
+        tables_columns=ALL_TABLES_COLUMNS,
+    )
+    assert query == expected_query
+
+
+def test_translate_window_functions_not_supported() -> None:
+    with pytest.raises(NotImplementedError):
+        translate_pipeline(
+            sql_dialect=SQLDialect.MYSQL,
+            pipeline=PipelineWithVariables(
+                steps=[
+                    {"name": "domain", "domain": "labels"},
+                    {"name": "rank", "valueCol": "Value", "order": "asc", "method": "standard"},
+                ]
+            ),
+            tables_columns=ALL_TABLES_COLUMNS,
+        )
+
+
+@pytest.mark.parametrize(
+    "sql_dialect,expected_query",
+    [
+        (
+            SQLDialect.POSTGRESQL,
+            (
+                'WITH __step_0__ AS (SELECT "Label","Cartel","Value" FROM "labels") ,'
+                '__step_1__ AS (SELECT "Label",SUM(CASE WHEN "Cartel"=\'Cartel 1\' THEN "Value" END) "Cartel 1",'
+                'SUM(CASE WHEN "Cartel"=\'Cartel 2\' THEN "Value" END) "Cartel 2" '
+                'FROM "__step_0__" GROUP BY "Label" ORDER BY "Label" ASC) '
+                'SELECT * FROM "__step_1__"'
+            ),
+        ),
+        (
+            SQLDialect.SNOWFLAKE,
+            (
+                "WITH __step_0__ AS (SELECT Label,Cartel,Value FROM labels) ,"
+                "__step_1__ AS (SELECT * FROM (SELECT Label,Cartel,Value FROM __step_0__) "
+                "PIVOT(SUM(Value) FOR Cartel IN ('Cartel 1','Cartel 2')) "
+                '"__pivot__"("Label","Cartel 1","Cartel 2")) '
+                "SELECT * FROM __step_1__"
+            ),
+        ),
+        (
+            SQLDialect.GOOGLEBIGQUERY,
+            (
+                "WITH __step_0__ AS (SELECT `Label`,`Cartel`,`Value` FROM `labels`) ,"
+                "__step_1__ AS (SELECT * FROM (SELECT `Label`,`Cartel`,`Value` FROM `__step_0__`) "
+                "PIVOT(SUM(`Value`) FOR `Cartel` IN ('Cartel 1' AS `Cartel 1`,'Cartel 2' AS `Cartel 2`))) "
+                "SELECT * FROM `__step_1__`"
+            ),
+        ),
+    ],
+)
+def test_translate_pivot(sql_dialect: SQLDialect, expected_query: str) -> None:
+    query = translate_pipeline(
+        sql_dialect=sql_dialect,
+        pipeline=PipelineWithVariables(
+            steps=[
+                {"name": "domain", "domain": "labels"},
+                {
+                    "name": "pivot",
+                    "index": ["Label"],
+                    "column_to_pivot": "Cartel",
+                    "value_column": "Value",
+                    "agg_function": "sum",
+                },
+            ]
+        ),
+        tables_columns=ALL_TABLES_COLUMNS,
+        pivot_values={"Cartel": ["Cartel 1", "Cartel 2", None]},
+    )
+    assert query == expected_query
+
+
+def test_translate_pivot_unknown_values() -> None:
+    translation_query = TranslationQuery(
+        sql_dialect=SQLDialect.POSTGRESQL,
+        pipeline={
+            "steps": [
+                {"name": "domain", "domain": "labels"},
+                {
+                    "name": "pivot",
+                    "index": ["Label"],
+                    "column_to_pivot": "Cartel",
+                    "value_column": "Value",
+                    "agg_function": "sum",
+                },
+            ]
+        },
+        tables_columns=ALL_TABLES_COLUMNS,
+    )
+    response = client.post("/translate", json=translation_query.dict())
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Values of pivoted column 'Cartel' are not known"}
+
+
+@pytest.mark.parametrize(
+    "sql_dialect,expected_query",
+    [
+        (
+            SQLDialect.POSTGRESQL,
+            (
+                'WITH __step_0__ AS (SELECT "username","age","city" FROM "users") ,'
+                '__step_1__ AS (SELECT "__step_0__"."age","__unpivot__"."field","__unpivot__"."value" FROM "__step_0__" '
+                'CROSS JOIN LATERAL (VALUES (\'username\',"__step_0__"."username"),(\'city\',"__step_0__"."city")) '
+                '"__unpivot__"("field","value") WHERE "__unpivot__"."value" IS NOT NULL) '
+                'SELECT * FROM "__step_1__"'
+            ),
+        ),
+        (
+            SQLDialect.MYSQL,
+            (
+                "WITH __step_0__ AS (SELECT `username`,`age`,`city` FROM `users`) ,"
+                "__step_1__ AS (SELECT `sq0`.`age`,`sq0`.`field`,`sq0`.`value` FROM ("
+                "SELECT `__step_0__`.`age`,`__unpivot__`.`field`,CASE WHEN `__unpivot__`.`field`='username' "
+                "THEN `__step_0__`.`username` WHEN `__unpivot__`.`field`='city' THEN `__step_0__`.`city` END `value` "
+                "FROM `__step_0__` CROSS JOIN (SELECT 'username' `field` UNION ALL SELECT 'city' `field`) `__unpivot__`) `sq0` "
+                "WHERE `value` IS NOT NULL) "
+                "SELECT * FROM `__step_1__`"
+            ),
+        ),
+        (
+            SQLDialect.GOOGLEBIGQUERY,
+            (
+                "WITH __step_0__ AS (SELECT `username`,`age`,`city` FROM `users`) ,"
+                "__step_1__ AS (SELECT `age`,`field`,`value` FROM (SELECT `age`,`username`,`city` FROM `__step_0__`) "
+                "UNPIVOT(`value` FOR `field` IN (`username` AS 'username',`city` AS 'city'))) "
+                "SELECT * FROM `__step_1__`"
+            ),
+        ),
+    ],
+)
+def test_translate_unpivot(sql_dialect: SQLDialect, expected_query: str) -> None:
+    query = translate_pipeline(
+        sql_dialect=sql_dialect,
+        pipeline=PipelineWithVariables(
+            steps=[
+                {"name": "domain", "domain": "users"},
+                {
+                    "name": "unpivot",
+                    "keep": ["age"],
+                    "unpivot": ["username", "city"],
+                    "unpivot_column_name": "field",
+                    "value_column_name": "value",
+                    "dropna": True,
+                },
+            ]
+        ),
+        tables_columns=ALL_TABLES_COLUMNS,
+    )
+    assert query == expected_query
+
+
+def test_translate_replace_whole_values() -> None:
+    translation_query = TranslationQuery(
+        sql_dialect=SQLDialect.POSTGRESQL,
+        pipeline={
+            "steps": [
+                {"name": "domain", "domain": "users"},
+                {
+                    "name": "replace",
+                    "search_column": "username",
+                    "to_replace": [["Eric", "Michel"], ["Bulbi", "Cara"]],
+                },
+            ]
+        },
+        tables_columns=ALL_TABLES_COLUMNS,
+        replace_whole_values=True,
+    )
+    response = client.post("/translate", json=translation_query.dict())
+    assert response.status_code == 200
+    assert response.json() == (
+        'WITH __step_0__ AS (SELECT "username","age","city" FROM "users") ,'
+        '__step_1__ AS (SELECT "age","city",'
+        "CASE \"username\" WHEN 'Eric' THEN 'Michel' WHEN 'Bulbi' THEN 'Cara' ELSE \"username\" END \"username\" "
+        'FROM "__step_0__") '
+        'SELECT * FROM "__step_1__"'
+    )
+
+
+def test_translate_deeply_nested_ifthenelse() -> None:
+    from weaverbird.pipeline.steps import DomainStep, IfthenelseStep
+    from weaverbird.pipeline.steps.ifthenelse import IfThenElse
+
+    from sql_data_service.translators.postgresql import PostgreSQLTranslator
+
+    else_: Any = '"adult"'
+    for age in range(18, 0, -1):
+        else_ = IfThenElse(
+            **{
+                "if": {"column": "age", "operator": "eq", "value": age},
+                "then": '"child"',
+                "else": else_,
+            }
+        )
+    for _ in range(1500):
+        else_ = IfThenElse(
+            **{"if": {"column": "age", "operator": "isnull"}, "then": "NULL", "else": else_}
+        )
+    step = IfthenelseStep(
+        **{
+            "new_column": "category",
+            "if": {"column": "age", "operator": "eq", "value": 0},
+            "then": '"baby"',
+            "else": else_,
+        }
+    )
+
+    query = PostgreSQLTranslator(tables_columns=ALL_TABLES_COLUMNS).get_query_str(
+        steps=[DomainStep(domain="users"), step]
+    )
+    assert query.count("CASE ") == 1
+    assert query.count(" WHEN ") == 1 + 1500 + 18
+    assert query.endswith(
+        'WHEN "age"=18 THEN \'child\' ELSE \'adult\' END "category" FROM "__step_0__") '
+        'SELECT * FROM "__step_1__"'
+    )
+
+
+@pytest.mark.parametrize(
+    "condition,expected_where",
+    [
+        (
+            {
+                "or": [
+                    {"column": "city", "operator": "eq", "value": "Paris"},
+                    {
+                        "or": [
+                            {"column": "city", "operator": "eq", "value": "Firenze"},
+                            {"column": "city", "operator": "in", "value": ["Paris", "Lyon"]},
+                        ]
+                    },
+                    {"and": [{"column": "age", "operator": "gt", "value": 18}]},
+                    {"column": "age", "operator": "gt", "value": 18},
+                ]
+            },
+            """ WHERE "city" IN ('Paris','Firenze','Lyon') OR "age">18""",
+        ),
+        (
+            {
+                "and": [
+                    {"column": "city", "operator": "ne", "value": "Paris"},
+                    {"column": "city", "operator": "nin", "value": ["Lyon"]},
+                    {"column": "age", "operator": "in", "value": [7, 30, 31]},
+                    {"column": "age", "operator": "in", "value": [30, 31, 42]},
+                ]
+            },
+            """ WHERE "city" NOT IN ('Paris','Lyon') AND "age" IN (30,31)""",
+        ),
+        (
+            {
+                "and": [
+                    {"column": "city", "operator": "eq", "value": "Paris"},
+                    {"column": "city", "operator": "eq", "value": "Lyon"},
+                ]
+            },
+            " WHERE 1=0",
+        ),
+        (
+            {
+                "or": [
+                    {"column": "city", "operator": "isnull"},
+                    {"column": "city", "operator": "notnull"},
+                ]
+            },
+            "",
+        ),
+        (
+            # numbers are compared by value
+            {
+                "and": [
+                    {"column": "age", "operator": "in", "value": [30, 31]},
+                    {"column": "age", "operator": "in", "value": [30.0, 42.0]},
+                ]
+            },
+            """ WHERE "age"=30""",
+        ),
+        (
+            # the database may convert values of other types
+            {
+                "and": [
+                    {"column": "age", "operator": "eq", "value": 30},
+                    {"column": "age", "operator": "eq", "value": "30"},
+                ]
+            },
+            """ WHERE "age"=30 AND "age"='30'""",
+        ),
+    ],
+)
+def test_translate_normalized_filter(condition: dict[str, Any], expected_where: str) -> None:
+    query = translate_pipeline(
+        sql_dialect=SQLDialect.POSTGRESQL,
+        pipeline=PipelineWithVariables(
+            steps=[
+                {"name": "domain", "domain": "users"},
+                {"name": "filter", "condition": condition},
+            ]
+        ),
+        tables_columns=ALL_TABLES_COLUMNS,
+    )
+    assert query == (
+        'WITH __step_0__ AS (SELECT "username","age","city" FROM "users") ,'
+        f'__step_1__ AS (SELECT "username","age","city" FROM "__step_0__"{expected_where}) '
+        'SELECT * FROM "__step_1__"'
+    )
+
+
+@pytest.mark.parametrize(
+    "sql_dialect,operator,expected_where",
+    [
+        (
+            SQLDialect.POSTGRESQL,
+            "in",
+            """ WHERE "city"=ANY('{"Paris","Lyon","Fi\\"renze"}')""",
+        ),
+        (
+            SQLDialect.SNOWFLAKE,
+            "nin",
+            " WHERE city NOT IN (SELECT value FROM TABLE(FLATTEN("
+            """INPUT => PARSE_JSON('["Paris", "Lyon", "Fi\\\\"renze"]'))))""",
+        ),
+        (
+            SQLDialect.GOOGLEBIGQUERY,
+            "in",
+            """ WHERE `city` IN UNNEST(['Paris','Lyon','Fi"renze'])""",
+        ),
+        (
+            SQLDialect.REDSHIFT,
+            "nin",
+            """ WHERE "city" NOT IN ('Paris','Lyon','Fi"renze')""",
+        ),
+        (
+            SQLDialect.MYSQL,
+            "in",
+            # strings are compared with the collation of the column
+            """ WHERE `city` IN ('Paris','Lyon','Fi"renze')""",
+        ),
+    ],
+)
+def test_translate_large_in_list(
+    monkeypatch: pytest.MonkeyPatch, sql_dialect: SQLDialect, operator: str, expected_where: str
+) -> None:
+    monkeypatch.setattr(ALL_TRANSLATORS[sql_dialect], "LARGE_IN_LIST_SIZE", 2)
+    query = translate_pipeline(
+        sql_dialect=sql_dialect,
+        pipeline=PipelineWithVariables(
+            steps=[
+                {"name": "domain", "domain": "users"},
+                {
+                    "name": "filter",
+                    "condition": {
+                        "column": "city",
+                        "operator": operator,
+                        "value": ["Paris", "Lyon", 'Fi"renze'],
+                    },
+                },
+            ]
+        ),
+        tables_columns=ALL_TABLES_COLUMNS,
+    )
+    assert expected_where in query
+
+
+@pytest.mark.parametrize(
+    "server_version,bind_parameters,expected_where,expected_parameters",
+    [
+        (
+            "8.0.28",
+            False,
+            " WHERE `age` NOT IN (SELECT `v` FROM JSON_TABLE('[7, 30, 31]','$[*]' "
+            "COLUMNS(`v` BIGINT PATH '$')) `__values__`) AND `city`<>'100%'",
+            [],
+        ),
+        (
+            "8.0.28",
+            True,
+            " WHERE `age` NOT IN (SELECT `v` FROM JSON_TABLE(%s,'$[*]' "
+            "COLUMNS(`v` BIGINT PATH '$')) `__values__`) AND `city`<>'100%%'",
+            ["[7, 30, 31]"],
+        ),
+        ("5.7.38", True, " WHERE `age` NOT IN (7,30,31) AND `city`<>'100%'", []),
+        ("10.6.7-MariaDB", True, " WHERE `age` NOT IN (7,30,31) AND `city`<>'100%'", []),
+        (None, True, " WHERE `age` NOT IN (7,30,31) AND `city`<>'100%'", []),
+    ],
+)
+def test_translate_large_in_list_mysql(
+    monkeypatch: pytest.MonkeyPatch,
+    server_version: str | None,
+    bind_parameters: bool,
+    expected_where: str,
+    expected_parameters: list[Any],
+) -> None:
+    monkeypatch.setattr(ALL_TRANSLATORS[SQLDialect.MYSQL], "LARGE_IN_LIST_SIZE", 2)
+    query, parameters = translate_pipeline_with_parameters(
+        sql_dialect=SQLDialect.MYSQL,
+        pipeline=PipelineWithVariables(
+            steps=[
+                {"name": "domain", "domain": "users"},
+                {
+                    "name": "filter",
+                    "condition": {
+                        "and": [
+                            {"column": "age", "operator": "nin", "value": [7, 30, 31]},
+                            {"column": "city", "operator": "ne", "value": "100%"},
+                        ]
+                    },
+                },
+            ]
+        ),
+        tables_columns=ALL_TABLES_COLUMNS,
+        bind_parameters=bind_parameters,
+        server_version=server_version,
+    )
+    assert expected_where in query
+    assert parameters == expected_parameters
+
+
+@pytest.mark.parametrize(
+    "columns_types,expected_where,expected_parameters",
+    [
+        # the type of the literal array is inferred from the column, like for literal lists
+        (
+            None,
+            """ WHERE "login"<>ALL('{"2022-01-01","2022-01-02","2022-01-03"}')""",
+            [],
+        ),
+        (
+            {"login": "date"},
+            ' WHERE "login"<>ALL(CAST(CAST($1 AS TEXT[]) AS DATE[]))',
+            [["2022-01-01", "2022-01-02", "2022-01-03"]],
+        ),
+    ],
+)
+def test_translate_large_in_list_parameters(
+    monkeypatch: pytest.MonkeyPatch,
+    columns_types: dict[str, str] | None,
+    expected_where: str,
+    expected_parameters: list[Any],
+) -> None:
+    monkeypatch.setattr(ALL_TRANSLATORS[SQLDialect.POSTGRESQL], "LARGE_IN_LIST_SIZE", 2)
+    query, parameters = translate_pipeline_with_parameters(
+        sql_dialect=SQLDialect.POSTGRESQL,
+        pipeline=PipelineWithVariables(
+            steps=[
+                {"name": "domain", "domain": "logins"},
+                {
+                    "name": "filter",
+                    "condition": {
+                        "column": "login",
+                        "operator": "nin",
+                        "value": ["2022-01-01", "2022-01-02", "2022-01-03"],
+                    },
+                },
+            ]
+        ),
+        tables_columns=ALL_TABLES_COLUMNS,
+        columns_types=columns_types,
+    )
+    assert query == (
+        'WITH __step_0__ AS (SELECT "username","login","type" FROM "logins") ,'
+        f'__step_1__ AS (SELECT "username","login","type" FROM "__step_0__"{expected_where}) '
+        'SELECT * FROM "__step_1__"'
+    )
+    assert parameters == expected_parameters
+
+
+@pytest.mark.parametrize(
+    "column_type,expected_where",
+    [
+        (
+            None,
+            " WHERE CAST(`login` AS DATETIME)>=parse_datetime('%FT%T','2022-01-01T10:00:00') "
+            "AND CAST(`login` AS DATETIME)<=parse_datetime('%FT%T','2022-12-31T00:00:00')",
+        ),
+        (
+            "datetime",
+            " WHERE `login`>=parse_datetime('%FT%T','2022-01-01T10:00:00') "
+            "AND `login`<=parse_datetime('%FT%T','2022-12-31T00:00:00')",
+        ),
+        (
+            "TIMESTAMP",
+            " WHERE `login`>=TIMESTAMP(parse_datetime('%FT%T','2022-01-01T10:00:00')) "
+            "AND `login`<=TIMESTAMP(parse_datetime('%FT%T','2022-12-31T00:00:00'))",
+        ),
+        (
+            "DATE",
+            " WHERE `login`>DATE(DATETIME_SUB(parse_datetime('%FT%T','2022-01-01T10:00:00'),"
+            "INTERVAL 1 MICROSECOND)) "
+            "AND `login`<=DATE(parse_datetime('%FT%T','2022-12-31T00:00:00'))",
+        ),
+    ],
+)
+def test_translate_date_bounds_googlebigquery(column_type: str | None, expected_where: str) -> None:
+    query = translate_pipeline(
+        sql_dialect=SQLDialect.GOOGLEBIGQUERY,
+        pipeline=PipelineWithVariables(
+            steps=[
+                {"name": "domain", "domain": "logins"},
+                {
+                    "name": "filter",
+                    "condition": {
+                        "and": [
+                            {"column": "login", "operator": "from", "value": "2022-01-01T10:00:00"},
+                            {
+                                "column": "login",
+                                "operator": "until",
+                                "value": "2022-12-31T00:00:00",
+                            },
+                        ]
+                    },
+                },
+            ]
+        ),
+        tables_columns=ALL_TABLES_COLUMNS,
+        columns_types={"login": column_type} if column_type else None,
+    )
+    assert query == (
+        "WITH __step_0__ AS (SELECT `username`,`login`,`type` FROM `logins`) ,"
+        f"__step_1__ AS (SELECT `username`,`login`,`type` FROM `__step_0__`{expected_where}) "
+        "SELECT * FROM `__step_1__`"
+    )
+
+
+@pytest.mark.parametrize(
+    "sql_dialect,operator,pattern,expected_where",
+    [
+        (SQLDialect.POSTGRESQL, "matches", "^Chia", """ WHERE "username" LIKE 'Chia%'"""),
+        (SQLDialect.POSTGRESQL, "matches", "hu$", """ WHERE "username" LIKE '%hu'"""),
+        (SQLDialect.POSTGRESQL, "notmatches", "^Eric$", """ WHERE "username"<>'Eric'"""),
+        (SQLDialect.POSTGRESQL, "matches", "(?i)chi", """ WHERE "username" ILIKE '%chi%'"""),
+        (SQLDialect.POSTGRESQL, "notmatches", r"a\.b", """ WHERE "username" NOT LIKE '%a.b%'"""),
+        (SQLDialect.POSTGRESQL, "matches", "(Er|Pik)", """ WHERE "username" ~ '(Er|Pik)'"""),
+        (SQLDialect.POSTGRESQL, "notmatches", r"^\d", """ WHERE "username" !~ '^\\d'"""),
+        (SQLDialect.POSTGRESQL, "matches", "a_b", """ WHERE "username" ~ 'a_b'"""),
+        (SQLDialect.REDSHIFT, "matches", "^Chia", """ WHERE "username" LIKE 'Chia%'"""),
+    ],
+)
+def test_translate_regex(
+    sql_dialect: SQLDialect, operator: str, pattern: str, expected_where: str
+) -> None:
+    query = translate_pipeline(
+        sql_dialect=sql_dialect,
+        pipeline=PipelineWithVariables(
+            steps=[
+                {"name": "domain", "domain": "users"},
+                {
+                    "name": "filter",
+                    "condition": {"column": "username", "operator": operator, "value": pattern},
+                },
+            ]
+        ),
+        tables_columns=ALL_TABLES_COLUMNS,
+    )
+    assert query == (
+        'WITH __step_0__ AS (SELECT "username","age","city" FROM "users") ,'
+        f'__step_1__ AS (SELECT "username","age","city" FROM "__step_0__"{expected_where}) '
+        'SELECT * FROM "__step_1__"'
+    )
+
+
+@pytest.mark.parametrize(
+    "sql_dialect,expected_count",
+    [
+        (SQLDialect.POSTGRESQL, 'COUNT(DISTINCT "username")'),
+        (SQLDialect.SNOWFLAKE, "APPROX_COUNT_DISTINCT(username)"),
+        (SQLDialect.GOOGLEBIGQUERY, "APPROX_COUNT_DISTINCT(`username`)"),
+        (SQLDialect.REDSHIFT, 'APPROXIMATE COUNT(DISTINCT "username")'),
+    ],
+)
+def test_translate_approximate_aggregations(sql_dialect: SQLDialect, expected_count: str) -> None:
+    query = translate_pipeline(
+        sql_dialect=sql_dialect,
+        pipeline=PipelineWithVariables(
+            steps=[
+                {"name": "domain", "domain": "users"},
+                {
+                    "name": "aggregate",
+                    "on": ["city"],
+                    "aggregations": [
+                        {
+                            "aggfunction": "count distinct",
+                            "columns": ["username"],
+                            "newcolumns": ["users"],
+                        }
+                    ],
+                },
+            ]
+        ),
+        tables_columns=ALL_TABLES_COLUMNS,
+        approximate_aggregations=True,
+    )
+    assert f"{expected_count} " in query
+
+
+@pytest.mark.parametrize(
+    "sql_dialect,sample_seed,expected_domain",
+    [
+        (
+            SQLDialect.POSTGRESQL,
+            None,
+            'SELECT "username","age","city" FROM "users" TABLESAMPLE SYSTEM (2.5)',
+        ),
+        (
+            SQLDialect.POSTGRESQL,
+            42,
+            'SELECT "username","age","city" FROM "users" TABLESAMPLE SYSTEM (2.5) REPEATABLE (42)',
+        ),
+        (
+            SQLDialect.GOOGLEBIGQUERY,
+            42,
+            "SELECT `username`,`age`,`city` FROM `users` TABLESAMPLE SYSTEM (2.5 PERCENT)",
+        ),
+        (SQLDialect.SNOWFLAKE, None, "SELECT username,age,city FROM users SAMPLE (2.5)"),
+        (SQLDialect.SNOWFLAKE, 42, "SELECT username,age,city FROM users SAMPLE (2.5) SEED (42)"),
+        (
+            SQLDialect.MYSQL,
+            None,
+            "SELECT `username`,`age`,`city` FROM `users` WHERE RAND()<0.025",
+        ),
+        (
+            SQLDialect.MYSQL,
+            42,
+            "SELECT `username`,`age`,`city` FROM `users` WHERE RAND(42)<0.025",
+        ),
+        (
+            SQLDialect.REDSHIFT,
+            42,
+            'SELECT "username","age","city" FROM "users" WHERE RANDOM()<0.025',
+        ),
+    ],
+)
+def test_translate_sampled_domain(
+    sql_dialect: SQLDialect, sample_seed: int | None, expected_domain: str
+) -> None:
+    query = translate_pipeline(
+        sql_dialect=sql_dialect,
+        pipeline=PipelineWithVariables(steps=[{"name": "domain", "domain": "users"}]),
+        tables_columns=ALL_TABLES_COLUMNS,
+        sample_percent=2.5,
+        sample_seed=sample_seed,
+    )
+    assert query.startswith(f"WITH __step_0__ AS ({expected_domain}) ")
+
+
+@pytest.mark.parametrize(
+    "kwargs,expected_end",
+    [
+        ({"limit": 100}, ' ORDER BY "city" DESC NULLS LAST,"age" ASC NULLS LAST LIMIT 100'),
+        (
+            {"limit": 100, "offset": 200},
+            ' ORDER BY "city" DESC NULLS LAST,"age" ASC NULLS LAST LIMIT 100 OFFSET 200',
+        ),
+        (
+            {"limit": 100, "unique_columns": ["username", "age"]},
+            ' ORDER BY "city" DESC NULLS LAST,"age" ASC NULLS LAST,"username" ASC NULLS LAST '
+            "LIMIT 100",
+        ),
+        (
+            {"limit": 100, "after": ["Paris", 30]},
+            """ WHERE "city"<'Paris' OR "city" IS NULL OR """
+            """("city"='Paris' AND ("age">30 OR "age" IS NULL)) """
+            'ORDER BY "city" DESC NULLS LAST,"age" ASC NULLS LAST LIMIT 100',
+        ),
+        (
+            # only the rows without city come after the ones without city
+            {"limit": 100, "after": [None, 30]},
+            """ WHERE "city" IS NULL AND ("age">30 OR "age" IS NULL) """
+            'ORDER BY "city" DESC NULLS LAST,"age" ASC NULLS LAST LIMIT 100',
+        ),
+        (
+            # nothing comes after the last row without values
+            {"limit": 100, "after": [None, None]},
+            ' WHERE 1=0 ORDER BY "city" DESC NULLS LAST,"age" ASC NULLS LAST LIMIT 100',
+        ),
+    ],
+)
+def test_translate_paginated(kwargs: dict[str, Any], expected_end: str) -> None:
+    query, _ = translate_pipeline_with_parameters(
+        sql_dialect=SQLDialect.POSTGRESQL,
+        pipeline=PipelineWithVariables(
+            steps=[
+                {"name": "domain", "domain": "users"},
+                {
+                    "name": "sort",
+                    "columns": [
+                        {"column": "city", "order": "desc"},
+                        {"column": "age", "order": "asc"},
+                    ],
+                },
+            ]
+        ),
+        tables_columns=ALL_TABLES_COLUMNS,
+        **kwargs,
+    )
+    assert query.endswith(f'SELECT * FROM "__step_1__"{expected_end}')
+
+
+def test_translate_paginated_without_nulls_last() -> None:
+    query, _ = translate_pipeline_with_parameters(
+        sql_dialect=SQLDialect.MYSQL,
+        pipeline=PipelineWithVariables(
+            steps=[
+                {"name": "domain", "domain": "users"},
+                {"name": "sort", "columns": [{"column": "age", "order": "desc"}]},
+            ]
+        ),
+        tables_columns=ALL_TABLES_COLUMNS,
+        limit=100,
+    )
+    assert query.endswith(" ORDER BY `age` IS NULL,`age` DESC LIMIT 100")
+
+
+def test_translate_paginated_on_missing_column() -> None:
+    with pytest.raises(ValueError, match="'age'"):
+        translate_pipeline_with_parameters(
+            sql_dialect=SQLDialect.POSTGRESQL,
+            pipeline=PipelineWithVariables(
+                steps=[
+                    {"name": "domain", "domain": "users"},
+                    {"name": "sort", "columns": [{"column": "age", "order": "asc"}]},
+                    {"name": "select", "columns": ["username"]},
+                ]
+            ),
+            tables_columns=ALL_TABLES_COLUMNS,
+            limit=100,
+        )
+
+
+def test_translate_count_only() -> None:
+    query, _ = translate_pipeline_with_parameters(
+        sql_dialect=SQLDialect.POSTGRESQL,
+        pipeline=PipelineWithVariables(
+            steps=[
+                {"name": "domain", "domain": "users"},
+                {"name": "sort", "columns": [{"column": "age", "order": "asc"}]},
+            ]
+        ),
+        tables_columns=ALL_TABLES_COLUMNS,
+        limit=10,
+        count_only=True,
+    )
+    assert query == (
+        'WITH __step_0__ AS (SELECT "username","age","city" FROM "users") ,'
+        '__step_1__ AS (SELECT "username","age","city" FROM "__step_0__" ORDER BY "age" ASC) '
+        'SELECT COUNT(*) "count" FROM "__step_1__"'
+    )